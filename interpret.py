@@ -11,184 +11,475 @@
 import sys
 import argparse
 import os
-import math
+import re
+import io
+import mmap
+import marshal
+import hashlib
+import tempfile
+import struct
+import json
+import traceback
+import warnings
+import multiprocessing
+import socketserver
+import signal
+import resource
 import xml.etree.ElementTree as ET
 from xml.etree.ElementTree import ParseError
-from copy import deepcopy
+from stat import S_ISREG, S_ISSOCK
+from bisect import bisect_left, bisect_right
+from heapq import heappush, heappop
+from functools import partial
+from copy import copy
+from random import Random
+from time import perf_counter_ns
+from types import MethodType
+from operator import add, sub, mul, floordiv, lt, gt, eq
+
+
+# value of string variable which is modified in place, by CONCAT appending to
+# the variable itself (CONCAT GF@s GF@s ...) or by SETCHAR, so repeated
+# appending is amortized O(1) and SETCHAR is O(1) instead of copying whole
+# string every time, characters are joined to str once the value is read
+# (see Frame.getValue) and the str is kept until the buffer is modified again,
+# buffer never leaves its variable (readers get str), only GETCHAR, STRI2INT
+# and STRLEN index it directly (see Interpreter.getSymbChars)
+# chars -> characters of the value
+# string -> the value as str or None if it was modified since it was joined
+class StringBuffer():
+    chars = None
+    string = None
+
+    def __init__(self, string):
+        self.chars = list(string)
+        self.string = string
+
+    def append(self, string):
+        self.chars.extend(string)
+        self.string = None
+
+    # negative index is replaced as by slicing (string[:index] + character +
+    # string[index + 1:]), the same way as in the other engines
+    def setChar(self, index, character):
+        if index < 0:
+            string = str(self)
+            self.chars = list(string[:index] + character +
+                              string[index + 1:])
+        else:
+            self.chars[index] = character
+        self.string = None
 
+    def __len__(self):
+        return len(self.chars)
 
-# class for initializing new variable with name specified type and value
-# note: string and bool are represented as strings only int is as int
-class Variable():
-    name = None
-    type = None
-    value = None
+    def __getitem__(self, index):
+        return self.chars[index]
 
-    def __init__(self, name, type, value):
-        self.name = name
-        self.type = type
-        if type == "string":
-            self.value = value
-        elif type == "int":
-            try:
-                self.value = int(value)
-            except Exception:
-                sys.stderr.write("ERROR 32: value of variable \"{}\" is wrong"
-                                 " (supposed to be integer)\n".format(name))
-                sys.exit(32)
-        elif type == "bool":
-            if value == "true":
-                self.value = value
-            elif value == "false":
-                self.value = value
-            else:
-                sys.stderr.write("ERROR 32: value of variable \"{}\" is wrong"
-                                 " (supposed to be boolean)\n".format(name))
-                sys.exit(32)
-        else:
-            sys.stderr.write("ERROR 32: wrong type of variable \"{}\""
-                             "\n".format(name))
-            sys.exit(32)
+    def __str__(self):
+        if self.string is None:
+            self.string = "".join(self.chars)
+        return self.string
+
+
+# runtime values are native python values (int, bool and str, variable can
+# hold StringBuffer too), type of value is derived from its python type
+valueTypes = {int: "int", bool: "bool", str: "string", StringBuffer: "string"}
 
+# content of slot of undefined variable (uninitialized variable has None)
+undefined = object()
 
-# class for frames
+
+# class for frames, variables are stored in slots assigned to their names
+# before interpretation (see allocateSlots), "layout" is list of names of
+# variables by slot, "values" holds their values, "count" is number of its
+# defined variables (see Interpreter.countVariable)
 class Frame():
-    variable = None
+    layout = None
+    values = None
     defined = None
+    count = None
 
-    def __init__(self, status):
-        self.variable = {}
-        self.defined = status
+    def __init__(self, status, layout):
+        self.layout = layout
+        self.values = []
+        self.defined = False
+        self.count = 0
+        if status:
+            self.define()
 
     # define varibale in frame
-    def defVar(self, name):
+    def defVar(self, slot):
         if self.defined:
-            self.variable[name] = None
+            self.values[slot] = None
         else:
-            sys.stderr.write("ERROR 55: accesing undefined frame\n")
-            sys.exit(55)
+            raise ExecutionError(55, "ERROR 55: accesing undefined frame\n")
 
-    def isVarDefined(self, varName):
-        return varName in self.variable
+    def isVarDefined(self, slot):
+        return self.values[slot] is not undefined
 
-    def isVarInitialized(self, varName):
-        if self.variable[varName] is None:
-            return False
-        else:
-            return True
+    def isVarInitialized(self, slot):
+        return self.values[slot] is not None
+
+    # get type name of initialized variable in slot
+    def getType(self, slot):
+        return valueTypes[type(self.values[slot])]
 
-    # get variable by its name
-    def getVar(self, varName):
-        return self.variable[varName]
+    # get value of variable in slot
+    def getValue(self, slot):
+        value = self.values[slot]
+        if type(value) is StringBuffer:
+            return str(value)
+        return value
 
     # set variable
-    def setVar(self, var):
-        if var.name in self.variable:
-            self.variable[var.name] = var
+    def setVar(self, slot, value):
+        if self.values[slot] is not undefined:
+            self.values[slot] = value
         else:
-            sys.stderr.write("ERROR 54: variable \"{}\" is undefined"
-                             "\n".format(var.name))
-            sys.exit(54)
+            raise ExecutionError(54, "ERROR 54: variable \"{}\" is undefined\n"
+                                     .format(self.layout[slot]))
 
     # clear frame and set it as unitialized
     def reset(self):
-        self.variable.clear()
+        self.values = []
         self.defined = False
+        self.count = 0
 
-    # initailize frame
+    # initailize frame (all variables are undefined)
     def define(self):
+        self.values = [undefined] * len(self.layout)
         self.defined = True
+        self.count = 0
+
+    # defined variables of frame as dictionary name -> value (for BREAK)
+    def variables(self):
+        return {self.layout[slot]: self.getValue(slot)
+                for slot, value in enumerate(self.values)
+                if value is not undefined}
 
 
 # stackframe for with access on most top frame (LF) with method getLF()
+# peak -> the greatest depth of stack
 class StackFrame():
     stack = None
     empty = None
+    peak = None
 
     def __init__(self):
         self.stack = []
         self.empty = True
+        self.peak = 0
 
+    # frame is not copied, stackframe takes ownership of it (caller must not
+    # use it anymore)
     def push(self, frame):
         self.empty = False
         if frame.defined is not True:
-            sys.stderr.write("ERROR 55: pushing undefined frame\n")
-            sys.exit(55)
-        self.stack.append(deepcopy(frame))
+            raise ExecutionError(55, "ERROR 55: pushing undefined frame\n")
+        self.stack.append(frame)
+        if len(self.stack) > self.peak:
+            self.peak = len(self.stack)
 
     def pop(self):
         if self.empty:
-            sys.stderr.write("ERROR 55: LF doesn't exist (empty stackframe)\n")
-            sys.exit(55)
+            raise ExecutionError(55, "ERROR 55: LF doesn't exist (empty stackf"
+                                     "rame)\n")
         if len(self.stack) == 1:
             self.empty = True
         return self.stack.pop()
 
     def getLF(self):
         if self.empty:
-            sys.stderr.write("ERROR 55: LF doesn't exist (empty stackframe)\n")
-            sys.exit(55)
+            raise ExecutionError(55, "ERROR 55: LF doesn't exist (empty stackf"
+                                     "rame)\n")
         return self.stack[-1]
 
 
 # call stack for instruction CALL and RETURN
+# peak -> the greatest depth of stack
 class CallStack():
     stack = None
     empty = None
+    peak = None
 
     def __init__(self):
         self.stack = []
         self.empty = True
+        self.peak = 0
 
     def push(self, instructNumber):
         self.empty = False
         self.stack.append(instructNumber)
+        if len(self.stack) > self.peak:
+            self.peak = len(self.stack)
 
     def pop(self):
         if self.empty:
-            sys.stderr.write("ERROR 56: Call stack is empty\n")
-            sys.exit(56)
+            raise ExecutionError(56, "ERROR 56: Call stack is empty\n")
         if len(self.stack) == 1:
             self.empty = True
         return self.stack.pop()
 
 
 # data stack for instructions PUSHS and POPS
+# peak -> the greatest depth of stack
 class DataStack():
     stack = None
     empty = None
+    peak = None
 
     def __init__(self):
         self.stack = []
         self.empty = True
+        self.peak = 0
 
     def push(self, variable):
         self.empty = False
         self.stack.append(variable)
+        if len(self.stack) > self.peak:
+            self.peak = len(self.stack)
 
     def pop(self):
         if self.empty:
-            sys.stderr.write("ERROR 56: Data stack is empty\n")
-            sys.exit(56)
+            raise ExecutionError(56, "ERROR 56: Data stack is empty\n")
         if len(self.stack) == 1:
             self.empty = True
         return self.stack.pop()
 
 
-# initialization of global variables
-GF = Frame(True)
-TF = Frame(False)
-stackframe = StackFrame()
-labels = {}
-callstack = CallStack()
-datastack = DataStack()
-instructCount = 0
-initVarsCount = 0
+# buffered standard output for WRITE, lines are encoded immediately (like
+# print() does) and written when "limit" bytes are buffered (0 writes every
+# line, None writes everything at exit), text stream without binary buffer
+# (e.g. io.StringIO) gets lines as they are, "written" is size of all
+# written lines
+class OutputBuffer():
+    stream = None
+    encoding = None
+    errors = None
+    chunks = None
+    size = None
+    limit = None
+    written = None
+
+    def __init__(self, stream, limit):
+        if hasattr(stream, "buffer"):
+            self.stream = stream.buffer
+            self.encoding = stream.encoding
+            self.errors = stream.errors
+        else:
+            self.stream = stream
+        self.chunks = []
+        self.size = 0
+        self.limit = limit
+        self.written = 0
+
+    # write value followed by newline
+    def writeLine(self, value):
+        data = str(value) + "\n"
+        if self.encoding is not None:
+            data = data.encode(self.encoding, self.errors)
+        self.chunks.append(data)
+        self.size += len(data)
+        if self.limit is not None and self.size >= self.limit:
+            self.flush()
+
+    def flush(self):
+        if self.chunks:
+            self.stream.write(self.chunks[0][:0].join(self.chunks))
+            self.written += self.size
+            self.chunks = []
+            self.size = 0
+        self.stream.flush()
+
+
+# buffered standard input for READ, regular file is mapped to memory
+# (mmap), otherwise lines are read from buffer of stream (or from text stream
+# itself if it has no buffer), lines are split only on "\n" and "\r" is kept
+# in them as input() does on POSIX
+class InputReader():
+    stream = None
+    encoding = None
+    errors = None
+    data = None
+    position = None
+
+    def __init__(self, stream):
+        self.stream = stream
+        self.encoding = getattr(stream, "encoding", None)
+        self.errors = getattr(stream, "errors", None)
+
+    # map input to memory if it is a regular file
+    def open(self):
+        self.data = b""
+        try:
+            fd = self.stream.fileno()
+            if S_ISREG(os.fstat(fd).st_mode):
+                self.position = os.lseek(fd, 0, os.SEEK_CUR)
+                self.data = mmap.mmap(fd, 0, access=mmap.ACCESS_READ)
+        except (OSError, ValueError, io.UnsupportedOperation):
+            pass  # empty file or stream without descriptor
+        if not self.data:
+            self.data = None
+            self.position = None
+
+    # read line from input (without newline like input() does)
+    # return val: line or None at the end of input
+    def readLine(self):
+        if self.position is None:
+            if self.data is None:
+                self.open()
+            if self.position is None:
+                if hasattr(self.stream, "buffer"):
+                    line = self.stream.buffer.readline()
+                else:
+                    line = self.stream.readline()
+                if not line:
+                    return None
+                return self.decode(line)
+        if self.position >= len(self.data):
+            return None
+        end = self.data.find(b"\n", self.position)
+        if end < 0:
+            end = len(self.data)
+        line = self.data[self.position:end]
+        self.position = end + 1
+        return self.decode(line)
+
+    def decode(self, line):
+        if type(line) is bytes:
+            line = line.decode(self.encoding, self.errors)
+        if line.endswith("\n"):
+            line = line[:-1]
+        return line
+
+    # unmap input, stream is moved behind the lines which were read (next
+    # reader of the same stream continues there)
+    def close(self):
+        if self.position is not None:
+            os.lseek(self.stream.fileno(), min(self.position, len(self.data)),
+                     os.SEEK_SET)
+            self.data.close()
+            self.data = None
+            self.position = None
+
+
+# error of interpreter (instead of exiting whole process)
+# code -> return code of interpreter
+# message -> error message for standard error output
+class InterpretError(Exception):
+    code = None
+    message = None
+
+    def __init__(self, code, message):
+        super().__init__(message)
+        self.code = code
+        self.message = message
+
+
+# error found in program before interpretation (codes 21, 31, 32 and 52)
+class ProgramError(InterpretError):
+    pass
+
+
+# error found during interpretation of program (codes 53 - 58)
+class ExecutionError(InterpretError):
+    pass
+
+
+# argument of instruction loaded from XML (see loadProgram)
+# tag -> tag of argument element (arg1/arg2/arg3)
+# type -> value of its "type" attribute (None if it is missing)
+# text -> text of argument element (None if it is empty)
+class RawArg():
+    __slots__ = ("tag", "type", "text")
+
+    def __init__(self, tag, type, text):
+        self.tag = tag
+        self.type = type
+        self.text = text
+
+
+# instruction loaded from XML (see loadProgram), only this compact record is
+# kept in memory instead of XML element
+# order -> order number of instruction
+# opcode -> opcode in string format
+# args -> tuple of arguments (RawArg)
+class RawInstruction():
+    __slots__ = ("order", "opcode", "args")
+
+    def __init__(self, order, opcode, args):
+        self.order = order
+        self.opcode = opcode
+        self.args = args
+
+
+# decoded argument of instruction
+# variable -> frame (GF/LF/TF), name and slot (see allocateSlots) are set,
+#             value is None and type is None or type of its value proven by
+#             type inference (see inferTypes)
+# constant -> frame, name and slot are None, type (int/bool/string/label/type)
+#             and value already converted to runtime format are set
+class Operand():
+    __slots__ = ("frame", "name", "type", "value", "slot")
+
+    def __init__(self, frame, name, type, value):
+        self.frame = frame
+        self.name = name
+        self.type = type
+        self.value = value
+        self.slot = None
+
+
+# decoded instruction used during interpretation
+# opcode -> numeric id of opcode (position in opcodeParser)
+# order -> order number of instruction
+# args -> tuple of decoded arguments (Operand)
+# next -> position of following instruction, negative (~position) if some
+#         order numbers are skipped before it
+# target -> position of label for jump and call instructions
+class Instruction():
+    __slots__ = ("opcode", "order", "args", "next", "target")
+
+    def __init__(self, opcode, order, args, next, target):
+        self.opcode = opcode
+        self.order = order
+        self.args = args
+        self.next = next
+        self.target = target
+
+
+# verified program decoded for interpretation (see loadFile), one program
+# can be interpreted any number of times
+# code -> decoded instructions (Instruction) sorted by order numbers
+# table -> index of instructions by order numbers (InstructTable)
+# labels -> name of label -> order number of its LABEL instruction
+# globalLayout -> names of variables of GF by slots (see allocateSlots)
+# localLayout -> names of all variables used with TF and LF (layout of TF
+#                before the first CREATEFRAME)
+# frameLayouts -> order number of CREATEFRAME -> names of variables of frame
+#                 created by it by slots
+# validateTime -> duration of verification in nanoseconds (0 if program was
+#                 loaded verified from cache or bytecode)
+class Program():
+    code = None
+    table = None
+    labels = None
+    globalLayout = None
+    localLayout = None
+    frameLayouts = None
+    validateTime = 0
+
+    def __init__(self, code, table, labels):
+        self.code = code
+        self.table = table
+        self.labels = labels
+        allocateSlots(self)
 
 
 def argumentsHandling():
     parser = argparse.ArgumentParser(prog="interpret.py", add_help=True)
-    parser.add_argument("--source", required=True, nargs=1, metavar="FILE",
+    parser.add_argument("--source", required=False, nargs=1, metavar="FILE",
                         help="input file with XML representation of src code")
     parser.add_argument("--stats", required=False, nargs=1, metavar="FILE",
                         help="exports statistics of interpretation into FILE")
@@ -198,6 +489,87 @@ def argumentsHandling():
     parser.add_argument("--vars", required=False, dest="statsp",
                         action='append_const', const="vars",
                         help="(must be combined with --stats) num of vars")
+    extendedStats = [
+        ("--load-time", "loading time of program (microseconds)"),
+        ("--validate-time", "verification time of program (microseconds)"),
+        ("--exec-time", "interpretation time of program (microseconds)"),
+        ("--max-callstack", "greatest depth of call stack"),
+        ("--max-datastack", "greatest depth of data stack"),
+        ("--max-stackframe", "greatest depth of stack of frames"),
+        ("--max-vars", "greatest number of variables in all frames"),
+        ("--written", "size of output of WRITE (bytes)"),
+        ("--max-rss", "greatest resident set size of process (bytes)"),
+    ]
+    for option, description in extendedStats:
+        parser.add_argument(option, required=False, dest="statsp",
+                            action='append_const', const=option[2:],
+                            help="(must be combined with --stats) " +
+                            description)
+    parser.add_argument("--stats-format", required=False, default="lines",
+                        choices=["lines", "json"], dest="statsformat",
+                        help="format of --stats file, one value per line or "
+                        "JSON object (default lines)")
+    parser.add_argument("--source-format", required=False, default="xml",
+                        choices=["xml", "text"], dest="sourceformat",
+                        help="format of source file, XML (or bytecode) or "
+                        "IPPcode18 source code (default xml)")
+    parser.add_argument("--engine", required=False, default="reference",
+                        choices=["reference", "closure", "pyc"],
+                        help="execution engine (default reference)")
+    parser.add_argument("-O", required=False, type=int, default=0,
+                        choices=[0, 1, 2, 3], dest="optimize",
+                        metavar="LEVEL",
+                        help="optimization level, -O1 fuses common pairs of "
+                        "instructions, -O2 also skips type checks proven by "
+                        "type inference, -O3 also folds constants and "
+                        "removes unreachable code (default 0)")
+    parser.add_argument("--opt-report", required=False, nargs=1,
+                        metavar="FILE", dest="optreport",
+                        help="(must be combined with -O3) write folded and "
+                        "removed instructions into FILE")
+    parser.add_argument("--dump-source", required=False, nargs=1,
+                        metavar="FILE", dest="dumpsource",
+                        help="(must be combined with --engine=pyc) save "
+                        "generated python source into FILE")
+    parser.add_argument("--cache-dir", required=False, nargs=1,
+                        metavar="DIR", dest="cachedir",
+                        help="keep verified programs in directory DIR")
+    parser.add_argument("--cache-size", required=False, type=int,
+                        default=64 << 20, metavar="BYTES", dest="cachesize",
+                        help="size limit of --cache-dir (default 64 MiB)")
+    parser.add_argument("--assemble", required=False, nargs=1,
+                        metavar="FILE",
+                        help="write program in bytecode format into FILE "
+                        "instead of interpreting it")
+    parser.add_argument("--disassemble", required=False, nargs=1,
+                        metavar="FILE",
+                        help="write program in XML format into FILE instead "
+                        "of interpreting it")
+    parser.add_argument("--flush", required=False, default="65536",
+                        metavar="exit|line|N",
+                        help="when output is written: at exit, after every "
+                        "line or after N buffered bytes (default 65536)")
+    parser.add_argument("--profile", required=False, nargs=1,
+                        metavar="FILE",
+                        help="(only with reference or closure engine) write "
+                        "execution counts and sampled times of instructions "
+                        "into FILE (JSON) and FILE.folded (collapsed stacks)")
+    parser.add_argument("--batch", required=False, nargs=1,
+                        metavar="MANIFEST",
+                        help="interpret all programs listed in MANIFEST and "
+                        "compare them with their .out and .rc files")
+    parser.add_argument("--jobs", required=False, type=int,
+                        default=os.cpu_count(), metavar="N",
+                        help="(only with --batch or --serve) number of "
+                        "worker processes (default number of CPUs)")
+    parser.add_argument("--results", required=False, nargs=1,
+                        metavar="FILE",
+                        help="(only with --batch) write results into FILE "
+                        "instead of standard output")
+    parser.add_argument("--serve", required=False, nargs=1,
+                        metavar="SOCKET",
+                        help="run as daemon interpreting programs requested "
+                        "by interpret_client.py on unix socket SOCKET")
     try:
         args = parser.parse_args()
     except SystemExit:
@@ -206,6 +578,34 @@ def argumentsHandling():
         sys.stderr.write("ERROR 10: Wrong arguments\n")
         sys.exit(10)
 
+    if args.serve is not None:
+        if (args.source is not None or args.batch is not None or
+                args.stats is not None or args.assemble is not None or
+                args.disassemble is not None or args.dumpsource is not None or
+                args.profile is not None or args.results is not None or
+                args.optreport is not None):
+            sys.stderr.write("ERROR 10: --serve can be combined only with "
+                             "--jobs, --cache-dir and --cache-size\n")
+            sys.exit(10)
+    elif args.batch is None:
+        if args.source is None:
+            sys.stderr.write("ERROR 10: missing --source=file argument\n")
+            sys.exit(10)
+        if args.results is not None:
+            sys.stderr.write("ERROR 10: --results requires --batch\n")
+            sys.exit(10)
+    elif (args.source is not None or args.stats is not None or
+          args.assemble is not None or args.disassemble is not None or
+          args.dumpsource is not None or args.profile is not None or
+          args.optreport is not None):
+        sys.stderr.write("ERROR 10: --batch can't be combined with --source, "
+                         "--stats, --assemble, --disassemble, --dump-source, "
+                         "--profile or --opt-report\n")
+        sys.exit(10)
+    if args.jobs < 1:
+        sys.stderr.write("ERROR 10: invalid --jobs value\n")
+        sys.exit(10)
+
     if args.stats is None:
         if args.statsp is None:
             pass
@@ -213,6 +613,29 @@ def argumentsHandling():
             sys.stderr.write("ERROR 10: missing --stats=file argument\n")
             sys.exit(10)
 
+    if args.dumpsource is not None and args.engine != "pyc":
+        sys.stderr.write("ERROR 10: --dump-source requires --engine=pyc\n")
+        sys.exit(10)
+
+    if args.optreport is not None and args.optimize < 3:
+        sys.stderr.write("ERROR 10: --opt-report requires -O3\n")
+        sys.exit(10)
+
+    if args.profile is not None and args.engine == "pyc":
+        sys.stderr.write("ERROR 10: --profile can't be combined with --engin"
+                         "e=pyc\n")
+        sys.exit(10)
+
+    if args.flush == "exit":
+        args.flush = None
+    elif args.flush == "line":
+        args.flush = 0
+    elif args.flush.isdigit() and int(args.flush) > 0:
+        args.flush = int(args.flush)
+    else:
+        sys.stderr.write("ERROR 10: invalid --flush value\n")
+        sys.exit(10)
+
     return args
 
 
@@ -221,120 +644,254 @@ def openFile(fileName):
         try:
             file = open(fileName, 'r')
         except IOError:
-            sys.stderr.write("ERROR 11: Could not open file to read\n")
-            sys.exit(11)
+            raise InterpretError(11, "ERROR 11: Could not open file to read\n")
     else:
-        sys.stderr.write("ERROR 11: File not found\n")
-        sys.exit(11)
+        raise InterpretError(11, "ERROR 11: File not found\n")
     return file
 
 
-def parseFile(file):
-    try:
-        tree = ET.parse(file)
-    except ParseError:
-        sys.stderr.write("ERROR 31: Wrongly formatted XML file\n")
-        sys.exit(31)
-    return tree
-
-
 def checkTag(element, tag):
     if (element.tag != tag):
-        sys.stderr.write("ERROR 31: Wrongly formatted XML file (wrong tag)\n")
-        sys.exit(31)
+        raise ProgramError(31, "ERROR 31: Wrongly formatted XML file (wrong ta"
+                               "g)\n")
     return
 
 
-# check proper XML format of program
+# check proper XML format of program element (its attributes are known when
+# it starts)
 def checkProgramFormatting(program):
     checkTag(program, "program")
     if (len(program.attrib) < 1):
-        sys.stderr.write("ERROR 31: Wrongly formatted XML file (wrong program"
-                         " attributes)\n")
-        sys.exit(31)
+        raise ProgramError(31, "ERROR 31: Wrongly formatted XML file (wrong pr"
+                               "ogram attributes)\n")
     language = program.attrib.get("language")
     if (language != "IPPcode18"):
-        sys.stderr.write("ERROR 31: Wrongly formatted XML file (unsupported"
-                         " language)\n")
-        sys.exit(31)
-    for instruction in program:
-        checkTag(instruction, "instruction")
-        if (len(instruction.attrib) != 2):
-            sys.stderr.write("ERROR 31: Wrongly formatted XML file (wrong ins"
-                             "truction attributes)\n")
-            sys.exit(31)
-        try:
-            order = int(instruction.attrib.get("order"))
-        except Exception:
-            sys.stderr.write("ERROR 31: Wrongly formatted XML file (invalid or"
-                             " missing order number in instruction)\n")
-            sys.exit(31)
-        if (order < 0):
-            sys.stderr.write("ERROR 31: Wrongly formatted XML file (order nu"
-                             "mber in instruction must be positive)\n")
-            sys.exit(31)
-        if (instruction.attrib.get("opcode") is None):
-            sys.stderr.write("ERROR 31: Wrongly formatted XML file (missing o"
-                             "pcode argument in instruction)\n")
-            sys.exit(31)
+        raise ProgramError(31, "ERROR 31: Wrongly formatted XML file (unsuppor"
+                               "ted language)\n")
+
+
+# check proper XML format of instruction element
+def checkInstructionFormatting(instruction):
+    checkTag(instruction, "instruction")
+    if (len(instruction.attrib) != 2):
+        raise ProgramError(31, "ERROR 31: Wrongly formatted XML file (wrong in"
+                               "struction attributes)\n")
+    try:
+        order = int(instruction.attrib.get("order"))
+    except Exception:
+        raise ProgramError(31, "ERROR 31: Wrongly formatted XML file (invalid "
+                               "or missing order number in instruction)\n")
+    if (order < 0):
+        raise ProgramError(31, "ERROR 31: Wrongly formatted XML file (order nu"
+                               "mber in instruction must be positive)\n")
+    if (instruction.attrib.get("opcode") is None):
+        raise ProgramError(31, "ERROR 31: Wrongly formatted XML file (missing "
+                               "opcode argument in instruction)\n")
+
+
+# load program from XML file, every instruction is checked, converted to
+# compact record and passed to "verifier" (ProgramVerifier) as soon as it is
+# parsed and its element is dropped (whole XML tree is never kept in memory)
+# return val: list of instructions (RawInstruction) in document order
+def loadProgram(file, verifier):
+    instructions = []
+    program = None
+    depth = 0
+    try:
+        for event, element in ET.iterparse(file, events=("start", "end")):
+            if event == "start":
+                if depth == 0:
+                    program = element
+                    checkProgramFormatting(program)
+                depth += 1
+                continue
+            depth -= 1
+            if depth != 1:
+                continue
+            checkInstructionFormatting(element)
+            args = tuple(RawArg(arg.tag, arg.attrib.get("type"), arg.text)
+                         for arg in element)
+            instructions.append(RawInstruction(
+                int(element.attrib.get("order")),
+                element.attrib.get("opcode"), args))
+            verifier.verify(instructions[-1])
+            program.remove(element)  # instruction element is not needed
+    except ParseError:
+        raise ProgramError(31, "ERROR 31: Wrongly formatted XML file\n")
+    return instructions
+
+
+# ######### IPPcode18 source (--source-format=text) ###########
+# source code is parsed by the same grammar as parse.php uses and loaded to
+# the same records as XML (see loadProgram)
+
+whiteSpace = re.compile(r"[ \t\n\r\f\v]+")
+identifier = re.compile(r"[A-Za-z_\-$&%*][A-Za-z0-9_\-$&%*]*")
+intLiteral = re.compile(r"[+]?[0-9]+|-?[0-9]+")
+stringLiteral = re.compile(r"(?:[^\\]|\\[0-9]{3})*")
+
+
+# check value of constant in source code
+def validValue(value, valueType):
+    if valueType == "int":
+        return intLiteral.fullmatch(value) is not None
+    elif valueType == "bool":
+        return value == "true" or value == "false"
+    else:  # escape sequences must be in valid format
+        return stringLiteral.fullmatch(value) is not None
+
+
+# parse argument "token" of expected type "argType" (var/symb/label/type)
+# return val: argument (RawArg) or None if it is not valid
+def parseArgument(token, argType, number):
+    tag = "arg" + str(number)
+    if argType == "symb" and "@" in token:
+        valueType, value = token.split("@", 1)
+        if valueType in ("int", "bool", "string"):
+            if "@" in value and valueType != "string":
+                return None
+            if validValue(value, valueType):
+                return RawArg(tag, valueType, value)
+            return None
+        argType = "var"  # not a constant, it must be variable
+    if argType == "var":
+        if token.count("@") != 1:
+            return None
+        frame, name = token.split("@")
+        if frame in ("GF", "LF", "TF") and identifier.fullmatch(name):
+            return RawArg(tag, "var", token)
+    elif argType == "label":
+        if identifier.fullmatch(token):
+            return RawArg(tag, "label", token)
+    elif argType == "type":
+        if token in ("int", "bool", "string"):
+            return RawArg(tag, "type", token)
+    return None
+
+
+# load program from IPPcode18 source code, instructions are numbered from 1
+# and passed to "verifier" (ProgramVerifier) as soon as they are parsed
+# return val: list of instructions (RawInstruction)
+def loadTextProgram(file, verifier):
+    instructions = []
+    header = False
+    lineNumber = 0
+    try:
+        for line in file:
+            lineNumber += 1
+            tokens = [token for token in whiteSpace.split(line.split("#")[0])
+                      if token]
+            if not tokens:
+                continue  # empty line or comment
+            if not header:
+                if "".join(tokens).lower() != ".ippcode18":
+                    break
+                header = True
+                continue
+            opcode = tokens[0].upper()
+            argTypes = instructFormat.get(opcode)
+            args = []
+            if argTypes is not None and len(argTypes) == len(tokens) - 1:
+                for number, (token, argType) in enumerate(
+                        zip(tokens[1:], argTypes), 1):
+                    args.append(parseArgument(token, argType, number))
+            if argTypes is None or len(args) != len(argTypes) or None in args:
+                raise ProgramError(21, "ERROR 21: semantic/lexical error on l"
+                                       "ine: {}\n".format(lineNumber))
+            instructions.append(RawInstruction(len(instructions) + 1, opcode,
+                                               tuple(args)))
+            verifier.verify(instructions[-1])
+        else:
+            lineNumber += 1  # end of file is read as the last line
+    except UnicodeDecodeError:
+        raise ProgramError(21, "ERROR 21: source code is not in UTF-8\n")
+    if not header:
+        raise ProgramError(21, "ERROR 21: semantic/lexical error on line: "
+                               "{} (invalid header)\n".format(lineNumber))
+    return instructions
 
 
 # check if instriction has expected number of arguments
 def checkArgFormat(instruct, numOfArgs):
     cnt = 0
-    for arg in instruct:
+    for arg in instruct.args:
         cnt += 1
         checkTag(arg, "arg" + str(cnt))
     if cnt != numOfArgs:
-        instructOrderNum = int(instruct.attrib.get("order"))
-        sys.stderr.write("ERROR 32: instruction number: {} has invalid amount"
-                         " of arguments\n".format(instructOrderNum))
-        sys.exit(32)
-
-
-# function for finding instruction with selected instructionNumber
-# arg1: instructionNumber -> order number of required instructionNumber
-# arg2: program -> root of tree containing endOfProgram
-# return val: if founded successfully returns instruction in case order number
-#             doesn't exist returns instruction with next higher order number
-#             and reports warning on stderr if there is no bigger order number
-#             returns None
-def lookUpInstuct(instructionNumber, program):
-    endOfProgram = True
-    followingInstructionNum = math.inf
-    followingInstruction = None
-    for instruction in program:
-        instructOrderNum = int(instruction.attrib.get("order"))
-        if instructOrderNum == instructionNumber:
-            return instruction
-        elif instructOrderNum > instructionNumber:
-            endOfProgram = False
-            if instructOrderNum < followingInstructionNum:
-                followingInstructionNum = instructOrderNum
-                followingInstruction = instruction
-    if endOfProgram:
-        return None
-    else:
-        sys.stderr.write("WARNING: Instruction number: {} not found continu"
-                         "ing with instruction number: {}\n"
-                         .format(instructionNumber, followingInstructionNum))
-        return followingInstruction
+        instructOrderNum = instruct.order
+        raise ProgramError(32, "ERROR 32: instruction number: {} has invalid a"
+                               "mount of arguments\n".format(instructOrderNum))
+
+
+# index of program instructions sorted by their order numbers
+# instructions -> dense list of instructions sorted by order number (for equal
+#                 order numbers the first one in the document wins)
+# orders -> order numbers of instructions
+# index -> order number -> position in instructions
+class InstructTable():
+    instructions = None
+    orders = None
+    index = None
+
+    def __init__(self, program):
+        self.instructions = []
+        self.orders = []
+        self.index = {}
+        for instruction in sorted(program, key=lambda i: i.order):
+            instructOrderNum = instruction.order
+            if instructOrderNum not in self.index:
+                self.index[instructOrderNum] = len(self.instructions)
+                self.instructions.append(instruction)
+                self.orders.append(instructOrderNum)
+
+    # restore index of program loaded from cache (see ProgramCache), its
+    # instructions are already decoded so only order numbers are known
+    def restore(self, orders):
+        self.orders = orders
+        self.index = {order: position
+                      for position, order in enumerate(orders)}
+
+    # position of instruction interpreted as first (instruction number 1 or
+    # next higher one)
+    def first(self):
+        position = self.index.get(1)
+        if position is not None:
+            return position
+        return bisect_right(self.orders, 1)
+
+    # position of first instruction, warning is written to "stream" if
+    # instruction number 1 is missing
+    def start(self, stream):
+        position = self.first()
+        if position == len(self.orders) or self.index.get(1) is not None:
+            return position
+        return self.skipGap(position, stream)
+
+    # report warning to "stream" that instruction following the previous one
+    # was not found and interpretation continues with instruction on position
+    def skipGap(self, position, stream):
+        if position > 0:
+            instructionNumber = self.orders[position - 1] + 1
+        else:
+            instructionNumber = 1
+        stream.write("WARNING: Instruction number: {} not found continuing wi"
+                     "th instruction number: {}\n"
+                     .format(instructionNumber, self.orders[position]))
+        return position
 
 
 # get frame of variable from raw format
 def getVarFrame(rawVar):
     possibleFrames = ["GF", "LF", "TF"]
-    if len(rawVar) < 4:
-        sys.stderr.write("ERROR 32: invalid format of variable \"{}\""
-                         "\n".format(rawVar))
-        sys.exit(32)
+    if rawVar is None or len(rawVar) < 4:
+        raise ProgramError(32, "ERROR 32: invalid format of variable \"{}\"\n"
+                               .format(rawVar))
     varFrame = rawVar[:2]
     if varFrame in possibleFrames:
         return varFrame
     else:
-        sys.stderr.write("ERROR 32: invalid format of variable \"{}\" (wron"
-                         "g frame)\n".format(rawVar))
-        sys.exit(32)
+        raise ProgramError(32, "ERROR 32: invalid format of variable \"{}\" (w"
+                               "rong frame)\n".format(rawVar))
 
 
 # get name of variable from raw format
@@ -343,18 +900,16 @@ def getVarName(rawVar):
     if varFrame[0] == "@":
         return rawVar[3:]
     else:
-        sys.stderr.write("ERROR 32: invalid format of variable \"{}\""
-                         "\n".format(rawVar))
-        sys.exit(32)
+        raise ProgramError(32, "ERROR 32: invalid format of variable \"{}\"\n"
+                               .format(rawVar))
 
 
 # syntax/sematic control of variable argument
 def verifyVar(arg, instructOrderNum):
-    if arg.attrib.get("type") != "var":
-        sys.stderr.write("ERROR 32: instruction number: {} has wrong argum"
-                         "ent type (expected var)\n"
-                         .format(instructOrderNum))
-        sys.exit(32)
+    if arg.type != "var":
+        raise ProgramError(32, "ERROR 32: instruction number: {} has wrong arg"
+                               "ument type (expected var)\n"
+                               .format(instructOrderNum))
     else:
         getVarFrame(arg.text)
         getVarName(arg.text)
@@ -362,36 +917,33 @@ def verifyVar(arg, instructOrderNum):
 
 # checks proper type of argument
 def verifyType(arg, instructOrderNum):
-    if arg.attrib.get("type") != "type":
-        sys.stderr.write("ERROR 32: instruction number: {} has wrong argum"
-                         "ent type (expected type)\n"
-                         .format(instructOrderNum))
-        sys.exit(32)
+    if arg.type != "type":
+        raise ProgramError(32, "ERROR 32: instruction number: {} has wrong arg"
+                               "ument type (expected type)\n"
+                               .format(instructOrderNum))
     validTypes = ["string", "bool", "int"]
     if arg.text not in validTypes:
-        sys.stderr.write("ERROR 32: instruction number: {} has wrong argum"
-                         "ent value (expected string|bool|int))\n"
-                         .format(instructOrderNum))
-        sys.exit(32)
+        raise ProgramError(32, "ERROR 32: instruction number: {} has wrong arg"
+                               "ument value (expected string|bool|int))\n"
+                               .format(instructOrderNum))
 
 
-# meh...
-def verifyString(str):
-    pass
+# string constant must contain only valid escape sequences, it is transformed
+# into constant pool "strings" (see extractString)
+def verifyString(str, strings):
+    extractString(str, strings)
 
 
 def verifyInt(intgr):
     try:
         int(intgr)
     except Exception:
-        sys.stderr.write("ERROR 32: wrong format of int constant\n")
-        sys.exit(32)
+        raise ProgramError(32, "ERROR 32: wrong format of int constant\n")
 
 
 def verifyBoolean(str):
     if str != "false" and str != "true":
-        sys.stderr.write("ERROR 32: invalid bool value\n")
-        sys.exit(32)
+        raise ProgramError(32, "ERROR 32: invalid bool value\n")
 
 
 def strToBool(str):
@@ -408,1277 +960,3644 @@ def boolToStr(bool):
         return "false"
 
 
-# syntax/semantic verification of symb argument
-def verifySymb(arg, instructOrderNum):
-    argType = arg.attrib.get("type")
+# convert value to format of WRITE and DPRINT (bool as "true"/"false")
+def printable(value):
+    if type(value) is bool:
+        return boolToStr(value)
+    return value
+
+
+# syntax/semantic verification of symb argument, string literals are
+# transformed into constant pool "strings"
+def verifySymb(arg, instructOrderNum, strings):
+    argType = arg.type
     if argType == "var":
         getVarFrame(arg.text)
         getVarName(arg.text)
     elif argType == "string":
-        verifyString(arg.text)
+        verifyString(arg.text, strings)
     elif argType == "int":
         verifyInt(arg.text)
     elif argType == "bool":
         verifyBoolean(arg.text)
     else:
-        sys.stderr.write("ERROR 32: instruction number: {} has wrong argum"
-                         "ent type (expected var|string|int|bool)\n"
-                         .format(instructOrderNum))
-        sys.exit(32)
-
-
-# get value of varible with name "name" from frame "frame"
-# first arg: name of frame in string format (GF/TF/LF)
-# second arg: name of variable in string format
-def getVarValue(frame, name):
-    if frame == "GF":
-        global GF
-        if GF.isVarDefined(name):
-            if GF.isVarInitialized(name):
-                value = GF.getVar(name).value
-            else:
-                sys.stderr.write("ERROR 56: variable: \"{}\" is defined but"
-                                 " unitialized when accessing it's value\n"
-                                 .format(name))
-                sys.exit(56)
-        else:
-            sys.stderr.write("ERROR 54: variable: \"{}\" is undefined\n"
-                             .format(name))
-            sys.exit(54)
-    elif frame == "TF":
-        global TF
-        if TF.defined:
-            if TF.isVarDefined(name):
-                if TF.isVarInitialized(name):
-                    value = TF.getVar(name).value
-                else:
-                    sys.stderr.write("ERROR 56: variable: \"{}\" is defined bu"
-                                     "t unitialized when accessing it's value"
-                                     "\n".format(name))
-                    sys.exit(56)
-            else:
-                sys.stderr.write("ERROR 54: variable: \"{}\" is undefined\n"
-                                 .format(name))
-                sys.exit(54)
-        else:
-            sys.stderr.write("ERROR 54: accessing variable: \"{}\" from"
-                             " undefined frame\n".format(name))
-            sys.exit(54)
-    elif frame == "LF":
-        global stackframe
-        LF = stackframe.getLF()
-        if LF.defined:
-            if LF.isVarDefined(name):
-                if LF.isVarInitialized(name):
-                    value = LF.getVar(name).value
-                else:
-                    sys.stderr.write("ERROR 56: variable: \"{}\" is defined bu"
-                                     "t unitialized when accessing it's value"
-                                     "\n".format(name))
-                    sys.exit(56)
-            else:
-                sys.stderr.write("ERROR 54: variable: \"{}\" is undefined\n"
-                                 .format(name))
-                sys.exit(54)
-        else:
-            sys.stderr.write("ERROR 54: accessing variable: \"{}\" from"
-                             " undefined frame\n".format(name))
-            sys.exit(54)
-    else:
-        sys.stderr.write("ERROR in getVarValue() that should never occur :/")
-        sys.exit(32)
-    return value
+        raise ProgramError(32, "ERROR 32: instruction number: {} has wrong arg"
+                               "ument type (expected var|string|int|bool)\n"
+                               .format(instructOrderNum))
 
 
-# get type of varible with name "name" from frame "frame"
-# first arg: name of frame in string format (GF/TF/LF)
-# second arg: name of variable in string format
-def getVarType(frame, name):
-    if frame == "GF":
-        global GF
-        if GF.isVarDefined(name):
-            if GF.isVarInitialized(name):
-                type = GF.getVar(name).type
-            else:
-                sys.stderr.write("ERROR 56: variable: \"{}\" is defined but"
-                                 " unitialized when accessing it's type\n"
-                                 .format(name))
-                sys.exit(56)
-        else:
-            sys.stderr.write("ERROR 54: variable: \"{}\" is undefined\n"
-                             .format(name))
-            sys.exit(54)
-    elif frame == "TF":
-        global TF
-        if TF.defined:
-            if TF.isVarDefined(name):
-                if TF.isVarInitialized(name):
-                    type = TF.getVar(name).type
-                else:
-                    sys.stderr.write("ERROR 56: variable: \"{}\" is defined bu"
-                                     "t unitialized when accessing it's type"
-                                     "\n".format(name))
-                    sys.exit(56)
-            else:
-                sys.stderr.write("ERROR 54: variable: \"{}\" is undefined\n"
-                                 .format(name))
-                sys.exit(54)
-        else:
-            sys.stderr.write("ERROR 55: accessing variable: \"{}\" from"
-                             " undefined frame\n".format(name))
-            sys.exit(55)
-    elif frame == "LF":
-        global stackframe
-        LF = stackframe.getLF()
-        if LF.defined:
-            if LF.isVarDefined(name):
-                if LF.isVarInitialized(name):
-                    type = LF.getVar(name).type
-                else:
-                    sys.stderr.write("ERROR 56: variable: \"{}\" is defined bu"
-                                     "t unitialized when accessing it's type"
-                                     "\n".format(name))
-                    sys.exit(56)
-            else:
-                sys.stderr.write("ERROR 54: variable: \"{}\" is undefined\n"
-                                 .format(name))
-                sys.exit(54)
-        else:
-            sys.stderr.write("ERROR 55: accessing variable: \"{}\" from"
-                             " undefined frame\n".format(name))
-            sys.exit(55)
-    else:
-        sys.stderr.write("ERROR in getVarValue() that should never occur :/")
-        sys.exit(32)
-    return type
-
-
-# set up variable on frame "varFrame" with name "varName" on type "constType"
-# with value "constValue"
-# first arg: is frame of target variable in string format (GF/LF/TF)
-# second arg: is name of target varibale in string format
-# third arg: is type of value to be set in string format (int/string/bool)
-# third arg: is desired value in string format
-def setVariable(varFrame, varName, constType, constValue):
-    global initVarsCount
-    initVarsCount += 1
-    if varFrame == "GF":
-        global GF
-        newVar = Variable(varName, constType, constValue)
-        GF.setVar(newVar)
-    elif varFrame == "TF":
-        global TF
-        if TF.defined:
-            newVar = Variable(varName, constType, constValue)
-            TF.setVar(newVar)
-        else:
-            sys.stderr.write("ERROR 55: accessing variable: \"{}\" from"
-                             " undefined frame\n".format(varName))
-            sys.exit(55)
-    elif varFrame == "LF":
-        global stackframe
-        LF = stackframe.getLF()
-        if LF.defined:
-            newVar = Variable(varName, constType, constValue)
-            LF.setVar(newVar)
-        else:
-            sys.stderr.write("ERROR 55: accessing variable: \"{}\" from"
-                             " undefined frame\n".format(varName))
-            sys.exit(55)
-    else:
-        sys.stderr.write("ERROR in setVarValue() that should never occur :/")
-        sys.exit(32)
+# escape sequence is backslash followed by three characters (decimal code)
+escapeSequence = re.compile(r"\\(.{0,3})", re.DOTALL)
 
 
-# transform string to output compatible (remove escape seq. etc.)
-def extractString(rawString):
-    cnt = 0
+# transform string to output compatible (remove escape seq. etc.), "strings"
+# is constant pool of string literals of loaded program, raw string ->
+# transformed string (every literal is transformed only once per program)
+def extractString(rawString, strings):
     if rawString is None:
         return ""
-    strLength = len(rawString)
-    finalStr = ""
-
-    while cnt < strLength:  # transformation of escape sequences
-        c = rawString[cnt]
-        if c == '\\':
-            if cnt+3 < strLength:
-                escape = rawString[cnt+1:cnt+4]
-                try:
-                    ord = int(escape)
-                except Exception:
-                    sys.stderr.write("ERROR 32: wrong escape sequence format i"
-                                     "n string: {}\n".format(rawString))
-                    sys.exit(32)
-                try:
-                    finalStr += str(chr(ord))
-                except ValueError:
-                    sys.stderr.write("ERROR 32: cannot covert to ascii escap"
-                                     "e sequence in string: {}\n"
-                                     .format(rawString))
-                    sys.exit(32)
-                cnt = cnt + 3
-            else:
-                sys.stderr.write("ERROR 32: wrong escape sequence format i"
-                                 "n string: {}\n".format(rawString))
-                sys.exit(32)
-        else:
-            finalStr += c
-        cnt = cnt + 1
-    return finalStr
-
-
-# get argument value of Symb
-def getSymbVal(arg):
-    arg2Type = arg.attrib.get("type")
-    if arg2Type == "var":
-        varFrame = getVarFrame(arg.text)
-        varName = getVarName(arg.text)
-        return getVarValue(varFrame, varName)
-    elif arg2Type == "int":
+    if rawString in strings:
+        return strings[rawString]
+
+    def transformEscape(match):  # transformation of escape sequence
+        escape = match.group(1)
+        if len(escape) < 3:
+            raise ProgramError(32, "ERROR 32: wrong escape sequence format in "
+                                   "string: {}\n".format(rawString))
         try:
-            integerval = int(arg.text)
+            ord = int(escape)
         except Exception:
-            sys.stderr.write("ERROR 32: wrong value in some int"
-                             " (supposed to be integer)\n")
-            sys.exit(32)
-        return integerval
-    elif arg2Type == "bool":
-        return arg.text
-    else:
-        return extractString(arg.text)
-
+            raise ProgramError(32, "ERROR 32: wrong escape sequence format in "
+                                   "string: {}\n".format(rawString))
+        try:
+            return chr(ord)
+        except ValueError:
+            raise ProgramError(32, "ERROR 32: cannot covert to ascii escape se"
+                                   "quence in string: {}\n".format(rawString))
 
-# get argument type of Symb
-def getSymbType(arg):
-    arg2Type = arg.attrib.get("type")
-    if arg2Type == "var":
-        varFrame = getVarFrame(arg.text)
-        varName = getVarName(arg.text)
-        return getVarType(varFrame, varName)
+    if "\\" in rawString:
+        finalStr = escapeSequence.sub(transformEscape, rawString)
     else:
-        return arg2Type
+        finalStr = rawString
+    strings[rawString] = finalStr
+    return finalStr
 
 
-def parseMove(instruction, interpreting):
-    instructOrderNum = int(instruction.attrib.get("order"))
-    if interpreting is False:
-        checkArgFormat(instruction, 2)
-        verifyVar(instruction[0], instructOrderNum)
-        verifySymb(instruction[1], instructOrderNum)
-    else:
-        arg1 = instruction[0]
-        arg2 = instruction[1]
-        arg1Frame = getVarFrame(arg1.text)
-        arg1Name = getVarName(arg1.text)
-        arg2Type = getSymbType(arg2)
-        arg2Value = getSymbVal(arg2)
-        setVariable(arg1Frame, arg1Name, arg2Type, arg2Value)
-        return instructOrderNum+1
-
-
-def parseCreateframe(instruction, interpreting):
-    if interpreting is False:
-        checkArgFormat(instruction, 0)
-    else:
-        instructOrderNum = int(instruction.attrib.get("order"))
-        global TF
-        if TF.defined:
-            TF.reset()
-            TF.define()
+# interpreter of IPPcode18 programs, all runtime state of interpretation
+# (frames, stacks, counters and streams) belongs to instance so one process
+# can run any number of programs one after another (see run)
+# stdin, stdout, stderr -> text streams of interpreted program
+# engine -> execution engine (see engines)
+# flush -> limit of output buffer (see OutputBuffer)
+# dumpFile -> file for generated python source (pyc engine only) or None
+# profiler -> Profiler which runs the program instead of engine or None
+# optimize -> optimization level (0, 1 - see optimizeProgram, 2 - see
+#             inferTypes too or 3 - see foldProgram too)
+# reportFile -> file for report of foldProgram (level 3 only) or None
+# bufferSlots -> slots of variables which may hold StringBuffer (see
+#                bufferedSlots)
+# frameLayouts -> layouts of frames created by CREATEFRAME instructions (see
+#                 Program)
+# liveVars -> number of defined variables in all frames, peakVars is its
+#             greatest value
+# executeTime -> duration of last run in nanoseconds
+class Interpreter():
+    stdin = None
+    stdout = None
+    stderr = None
+    engine = None
+    flush = None
+    dumpFile = None
+    handlers = None
+    GF = None
+    TF = None
+    stackframe = None
+    callstack = None
+    datastack = None
+    instructCount = None
+    initVarsCount = None
+    output = None
+    input = None
+    profiler = None
+    optimize = None
+    reportFile = None
+    bufferSlots = None
+    frameLayouts = None
+    liveVars = None
+    peakVars = None
+    executeTime = None
+
+    def __init__(self, stdin=sys.stdin, stdout=sys.stdout, stderr=sys.stderr,
+                 engine="reference", flush=65536, dumpFile=None,
+                 profiler=None, optimize=0, reportFile=None):
+        self.stdin = stdin
+        self.stdout = stdout
+        self.stderr = stderr
+        self.engine = engine
+        self.flush = flush
+        self.dumpFile = dumpFile
+        self.profiler = profiler
+        self.optimize = optimize
+        self.reportFile = reportFile
+        # interpreting methods bound to instance by numeric id of opcode
+        self.handlers = [MethodType(execute, self) for execute in opcodeExec]
+
+    # interpret program (Program), runtime error is raised as ExecutionError
+    # after output of program is written
+    def run(self, program):
+        self.GF = Frame(True, program.globalLayout)
+        self.TF = Frame(False, program.localLayout)
+        self.stackframe = StackFrame()
+        self.callstack = CallStack()
+        self.datastack = DataStack()
+        self.instructCount = 0
+        self.initVarsCount = 0
+        self.liveVars = 0
+        self.peakVars = 0
+        self.output = OutputBuffer(self.stdout, self.flush)
+        self.input = InputReader(self.stdin)
+        self.bufferSlots = bufferedSlots(program)
+        self.frameLayouts = program.frameLayouts
+        if self.optimize >= 3:
+            report = []
+            program = foldProgram(program, report)
+            if self.reportFile is not None:
+                self.writeReport(report)
+        if self.optimize >= 2:
+            program = inferTypes(program)
+        if self.optimize >= 1 and self.engine != "pyc":
+            program = optimizeProgram(program)
+        start = perf_counter_ns()
+        try:
+            if self.profiler is not None:
+                self.profiler.run(self, program)
+            else:
+                engines[self.engine](self, program)
+        finally:
+            self.output.flush()
+            self.input.close()
+            self.executeTime = perf_counter_ns() - start
+
+    # write lines of optimization "report" to reportFile
+    def writeReport(self, report):
+        try:
+            with open(self.reportFile, "w") as file:
+                file.writelines(report)
+        except OSError:
+            raise InterpretError(12, "ERROR 12: could not write optimization "
+                                     "report\n")
+
+    # new variable was defined in "frame"
+    def countVariable(self, frame):
+        frame.count += 1
+        self.liveVars += 1
+        if self.liveVars > self.peakVars:
+            self.peakVars = self.liveVars
+
+    # get value of varible "arg" (decoded operand)
+    def getVarValue(self, arg):
+        name = arg.name
+        if arg.frame == "GF":
+            if self.GF.isVarDefined(arg.slot):
+                if self.GF.isVarInitialized(arg.slot):
+                    value = self.GF.getValue(arg.slot)
+                else:
+                    raise ExecutionError(56, "ERROR 56: variable: \"{}\" is de"
+                                             "fined but unitialized when acces"
+                                             "sing it's value\n".format(name))
+            else:
+                raise ExecutionError(54, "ERROR 54: variable: \"{}\" is undefi"
+                                         "ned\n".format(name))
+        elif arg.frame == "TF":
+            if self.TF.defined:
+                if self.TF.isVarDefined(arg.slot):
+                    if self.TF.isVarInitialized(arg.slot):
+                        value = self.TF.getValue(arg.slot)
+                    else:
+                        raise ExecutionError(56, "ERROR 56: variable: \"{}\" i"
+                                                 "s defined but unitialized wh"
+                                                 "en accessing it's value\n"
+                                                 .format(name))
+                else:
+                    raise ExecutionError(54, "ERROR 54: variable: \"{}\" is un"
+                                             "defined\n".format(name))
+            else:
+                raise ExecutionError(54, "ERROR 54: accessing variable: \"{}\""
+                                         " from undefined frame\n"
+                                         .format(name))
+        elif arg.frame == "LF":
+            LF = self.stackframe.getLF()
+            if LF.defined:
+                if LF.isVarDefined(arg.slot):
+                    if LF.isVarInitialized(arg.slot):
+                        value = LF.getValue(arg.slot)
+                    else:
+                        raise ExecutionError(56, "ERROR 56: variable: \"{}\" i"
+                                                 "s defined but unitialized wh"
+                                                 "en accessing it's value\n"
+                                                 .format(name))
+                else:
+                    raise ExecutionError(54, "ERROR 54: variable: \"{}\" is un"
+                                             "defined\n".format(name))
+            else:
+                raise ExecutionError(54, "ERROR 54: accessing variable: \"{}\""
+                                         " from undefined frame\n"
+                                         .format(name))
         else:
-            TF.define()
-        return instructOrderNum+1
-
-
-def parsePushframe(instruction, interpreting):
-    if interpreting is False:
-        checkArgFormat(instruction, 0)
-    else:
-        instructOrderNum = int(instruction.attrib.get("order"))
-        global TF
-        global stackframe
-        stackframe.push(TF)
-        TF.reset()
-        return instructOrderNum+1
-
-
-def parsePopframe(instruction, interpreting):
-    if interpreting is False:
-        checkArgFormat(instruction, 0)
-    else:
-        instructOrderNum = int(instruction.attrib.get("order"))
-        global TF
-        global stackframe
-        TF = stackframe.pop()
-        return instructOrderNum+1
-
-
-def parseDefvar(instruction, interpreting):
-    instructOrderNum = int(instruction.attrib.get("order"))
-    if interpreting is False:
-        checkArgFormat(instruction, 1)
-        verifyVar(instruction[0], instructOrderNum)
-
-    if interpreting is True:
-        arg1 = instruction[0]
-        varFrame = getVarFrame(arg1.text)
-        varName = getVarName(arg1.text)
-        if varFrame == "GF":
-            global GF
-            GF.defVar(varName)
-        if varFrame == "LF":
-            global stackframe
-            LF = stackframe.getLF()
-            LF.defVar(varName)
-        if varFrame == "TF":
-            global TF
-            TF.defVar(varName)
-        return instructOrderNum+1
-
-
-def parseCall(instruction, interpreting):
-    instructOrderNum = int(instruction.attrib.get("order"))
-    global labels
-    if interpreting is False:
-        checkArgFormat(instruction, 1)
-        arg1 = instruction[0]
-        if arg1.attrib.get("type") == "label":
-            label = arg1.text
-            if len(label) < 1:
-                sys.stderr.write("ERROR 32: instruction number: {} has in"
-                                 "valid label name\n"
-                                 .format(instructOrderNum))
-                sys.exit(32)
+            raise ExecutionError(32, "ERROR in getVarValue() that should never"
+                                     " occur :/")
+        return value
+
+    # get type of varible "arg" (decoded operand)
+    def getVarType(self, arg):
+        name = arg.name
+        if arg.frame == "GF":
+            if self.GF.isVarDefined(arg.slot):
+                if self.GF.isVarInitialized(arg.slot):
+                    type = self.GF.getType(arg.slot)
+                else:
+                    raise ExecutionError(56, "ERROR 56: variable: \"{}\" is de"
+                                             "fined but unitialized when acces"
+                                             "sing it's type\n".format(name))
             else:
-                if label in labels:
-                    pass
+                raise ExecutionError(54, "ERROR 54: variable: \"{}\" is undefi"
+                                         "ned\n".format(name))
+        elif arg.frame == "TF":
+            if self.TF.defined:
+                if self.TF.isVarDefined(arg.slot):
+                    if self.TF.isVarInitialized(arg.slot):
+                        type = self.TF.getType(arg.slot)
+                    else:
+                        raise ExecutionError(56, "ERROR 56: variable: \"{}\" i"
+                                                 "s defined but unitialized wh"
+                                                 "en accessing it's type\n"
+                                                 .format(name))
+                else:
+                    raise ExecutionError(54, "ERROR 54: variable: \"{}\" is un"
+                                             "defined\n".format(name))
+            else:
+                raise ExecutionError(55, "ERROR 55: accessing variable: \"{}\""
+                                         " from undefined frame\n"
+                                         .format(name))
+        elif arg.frame == "LF":
+            LF = self.stackframe.getLF()
+            if LF.defined:
+                if LF.isVarDefined(arg.slot):
+                    if LF.isVarInitialized(arg.slot):
+                        type = LF.getType(arg.slot)
+                    else:
+                        raise ExecutionError(56, "ERROR 56: variable: \"{}\" i"
+                                                 "s defined but unitialized wh"
+                                                 "en accessing it's type\n"
+                                                 .format(name))
                 else:
-                    sys.stderr.write("ERROR 52: label: \"{}\" doesn't exist"
-                                     "\n".format(label))
-                    sys.exit(52)
+                    raise ExecutionError(54, "ERROR 54: variable: \"{}\" is un"
+                                             "defined\n".format(name))
+            else:
+                raise ExecutionError(55, "ERROR 55: accessing variable: \"{}\""
+                                         " from undefined frame\n"
+                                         .format(name))
         else:
-            sys.stderr.write("ERROR 32: instruction number: {} has wrong:"
-                             " argument type (expected label)\n"
-                             .format(instructOrderNum))
-            sys.exit(32)
-    else:
-        global callstack
-        callstack.push(instructOrderNum+1)
-        label = instruction[0].text
-        return labels[label]
-
-
-def parseReturn(instruction, interpreting):
-    if interpreting is False:
-        checkArgFormat(instruction, 0)
-    else:
-        global callstack
-        return callstack.pop()
-
-
-def parsePushs(instruction, interpreting):
-    instructOrderNum = int(instruction.attrib.get("order"))
-    if interpreting is False:
-        checkArgFormat(instruction, 1)
-        verifySymb(instruction[0], instructOrderNum)
-    else:
-        arg = instruction[0]
-        argType = getSymbType(arg)
-        argValue = getSymbVal(arg)
-        newStackVar = Variable("stackVar", argType, argValue)
-        global datastack
-        datastack.push(newStackVar)
-        return instructOrderNum+1
-
-
-def parsePops(instruction, interpreting):
-    instructOrderNum = int(instruction.attrib.get("order"))
-    if interpreting is False:
-        checkArgFormat(instruction, 1)
-        verifySymb(instruction[0], instructOrderNum)
-    else:
-        global datastack
-        stackVar = datastack.pop()
-        arg = instruction[0]
-        argFrame = getVarFrame(arg.text)
-        argName = getVarName(arg.text)
-        setVariable(argFrame, argName, stackVar.type, stackVar.value)
-        return instructOrderNum+1
-
-
-def parseAdd(instruction, interpreting):
-    instructOrderNum = int(instruction.attrib.get("order"))
-    if interpreting is False:
-        checkArgFormat(instruction, 3)
-        verifyVar(instruction[0], instructOrderNum)
-        verifySymb(instruction[1], instructOrderNum)
-        verifySymb(instruction[2], instructOrderNum)
-    else:
-        arg1 = instruction[0]
-        arg2 = instruction[1]
-        arg3 = instruction[2]
-        arg1Frame = getVarFrame(arg1.text)
-        arg1Name = getVarName(arg1.text)
-        arg2Type = getSymbType(arg2)
-        arg2Value = getSymbVal(arg2)
-        arg3Type = getSymbType(arg3)
-        arg3Value = getSymbVal(arg3)
+            raise ExecutionError(32, "ERROR in getVarValue() that should never"
+                                     " occur :/")
+        return type
+
+    # set up variable "arg" (decoded operand) to value "constValue"
+    # first arg: is target variable
+    # second arg: is desired value (int/bool/str)
+    def setVariable(self, arg, constValue):
+        self.initVarsCount += 1
+        if arg.frame == "GF":
+            self.GF.setVar(arg.slot, constValue)
+        elif arg.frame == "TF":
+            if self.TF.defined:
+                self.TF.setVar(arg.slot, constValue)
+            else:
+                raise ExecutionError(55, "ERROR 55: accessing variable: \"{}\""
+                                         " from undefined frame\n"
+                                         .format(arg.name))
+        elif arg.frame == "LF":
+            LF = self.stackframe.getLF()
+            if LF.defined:
+                LF.setVar(arg.slot, constValue)
+            else:
+                raise ExecutionError(55, "ERROR 55: accessing variable: \"{}\""
+                                         " from undefined frame\n"
+                                         .format(arg.name))
+        else:
+            raise ExecutionError(32, "ERROR in setVarValue() that should never"
+                                     " occur :/")
+
+    # get StringBuffer of initialized string variable "arg", str value of the
+    # variable is replaced by new buffer
+    def getVarBuffer(self, arg):
+        if arg.frame == "GF":
+            frame = self.GF
+        elif arg.frame == "LF":
+            frame = self.stackframe.getLF()
+        else:
+            frame = self.TF
+        value = frame.values[arg.slot]
+        if type(value) is not StringBuffer:
+            value = StringBuffer(value)
+            frame.values[arg.slot] = value
+        return value
+
+    # append "string" to value of initialized string variable "arg" (see
+    # StringBuffer)
+    def appendVariable(self, arg, string):
+        self.getVarBuffer(arg).append(string)
+        self.initVarsCount += 1
+
+    # set character on "index" of value of initialized string variable "arg"
+    # (see StringBuffer)
+    def setVariableChar(self, arg, index, character):
+        self.getVarBuffer(arg).setChar(index, character)
+        self.initVarsCount += 1
+
+    # get value of string symb "arg" for GETCHAR, STRI2INT and STRLEN (type of
+    # the symb must be checked before), variable holding StringBuffer gives
+    # the buffer itself (it is indexed like str) so it is not joined
+    def getSymbChars(self, arg):
+        if arg.frame is None or (arg.frame == "GF",
+                                 arg.slot) not in self.bufferSlots:
+            return self.getSymbVal(arg)
+        if arg.frame == "GF":
+            return self.GF.values[arg.slot]
+        elif arg.frame == "LF":
+            return self.stackframe.getLF().values[arg.slot]
+        return self.TF.values[arg.slot]
+
+    # get argument value of Symb
+    def getSymbVal(self, arg):
+        if arg.frame is None:
+            return arg.value
+        return self.getVarValue(arg)
+
+    # get argument type of Symb
+    def getSymbType(self, arg):
+        if arg.frame is None:
+            return arg.type
+        return self.getVarType(arg)
+
+    def execMove(self, instruction):
+        arg1, arg2 = instruction.args
+        # errors are reported as for the other instructions
+        self.getSymbType(arg2)
+        arg2Value = self.getSymbVal(arg2)
+        self.setVariable(arg1, arg2Value)
+        return instruction.next
+
+    def execCreateframe(self, instruction):
+        self.liveVars -= self.TF.count  # variables of TF are discarded
+        self.TF.layout = self.frameLayouts[instruction.order]
+        if self.TF.defined:
+            self.TF.reset()
+            self.TF.define()
+        else:
+            self.TF.define()
+        return instruction.next
+
+    def execPushframe(self, instruction):
+        self.stackframe.push(self.TF)
+        # pushed frame is owned by stackframe now
+        self.TF = Frame(False, self.TF.layout)
+        return instruction.next
+
+    def execPopframe(self, instruction):
+        TF = self.TF
+        self.TF = self.stackframe.pop()
+        self.liveVars -= TF.count  # variables of TF are discarded
+        return instruction.next
+
+    def execDefvar(self, instruction):
+        arg1 = instruction.args[0]
+        if arg1.frame == "GF":
+            frame = self.GF
+        elif arg1.frame == "LF":
+            frame = self.stackframe.getLF()
+        else:
+            frame = self.TF
+        if frame.defined and not frame.isVarDefined(arg1.slot):
+            self.countVariable(frame)
+        frame.defVar(arg1.slot)
+        return instruction.next
+
+    def execCall(self, instruction):
+        self.callstack.push(instruction.next)
+        return instruction.target
+
+    def execReturn(self, instruction):
+        return self.callstack.pop()
+
+    def execPushs(self, instruction):
+        arg = instruction.args[0]
+        # errors are reported as for the other instructions
+        self.getSymbType(arg)
+        argValue = self.getSymbVal(arg)
+        self.datastack.push(argValue)
+        return instruction.next
+
+    def execPops(self, instruction):
+        stackValue = self.datastack.pop()
+        arg = instruction.args[0]
+        self.setVariable(arg, stackValue)
+        return instruction.next
+
+    def execAdd(self, instruction):
+        arg1, arg2, arg3 = instruction.args
+        arg2Type = self.getSymbType(arg2)
+        arg2Value = self.getSymbVal(arg2)
+        arg3Type = self.getSymbType(arg3)
+        arg3Value = self.getSymbVal(arg3)
         if arg2Type == "int" and arg2Type == arg3Type:
             result = arg2Value + arg3Value
-            setVariable(arg1Frame, arg1Name, arg2Type, result)
+            self.setVariable(arg1, result)
         else:
-            sys.stderr.write("ERROR 53: invalid operand types in instruction n"
-                             "umber: {} (both operands must be integers)\n"
-                             .format(instructOrderNum))
-            sys.exit(53)
-        return instructOrderNum+1
-
-
-def parseSub(instruction, interpreting):
-    instructOrderNum = int(instruction.attrib.get("order"))
-    if interpreting is False:
-        checkArgFormat(instruction, 3)
-        verifyVar(instruction[0], instructOrderNum)
-        verifySymb(instruction[1], instructOrderNum)
-        verifySymb(instruction[2], instructOrderNum)
-    else:
-        arg1 = instruction[0]
-        arg2 = instruction[1]
-        arg3 = instruction[2]
-        arg1Frame = getVarFrame(arg1.text)
-        arg1Name = getVarName(arg1.text)
-        arg2Type = getSymbType(arg2)
-        arg2Value = getSymbVal(arg2)
-        arg3Type = getSymbType(arg3)
-        arg3Value = getSymbVal(arg3)
+            raise ExecutionError(53, "ERROR 53: invalid operand types in instr"
+                                     "uction number: {} (both operands must be"
+                                     " integers)\n".format(instruction.order))
+        return instruction.next
+
+    def execSub(self, instruction):
+        arg1, arg2, arg3 = instruction.args
+        arg2Type = self.getSymbType(arg2)
+        arg2Value = self.getSymbVal(arg2)
+        arg3Type = self.getSymbType(arg3)
+        arg3Value = self.getSymbVal(arg3)
         if arg2Type == "int" and arg2Type == arg3Type:
             result = arg2Value - arg3Value
-            setVariable(arg1Frame, arg1Name, arg2Type, result)
+            self.setVariable(arg1, result)
         else:
-            sys.stderr.write("ERROR 53: invalid operand types in instruction n"
-                             "umber: {} (both operands must be integers)\n"
-                             .format(instructOrderNum))
-            sys.exit(53)
-        return instructOrderNum+1
-
-
-def parseMul(instruction, interpreting):
-    instructOrderNum = int(instruction.attrib.get("order"))
-    if interpreting is False:
-        checkArgFormat(instruction, 3)
-        verifyVar(instruction[0], instructOrderNum)
-        verifySymb(instruction[1], instructOrderNum)
-        verifySymb(instruction[2], instructOrderNum)
-    else:
-        arg1 = instruction[0]
-        arg2 = instruction[1]
-        arg3 = instruction[2]
-        arg1Frame = getVarFrame(arg1.text)
-        arg1Name = getVarName(arg1.text)
-        arg2Type = getSymbType(arg2)
-        arg2Value = getSymbVal(arg2)
-        arg3Type = getSymbType(arg3)
-        arg3Value = getSymbVal(arg3)
+            raise ExecutionError(53, "ERROR 53: invalid operand types in instr"
+                                     "uction number: {} (both operands must be"
+                                     " integers)\n".format(instruction.order))
+        return instruction.next
+
+    def execMul(self, instruction):
+        arg1, arg2, arg3 = instruction.args
+        arg2Type = self.getSymbType(arg2)
+        arg2Value = self.getSymbVal(arg2)
+        arg3Type = self.getSymbType(arg3)
+        arg3Value = self.getSymbVal(arg3)
         if arg2Type == "int" and arg2Type == arg3Type:
             result = arg2Value * arg3Value
-            setVariable(arg1Frame, arg1Name, arg2Type, result)
+            self.setVariable(arg1, result)
         else:
-            sys.stderr.write("ERROR 53: invalid operand types in instruction n"
-                             "umber: {} (both operands must be integers)\n"
-                             .format(instructOrderNum))
-            sys.exit(53)
-        return instructOrderNum+1
-
-
-def parseIdiv(instruction, interpreting):
-    instructOrderNum = int(instruction.attrib.get("order"))
-    if interpreting is False:
-        checkArgFormat(instruction, 3)
-        verifyVar(instruction[0], instructOrderNum)
-        verifySymb(instruction[1], instructOrderNum)
-        verifySymb(instruction[2], instructOrderNum)
-    else:
-        arg1 = instruction[0]
-        arg2 = instruction[1]
-        arg3 = instruction[2]
-        arg1Frame = getVarFrame(arg1.text)
-        arg1Name = getVarName(arg1.text)
-        arg2Type = getSymbType(arg2)
-        arg2Value = getSymbVal(arg2)
-        arg3Type = getSymbType(arg3)
-        arg3Value = getSymbVal(arg3)
+            raise ExecutionError(53, "ERROR 53: invalid operand types in instr"
+                                     "uction number: {} (both operands must be"
+                                     " integers)\n".format(instruction.order))
+        return instruction.next
+
+    def execIdiv(self, instruction):
+        arg1, arg2, arg3 = instruction.args
+        arg2Type = self.getSymbType(arg2)
+        arg2Value = self.getSymbVal(arg2)
+        arg3Type = self.getSymbType(arg3)
+        arg3Value = self.getSymbVal(arg3)
         if arg2Type == "int" and arg2Type == arg3Type:
             if arg3Value == 0:
-                sys.stderr.write("ERROR 57: division by zero in instruction n"
-                                 "umber: {}\n"
-                                 .format(instructOrderNum))
-                sys.exit(57)
+                raise ExecutionError(57, "ERROR 57: division by zero in instru"
+                                         "ction number: {}\n"
+                                         .format(instruction.order))
             result = arg2Value // arg3Value
-            setVariable(arg1Frame, arg1Name, arg2Type, result)
+            self.setVariable(arg1, result)
         else:
-            sys.stderr.write("ERROR 53: invalid operand types in instruction n"
-                             "umber: {} (both operands must be integers)\n"
-                             .format(instructOrderNum))
-            sys.exit(53)
-        return instructOrderNum+1
-
-
-def parseLt(instruction, interpreting):
-    instructOrderNum = int(instruction.attrib.get("order"))
-    if interpreting is False:
-        checkArgFormat(instruction, 3)
-        verifyVar(instruction[0], instructOrderNum)
-        verifySymb(instruction[1], instructOrderNum)
-        verifySymb(instruction[2], instructOrderNum)
-    else:
-        arg1 = instruction[0]
-        arg2 = instruction[1]
-        arg3 = instruction[2]
-        arg1Frame = getVarFrame(arg1.text)
-        arg1Name = getVarName(arg1.text)
-        arg2Type = getSymbType(arg2)
-        arg2Value = getSymbVal(arg2)
-        arg3Type = getSymbType(arg3)
-        arg3Value = getSymbVal(arg3)
+            raise ExecutionError(53, "ERROR 53: invalid operand types in instr"
+                                     "uction number: {} (both operands must be"
+                                     " integers)\n".format(instruction.order))
+        return instruction.next
+
+    def execLt(self, instruction):
+        arg1, arg2, arg3 = instruction.args
+        arg2Type = self.getSymbType(arg2)
+        arg2Value = self.getSymbVal(arg2)
+        arg3Type = self.getSymbType(arg3)
+        arg3Value = self.getSymbVal(arg3)
         if arg2Type == arg3Type:
             result = arg2Value < arg3Value
-            setVariable(arg1Frame, arg1Name, "bool", boolToStr(result))
+            self.setVariable(arg1, result)
         else:
-            sys.stderr.write("ERROR 53: invalid operand types in instruction n"
-                             "umber: {} (both operands must have same type)\n"
-                             .format(instructOrderNum))
-            sys.exit(53)
-        return instructOrderNum+1
-
-
-def parseGt(instruction, interpreting):
-    instructOrderNum = int(instruction.attrib.get("order"))
-    if interpreting is False:
-        checkArgFormat(instruction, 3)
-        verifyVar(instruction[0], instructOrderNum)
-        verifySymb(instruction[1], instructOrderNum)
-        verifySymb(instruction[2], instructOrderNum)
-    else:
-        arg1 = instruction[0]
-        arg2 = instruction[1]
-        arg3 = instruction[2]
-        arg1Frame = getVarFrame(arg1.text)
-        arg1Name = getVarName(arg1.text)
-        arg2Type = getSymbType(arg2)
-        arg2Value = getSymbVal(arg2)
-        arg3Type = getSymbType(arg3)
-        arg3Value = getSymbVal(arg3)
+            raise ExecutionError(53, "ERROR 53: invalid operand types in instr"
+                                     "uction number: {} (both operands must ha"
+                                     "ve same type)\n"
+                                     .format(instruction.order))
+        return instruction.next
+
+    def execGt(self, instruction):
+        arg1, arg2, arg3 = instruction.args
+        arg2Type = self.getSymbType(arg2)
+        arg2Value = self.getSymbVal(arg2)
+        arg3Type = self.getSymbType(arg3)
+        arg3Value = self.getSymbVal(arg3)
         if arg2Type == arg3Type:
             result = arg2Value > arg3Value
-            setVariable(arg1Frame, arg1Name, "bool", boolToStr(result))
+            self.setVariable(arg1, result)
         else:
-            sys.stderr.write("ERROR 53: invalid operand types in instruction n"
-                             "umber: {} (both operands must have same type)\n"
-                             .format(instructOrderNum))
-            sys.exit(53)
-        return instructOrderNum+1
-
-
-def parseEq(instruction, interpreting):
-    instructOrderNum = int(instruction.attrib.get("order"))
-    if interpreting is False:
-        checkArgFormat(instruction, 3)
-        verifyVar(instruction[0], instructOrderNum)
-        verifySymb(instruction[1], instructOrderNum)
-        verifySymb(instruction[2], instructOrderNum)
-    else:
-        arg1 = instruction[0]
-        arg2 = instruction[1]
-        arg3 = instruction[2]
-        arg1Frame = getVarFrame(arg1.text)
-        arg1Name = getVarName(arg1.text)
-        arg2Type = getSymbType(arg2)
-        arg2Value = getSymbVal(arg2)
-        arg3Type = getSymbType(arg3)
-        arg3Value = getSymbVal(arg3)
+            raise ExecutionError(53, "ERROR 53: invalid operand types in instr"
+                                     "uction number: {} (both operands must ha"
+                                     "ve same type)\n"
+                                     .format(instruction.order))
+        return instruction.next
+
+    def execEq(self, instruction):
+        arg1, arg2, arg3 = instruction.args
+        arg2Type = self.getSymbType(arg2)
+        arg2Value = self.getSymbVal(arg2)
+        arg3Type = self.getSymbType(arg3)
+        arg3Value = self.getSymbVal(arg3)
         if arg2Type == arg3Type:
             result = arg2Value == arg3Value
-            setVariable(arg1Frame, arg1Name, "bool", boolToStr(result))
+            self.setVariable(arg1, result)
         else:
-            sys.stderr.write("ERROR 53: invalid operand types in instruction n"
-                             "umber: {} (both operands must have same type)\n"
-                             .format(instructOrderNum))
-            sys.exit(53)
-        return instructOrderNum+1
-
-
-def parseAnd(instruction, interpreting):
-    instructOrderNum = int(instruction.attrib.get("order"))
-    if interpreting is False:
-        checkArgFormat(instruction, 3)
-        verifyVar(instruction[0], instructOrderNum)
-        verifySymb(instruction[1], instructOrderNum)
-        verifySymb(instruction[2], instructOrderNum)
-    else:
-        arg1 = instruction[0]
-        arg2 = instruction[1]
-        arg3 = instruction[2]
-        arg1Frame = getVarFrame(arg1.text)
-        arg1Name = getVarName(arg1.text)
-        arg2Type = getSymbType(arg2)
-        arg2Value = getSymbVal(arg2)
-        arg3Type = getSymbType(arg3)
-        arg3Value = getSymbVal(arg3)
+            raise ExecutionError(53, "ERROR 53: invalid operand types in instr"
+                                     "uction number: {} (both operands must ha"
+                                     "ve same type)\n"
+                                     .format(instruction.order))
+        return instruction.next
+
+    def execAnd(self, instruction):
+        arg1, arg2, arg3 = instruction.args
+        arg2Type = self.getSymbType(arg2)
+        arg2Value = self.getSymbVal(arg2)
+        arg3Type = self.getSymbType(arg3)
+        arg3Value = self.getSymbVal(arg3)
         if arg2Type == "bool" and arg2Type == arg3Type:
-            result = strToBool(arg2Value) and strToBool(arg3Value)
-            setVariable(arg1Frame, arg1Name, "bool", boolToStr(result))
+            result = arg2Value and arg3Value
+            self.setVariable(arg1, result)
         else:
-            sys.stderr.write("ERROR 53: invalid operand types in instruction n"
-                             "umber: {} (both operands must be bool)\n"
-                             .format(instructOrderNum))
-            sys.exit(53)
-        return instructOrderNum+1
-
-
-def parseOr(instruction, interpreting):
-    instructOrderNum = int(instruction.attrib.get("order"))
-    if interpreting is False:
-        checkArgFormat(instruction, 3)
-        verifyVar(instruction[0], instructOrderNum)
-        verifySymb(instruction[1], instructOrderNum)
-        verifySymb(instruction[2], instructOrderNum)
-    else:
-        arg1 = instruction[0]
-        arg2 = instruction[1]
-        arg3 = instruction[2]
-        arg1Frame = getVarFrame(arg1.text)
-        arg1Name = getVarName(arg1.text)
-        arg2Type = getSymbType(arg2)
-        arg2Value = getSymbVal(arg2)
-        arg3Type = getSymbType(arg3)
-        arg3Value = getSymbVal(arg3)
+            raise ExecutionError(53, "ERROR 53: invalid operand types in instr"
+                                     "uction number: {} (both operands must be"
+                                     " bool)\n".format(instruction.order))
+        return instruction.next
+
+    def execOr(self, instruction):
+        arg1, arg2, arg3 = instruction.args
+        arg2Type = self.getSymbType(arg2)
+        arg2Value = self.getSymbVal(arg2)
+        arg3Type = self.getSymbType(arg3)
+        arg3Value = self.getSymbVal(arg3)
         if arg2Type == "bool" and arg2Type == arg3Type:
-            result = strToBool(arg2Value) or strToBool(arg3Value)
-            setVariable(arg1Frame, arg1Name, "bool", boolToStr(result))
+            result = arg2Value or arg3Value
+            self.setVariable(arg1, result)
         else:
-            sys.stderr.write("ERROR 53: invalid operand types in instruction n"
-                             "umber: {} (both operands must be bool)\n"
-                             .format(instructOrderNum))
-            sys.exit(53)
-        return instructOrderNum+1
-
-
-def parseNot(instruction, interpreting):
-    instructOrderNum = int(instruction.attrib.get("order"))
-    if interpreting is False:
-        checkArgFormat(instruction, 2)
-        verifyVar(instruction[0], instructOrderNum)
-        verifySymb(instruction[1], instructOrderNum)
-    else:
-        arg1 = instruction[0]
-        arg2 = instruction[1]
-        arg1Frame = getVarFrame(arg1.text)
-        arg1Name = getVarName(arg1.text)
-        arg2Type = getSymbType(arg2)
-        arg2Value = getSymbVal(arg2)
+            raise ExecutionError(53, "ERROR 53: invalid operand types in instr"
+                                     "uction number: {} (both operands must be"
+                                     " bool)\n".format(instruction.order))
+        return instruction.next
+
+    def execNot(self, instruction):
+        arg1, arg2 = instruction.args
+        arg2Type = self.getSymbType(arg2)
+        arg2Value = self.getSymbVal(arg2)
         if arg2Type == "bool":
-            result = not strToBool(arg2Value)
-            setVariable(arg1Frame, arg1Name, "bool", boolToStr(result))
+            result = not arg2Value
+            self.setVariable(arg1, result)
         else:
-            sys.stderr.write("ERROR 53: invalid operand type in instruction n"
-                             "umber: {} (operand must be bool)\n"
-                             .format(instructOrderNum))
-            sys.exit(53)
-        return instructOrderNum+1
-
-
-def parseInt2char(instruction, interpreting):
-    instructOrderNum = int(instruction.attrib.get("order"))
-    if interpreting is False:
-        checkArgFormat(instruction, 2)
-        verifyVar(instruction[0], instructOrderNum)
-        verifySymb(instruction[1], instructOrderNum)
-    else:
-        arg1 = instruction[0]
-        arg2 = instruction[1]
-        arg1Frame = getVarFrame(arg1.text)
-        arg1Name = getVarName(arg1.text)
-        arg2Type = getSymbType(arg2)
-        arg2Value = getSymbVal(arg2)
+            raise ExecutionError(53, "ERROR 53: invalid operand type in instru"
+                                     "ction number: {} (operand must be bool)"
+                                     "\n".format(instruction.order))
+        return instruction.next
+
+    def execInt2char(self, instruction):
+        arg1, arg2 = instruction.args
+        arg2Type = self.getSymbType(arg2)
+        arg2Value = self.getSymbVal(arg2)
         if arg2Type == "int":
             try:
                 character = chr(arg2Value)
             except ValueError:
-                sys.stderr.write("ERROR 58: invalid UNICODE value in operation"
-                                 " number: {}\n" .format(instructOrderNum))
-                sys.exit(58)
-            setVariable(arg1Frame, arg1Name, "string", str(character))
+                raise ExecutionError(58, "ERROR 58: invalid UNICODE value in o"
+                                         "peration number: {}\n"
+                                         .format(instruction.order))
+            self.setVariable(arg1, str(character))
         else:
-            sys.stderr.write("ERROR 53: invalid operand type in instruction n"
-                             "umber: {} (operand must be int)\n"
-                             .format(instructOrderNum))
-            sys.exit(53)
-        return instructOrderNum+1
-
-
-def parseStri2int(instruction, interpreting):
-    instructOrderNum = int(instruction.attrib.get("order"))
-    if interpreting is False:
-        checkArgFormat(instruction, 3)
-        verifyVar(instruction[0], instructOrderNum)
-        verifySymb(instruction[1], instructOrderNum)
-        verifySymb(instruction[2], instructOrderNum)
-    else:
-        arg1 = instruction[0]
-        arg2 = instruction[1]
-        arg3 = instruction[2]
-        arg1Frame = getVarFrame(arg1.text)
-        arg1Name = getVarName(arg1.text)
-        arg2Type = getSymbType(arg2)
-        arg2Value = getSymbVal(arg2)
-        arg3Type = getSymbType(arg3)
-        arg3Value = getSymbVal(arg3)
+            raise ExecutionError(53, "ERROR 53: invalid operand type in instru"
+                                     "ction number: {} (operand must be int)\n"
+                                     .format(instruction.order))
+        return instruction.next
+
+    def execStri2int(self, instruction):
+        arg1, arg2, arg3 = instruction.args
+        arg2Type = self.getSymbType(arg2)
+        arg2Value = self.getSymbChars(arg2)
+        arg3Type = self.getSymbType(arg3)
+        arg3Value = self.getSymbVal(arg3)
         if arg2Type == "string" and arg3Type == "int":
             try:
                 ordCharValue = ord(arg2Value[arg3Value])
             except IndexError:
-                sys.stderr.write("ERROR 58: indexing out of string in instruct"
-                                 "ion number: {}\n"
-                                 .format(instructOrderNum))
-                sys.exit(58)
-            setVariable(arg1Frame, arg1Name, "int", ordCharValue)
+                raise ExecutionError(58, "ERROR 58: indexing out of string in "
+                                         "instruction number: {}\n"
+                                         .format(instruction.order))
+            self.setVariable(arg1, ordCharValue)
         else:
-            sys.stderr.write("ERROR 53: invalid operand types in instruction n"
-                             "umber: {} (symb1 = string, symb2 = int)\n"
-                             .format(instructOrderNum))
-            sys.exit(53)
-        return instructOrderNum+1
-
-
-def parseRead(instruction, interpreting):
-    instructOrderNum = int(instruction.attrib.get("order"))
-    if interpreting is False:
-        checkArgFormat(instruction, 2)
-        verifyVar(instruction[0], instructOrderNum)
-        verifyType(instruction[1], instructOrderNum)
-    else:
-        arg1 = instruction[0]
-        arg2 = instruction[1]
-        arg1Frame = getVarFrame(arg1.text)
-        arg1Name = getVarName(arg1.text)
-        type = arg2.text
+            raise ExecutionError(53, "ERROR 53: invalid operand types in instr"
+                                     "uction number: {} (symb1 = string, symb2"
+                                     " = int)\n".format(instruction.order))
+        return instruction.next
+
+    # read value of type "type" from standard input
+    # return val: value converted to runtime format
+    def readValue(self, type):
+        inpt = self.input.readLine()
+        if inpt is None:  # end of input, default value is used
+            inpt = ""
         if type == "int":
-            inpt = input()
             try:
-                value = int(inpt)
+                return int(inpt)
             except Exception:
-                value = 0
-            setVariable(arg1Frame, arg1Name, "int", value)
-        if type == "bool":
-            inpt = input()
-            if inpt.lower() == "true":
-                setVariable(arg1Frame, arg1Name, "bool", "true")
-            else:
-                setVariable(arg1Frame, arg1Name, "bool", "false")
-        if type == "string":
-            inpt = input()
-            setVariable(arg1Frame, arg1Name, "string", inpt)
-        return instructOrderNum+1
-
-
-def parseWrite(instruction, interpreting):
-    instructOrderNum = int(instruction.attrib.get("order"))
-    if interpreting is False:
-        checkArgFormat(instruction, 1)
-        verifySymb(instruction[0], instructOrderNum)
-    else:
-        arg1 = instruction[0]
-        arg1Value = getSymbVal(arg1)
-        print(arg1Value)
-        return instructOrderNum+1
-
-
-def parseConcat(instruction, interpreting):
-    instructOrderNum = int(instruction.attrib.get("order"))
-    if interpreting is False:
-        checkArgFormat(instruction, 3)
-        verifyVar(instruction[0], instructOrderNum)
-        verifySymb(instruction[1], instructOrderNum)
-        verifySymb(instruction[2], instructOrderNum)
-    else:
-        arg1 = instruction[0]
-        arg2 = instruction[1]
-        arg3 = instruction[2]
-        arg1Frame = getVarFrame(arg1.text)
-        arg1Name = getVarName(arg1.text)
-        arg2Type = getSymbType(arg2)
-        arg2Value = getSymbVal(arg2)
-        arg3Type = getSymbType(arg3)
-        arg3Value = getSymbVal(arg3)
+                return 0
+        elif type == "bool":
+            return inpt.lower() == "true"
+        else:
+            return inpt
+
+    def execRead(self, instruction):
+        arg1, arg2 = instruction.args
+        self.setVariable(arg1, self.readValue(arg2.value))
+        return instruction.next
+
+    def execWrite(self, instruction):
+        arg1Value = self.getSymbVal(instruction.args[0])
+        self.output.writeLine(printable(arg1Value))
+        return instruction.next
+
+    def execConcat(self, instruction):
+        arg1, arg2, arg3 = instruction.args
+        arg2Type = self.getSymbType(arg2)
+        arg3Type = self.getSymbType(arg3)
+        arg3Value = self.getSymbVal(arg3)
         if arg2Type == "string" and arg2Type == arg3Type:
-            result = arg2Value + arg3Value
-            setVariable(arg1Frame, arg1Name, arg2Type, result)
+            if arg1.frame == arg2.frame and arg1.slot == arg2.slot:
+                self.appendVariable(arg1, arg3Value)
+            else:
+                result = self.getSymbVal(arg2) + arg3Value
+                self.setVariable(arg1, result)
         else:
-            sys.stderr.write("ERROR 53: invalid operand types in instruction n"
-                             "umber: {} (both operands must have type str)\n"
-                             .format(instructOrderNum))
-            sys.exit(53)
-        return instructOrderNum+1
-
-
-def parseStrlen(instruction, interpreting):
-    instructOrderNum = int(instruction.attrib.get("order"))
-    if interpreting is False:
-        checkArgFormat(instruction, 2)
-        verifyVar(instruction[0], instructOrderNum)
-        verifySymb(instruction[1], instructOrderNum)
-    else:
-        arg1 = instruction[0]
-        arg2 = instruction[1]
-        arg1Frame = getVarFrame(arg1.text)
-        arg1Name = getVarName(arg1.text)
-        arg2Type = getSymbType(arg2)
-        arg2Value = getSymbVal(arg2)
+            raise ExecutionError(53, "ERROR 53: invalid operand types in instr"
+                                     "uction number: {} (both operands must ha"
+                                     "ve type str)\n"
+                                     .format(instruction.order))
+        return instruction.next
+
+    def execStrlen(self, instruction):
+        arg1, arg2 = instruction.args
+        arg2Type = self.getSymbType(arg2)
+        arg2Value = self.getSymbChars(arg2)
         if arg2Type == "string":
-            setVariable(arg1Frame, arg1Name, "int", len(arg2Value))
+            self.setVariable(arg1, len(arg2Value))
         else:
-            sys.stderr.write("ERROR 53: invalid operand type in instruction n"
-                             "umber: {} (arg2 must be string)\n"
-                             .format(instructOrderNum))
-            sys.exit(53)
-        return instructOrderNum+1
-
-
-def parseGetchar(instruction, interpreting):
-    instructOrderNum = int(instruction.attrib.get("order"))
-    if interpreting is False:
-        checkArgFormat(instruction, 3)
-        verifyVar(instruction[0], instructOrderNum)
-        verifySymb(instruction[1], instructOrderNum)
-        verifySymb(instruction[2], instructOrderNum)
-    else:
-        arg1 = instruction[0]
-        arg2 = instruction[1]
-        arg3 = instruction[2]
-        arg1Frame = getVarFrame(arg1.text)
-        arg1Name = getVarName(arg1.text)
-        arg2Type = getSymbType(arg2)
-        arg2Value = getSymbVal(arg2)
-        arg3Type = getSymbType(arg3)
-        arg3Value = getSymbVal(arg3)
+            raise ExecutionError(53, "ERROR 53: invalid operand type in instru"
+                                     "ction number: {} (arg2 must be string)\n"
+                                     .format(instruction.order))
+        return instruction.next
+
+    def execGetchar(self, instruction):
+        arg1, arg2, arg3 = instruction.args
+        arg2Type = self.getSymbType(arg2)
+        arg2Value = self.getSymbChars(arg2)
+        arg3Type = self.getSymbType(arg3)
+        arg3Value = self.getSymbVal(arg3)
         if arg2Type == "string" and arg3Type == "int":
             try:
                 character = arg2Value[arg3Value]
             except IndexError:
-                sys.stderr.write("ERROR 58: indexing out of string in instruct"
-                                 "ion number: {}\n"
-                                 .format(instructOrderNum))
-                sys.exit(58)
-            setVariable(arg1Frame, arg1Name, "string", str(character))
+                raise ExecutionError(58, "ERROR 58: indexing out of string in "
+                                         "instruction number: {}\n"
+                                         .format(instruction.order))
+            self.setVariable(arg1, str(character))
         else:
-            sys.stderr.write("ERROR 53: invalid operand types in instruction n"
-                             "umber: {} (arg2 must be string and arg3 int)\n"
-                             .format(instructOrderNum))
-            sys.exit(53)
-        return instructOrderNum+1
-
-
-def parseSetchar(instruction, interpreting):
-    instructOrderNum = int(instruction.attrib.get("order"))
-    if interpreting is False:
-        checkArgFormat(instruction, 3)
-        verifyVar(instruction[0], instructOrderNum)
-        verifySymb(instruction[1], instructOrderNum)
-        verifySymb(instruction[2], instructOrderNum)
-    else:
-        arg1 = instruction[0]
-        arg2 = instruction[1]
-        arg3 = instruction[2]
-        arg1Frame = getVarFrame(arg1.text)
-        arg1Name = getVarName(arg1.text)
-        arg2Type = getSymbType(arg2)
-        arg2Value = getSymbVal(arg2)
-        arg3Type = getSymbType(arg3)
-        arg3Value = getSymbVal(arg3)
-        if getVarType(arg1Frame, arg1Name) == "string":
+            raise ExecutionError(53, "ERROR 53: invalid operand types in instr"
+                                     "uction number: {} (arg2 must be string a"
+                                     "nd arg3 int)\n"
+                                     .format(instruction.order))
+        return instruction.next
+
+    def execSetchar(self, instruction):
+        arg1, arg2, arg3 = instruction.args
+        arg2Type = self.getSymbType(arg2)
+        arg2Value = self.getSymbVal(arg2)
+        arg3Type = self.getSymbType(arg3)
+        arg3Value = self.getSymbVal(arg3)
+        if self.getVarType(arg1) == "string":
             if arg2Type == "int" and arg3Type == "string":
                 if len(arg3Value) > 0:
-                    varString = getVarValue(arg1Frame, arg1Name)
+                    varString = self.getSymbChars(arg1)
                     try:
                         varString[arg2Value]
                     except IndexError:
-                        sys.stderr.write("ERROR 58: indexing out of string in "
-                                         "instruction number: {}\n"
-                                         .format(instructOrderNum))
-                        sys.exit(58)
-                    varString = varString[:arg2Value] + arg3Value[0] + varString[1 + arg2Value:]
-                    setVariable(arg1Frame, arg1Name, "string", varString)
+                        raise ExecutionError(58, "ERROR 58: indexing out of st"
+                                                 "ring in instruction number: "
+                                                 "{}\n"
+                                                 .format(instruction.order))
+                    self.setVariableChar(arg1, arg2Value, arg3Value[0])
                 else:
-                    print(arg3Value)
-                    print("-")
-                    sys.stderr.write("ERROR 58: invalid value in instruction n"
-                                     "umber: {} (arg3 string can't be empty)\n"
-                                     .format(instructOrderNum))
-                    sys.exit(58)
+                    self.output.writeLine(arg3Value)
+                    self.output.writeLine("-")
+                    raise ExecutionError(58, "ERROR 58: invalid value in instr"
+                                             "uction number: {} (arg3 string c"
+                                             "an't be empty)\n"
+                                             .format(instruction.order))
             else:
-                sys.stderr.write("ERROR 53: invalid operand type in instructio"
-                                 "n number: {} (arg2 must be int and ar3g stri"
-                                 "ng\n".format(instructOrderNum))
-                sys.exit(53)
+                raise ExecutionError(53, "ERROR 53: invalid operand type in in"
+                                         "struction number: {} (arg2 must be i"
+                                         "nt and ar3g string\n"
+                                         .format(instruction.order))
         else:
-            sys.stderr.write("ERROR 53: invalid operand type in instruction n"
-                             "umber: {} (variable in arg1 must be string)\n"
-                             .format(instructOrderNum))
-            sys.exit(53)
-        return instructOrderNum+1
-
-
-def parseType(instruction, interpreting):
-    instructOrderNum = int(instruction.attrib.get("order"))
-    if interpreting is False:
-        checkArgFormat(instruction, 2)
-        verifyVar(instruction[0], instructOrderNum)
-        verifySymb(instruction[1], instructOrderNum)
-    else:
-        arg1 = instruction[0]
-        arg2 = instruction[1]
-        arg1Frame = getVarFrame(arg1.text)
-        arg1Name = getVarName(arg1.text)
-        if (arg2.attrib.get("type") == "var"):
-            arg2Frame = getVarFrame(arg2.text)
-            arg2Name = getVarName(arg2.text)
-            if arg2Frame == "GF":
-                global GF
-                if GF.isVarDefined(arg2Name):
-                    if GF.isVarInitialized(arg2Name):
-                        arg2Type = GF.getVar(arg2Name).type
+            raise ExecutionError(53, "ERROR 53: invalid operand type in instru"
+                                     "ction number: {} (variable in arg1 must "
+                                     "be string)\n".format(instruction.order))
+        return instruction.next
+
+    # get type of symb for instruction TYPE (empty string for uninitialized
+    # variable)
+    def getSymbTypeName(self, arg):
+        if arg.frame is not None:
+            varName = arg.name
+            slot = arg.slot
+            if arg.frame == "GF":
+                if self.GF.isVarDefined(slot):
+                    if self.GF.isVarInitialized(slot):
+                        typeName = self.GF.getType(slot)
                     else:
-                        arg2Type = ""
+                        typeName = ""
                 else:
-                    sys.stderr.write("ERROR 54: variable: \"{}\" is undefined"
-                                     "\n".format(arg2Name))
-                    sys.exit(54)
-            elif arg2Frame == "TF":
-                global TF
-                if TF.defined:
-                    if TF.isVarDefined(arg2Name):
-                        if TF.isVarInitialized(arg2Name):
-                            arg2Type = TF.getVar(arg2Name).type
+                    raise ExecutionError(54, "ERROR 54: variable: \"{}\" is un"
+                                             "defined\n".format(varName))
+            elif arg.frame == "TF":
+                if self.TF.defined:
+                    if self.TF.isVarDefined(slot):
+                        if self.TF.isVarInitialized(slot):
+                            typeName = self.TF.getType(slot)
                         else:
-                            arg2Type = ""
+                            typeName = ""
                     else:
-                        sys.stderr.write("ERROR 54: variable: \"{}\" is undefi"
-                                         "ned\n".format(arg2Name))
-                        sys.exit(54)
+                        raise ExecutionError(54, "ERROR 54: variable: \"{}\" i"
+                                                 "s undefined\n"
+                                                 .format(varName))
                 else:
-                    sys.stderr.write("ERROR 54: accessing variable: \"{}\" fr"
-                                     "om undefined frame\n".format(arg2Name))
-                    sys.exit(54)
+                    raise ExecutionError(54, "ERROR 54: accessing variable: \""
+                                             "{}\" from undefined frame\n"
+                                             .format(varName))
             else:
-                global stackframe
-                LF = stackframe.getLF()
+                LF = self.stackframe.getLF()
                 if LF.defined:
-                    if LF.isVarDefined(arg2Name):
-                        if LF.isVarInitialized(arg2Name):
-                            arg2Type = LF.getVar(arg2Name).type
+                    if LF.isVarDefined(slot):
+                        if LF.isVarInitialized(slot):
+                            typeName = LF.getType(slot)
                         else:
-                            arg2Type = ""
+                            typeName = ""
                     else:
-                        sys.stderr.write("ERROR 54: variable: \"{}\" is unde"
-                                         "fined\n".format(arg2Name))
-                        sys.exit(54)
+                        raise ExecutionError(54, "ERROR 54: variable: \"{}\" i"
+                                                 "s undefined\n"
+                                                 .format(varName))
                 else:
-                    sys.stderr.write("ERROR 54: accessing variable: \"{}\" fr"
-                                     "om undefined frame\n".format(arg2Name))
-                    sys.exit(54)
+                    raise ExecutionError(54, "ERROR 54: accessing variable: \""
+                                             "{}\" from undefined frame\n"
+                                             .format(varName))
         else:
-            arg2Type = getSymbType(arg2)
-        setVariable(arg1Frame, arg1Name, "string", arg2Type)
-        return instructOrderNum+1
-
+            typeName = arg.type
+        return typeName
+
+    def execType(self, instruction):
+        arg1, arg2 = instruction.args
+        self.setVariable(arg1, self.getSymbTypeName(arg2))
+        return instruction.next
+
+    def execLabel(self, instruction):
+        return instruction.next
+
+    def execJump(self, instruction):
+        return instruction.target
+
+    def execJumpifeq(self, instruction):
+        arg1, arg2, arg3 = instruction.args
+        arg2Type = self.getSymbType(arg2)
+        arg2Value = self.getSymbVal(arg2)
+        arg3Type = self.getSymbType(arg3)
+        arg3Value = self.getSymbVal(arg3)
+        if arg2Type == arg3Type:
+            if arg2Value == arg3Value:
+                return instruction.target
+            else:
+                return instruction.next
+        else:
+            raise ExecutionError(53, "ERROR 53: invalid operand types in instr"
+                                     "uction number: {} (both operands must ha"
+                                     "ve same type)\n"
+                                     .format(instruction.order))
+
+    def execJumpifneq(self, instruction):
+        arg1, arg2, arg3 = instruction.args
+        arg2Type = self.getSymbType(arg2)
+        arg2Value = self.getSymbVal(arg2)
+        arg3Type = self.getSymbType(arg3)
+        arg3Value = self.getSymbVal(arg3)
+        if arg2Type == arg3Type:
+            if arg2Value == arg3Value:
+                return instruction.next
+            else:
+                return instruction.target
+        else:
+            raise ExecutionError(53, "ERROR 53: invalid operand types in instr"
+                                     "uction number: {} (both operands must ha"
+                                     "ve same type)\n"
+                                     .format(instruction.order))
+
+    def execDprint(self, instruction):
+        self.stderr.write(printable(self.getSymbVal(instruction.args[0])))
+        self.stderr.write("\n")
+        return instruction.next
+
+    def execBreak(self, instruction):
+        if self.stackframe.empty:
+            LFvar = "EMPTY STACKFRAME"
+            LFdef = "EMPTY STACKFRAME"
+        else:
+            LF = self.stackframe.getLF()
+            LFvar = LF.variables()
+            LFdef = LF.defined
+        self.stderr.write("instructions proceeded: {}\n"
+                          "instruction number: {}\n"
+                          "GF defined: {}\n"
+                          "GF variables: {}\n"
+                          "TF defined: {}\n"
+                          "TF variables: {}\n"
+                          "LF defined: {}\n"
+                          "LF variables: {}\n"
+                          .format(self.instructCount, instruction.order,
+                                  str(self.GF.defined),
+                                  str(self.GF.variables()),
+                                  str(self.TF.defined),
+                                  str(self.TF.variables()), str(LFdef),
+                                  str(LFvar)))
+        return instruction.next
+
+    # superinstructions (see optimizeProgram) have their pair of
+    # instructions in args, pair is interpreted at once when it's going to
+    # succeed, otherwise its instructions are interpreted one by one (so
+    # errors are the same)
+
+    # get value of symb "arg" or None if variable (or its frame) is undefined
+    # or uninitialized
+    def peekSymb(self, arg):
+        if arg.frame is None:
+            return arg.value
+        if arg.frame == "GF":
+            frame = self.GF
+        elif arg.frame == "TF":
+            frame = self.TF
+        elif self.stackframe.stack:
+            frame = self.stackframe.stack[-1]
+        else:
+            return None
+        if not frame.defined or frame.values[arg.slot] is undefined:
+            return None
+        return frame.getValue(arg.slot)
+
+    def execPair(self, instruction):
+        first, second = instruction.args
+        self.handlers[first.opcode](first)
+        self.instructCount += 1
+        return self.handlers[second.opcode](second)
+
+    def execArithJump(self, instruction):
+        arith = instruction.args[0]
+        arg1, arg2, arg3 = arith.args
+        value2 = self.peekSymb(arg2)
+        value3 = self.peekSymb(arg3)
+        operation = superOperations[arith.opcode]
+        if (type(value2) is int and type(value3) is int and
+                not (operation is floordiv and value3 == 0)):
+            self.setVariable(arg1, operation(value2, value3))
+            self.instructCount += 1
+            return instruction.target
+        return self.execPair(instruction)
+
+    def execCompareBranch(self, instruction):
+        compare, branch = instruction.args
+        arg1, arg2, arg3 = compare.args
+        value2 = self.peekSymb(arg2)
+        value3 = self.peekSymb(arg3)
+        if value2 is not None and type(value2) is type(value3):
+            result = superOperations[compare.opcode](value2, value3)
+            self.setVariable(arg1, result)
+            self.instructCount += 1
+            constant = branch.args[1]
+            if constant.frame is not None:
+                constant = branch.args[2]
+            if ((result == constant.value) ==
+                    (branch.opcode == opcodeIds["JUMPIFEQ"])):
+                return instruction.target
+            return instruction.next
+        return self.execPair(instruction)
+
+    def execPushPop(self, instruction):
+        push, pop = instruction.args
+        value = self.peekSymb(push.args[0])
+        if value is None:
+            return self.execPair(instruction)
+        self.instructCount += 1
+        datastack = self.datastack  # value is on stack for a moment
+        datastack.peak = max(datastack.peak, len(datastack.stack) + 1)
+        self.setVariable(pop.args[0], value)
+        return instruction.next
+
+
+# loads label defined by LABEL instruction to "labels" (name -> order number)
+def loadLabel(instruction, labels):
+    instructOrderNum = instruction.order
+    checkArgFormat(instruction, 1)
+    arg1 = instruction.args[0]
+    if arg1.type == "label":
+        label = arg1.text
+        if label is None or len(label) < 1:
+            raise ProgramError(32, "ERROR 32: instruction number: {} has inval"
+                                   "id label name\n".format(instructOrderNum))
+        else:
+            if label in labels:
+                raise ProgramError(52, "ERROR 52: label: \"{}\" is already def"
+                                       "ined\n".format(label))
+            else:
+                labels[label] = instructOrderNum
+    else:
+        raise ProgramError(32, "ERROR 32: instruction number: {} has wrong: ar"
+                               "gument type (expected label)\n"
+                               .format(instructOrderNum))
+
+
+# table for instruction parsing (same as $instructOp in parse.php)
+# opcode -> list of expected types of arguments (var/symb/label/type)
+instructFormat = {
+     "MOVE": ["var", "symb"],
+     "CREATEFRAME": [],
+     "PUSHFRAME": [],
+     "POPFRAME": [],
+     "DEFVAR": ["var"],
+     "CALL": ["label"],
+     "RETURN": [],
+     "PUSHS": ["symb"],
+     "POPS": ["var"],
+     "ADD": ["var", "symb", "symb"],
+     "SUB": ["var", "symb", "symb"],
+     "MUL": ["var", "symb", "symb"],
+     "IDIV": ["var", "symb", "symb"],
+     "LT": ["var", "symb", "symb"],
+     "GT": ["var", "symb", "symb"],
+     "EQ": ["var", "symb", "symb"],
+     "AND": ["var", "symb", "symb"],
+     "OR": ["var", "symb", "symb"],
+     "NOT": ["var", "symb"],
+     "INT2CHAR": ["var", "symb"],
+     "STRI2INT": ["var", "symb", "symb"],
+     "READ": ["var", "type"],
+     "WRITE": ["symb"],
+     "CONCAT": ["var", "symb", "symb"],
+     "STRLEN": ["var", "symb"],
+     "GETCHAR": ["var", "symb", "symb"],
+     "SETCHAR": ["var", "symb", "symb"],
+     "TYPE": ["var", "symb"],
+     "LABEL": ["label"],
+     "JUMP": ["label"],
+     "JUMPIFEQ": ["label", "symb", "symb"],
+     "JUMPIFNEQ": ["label", "symb", "symb"],
+     "DPRINT": ["symb"],
+     "BREAK": [],
+}
 
-def parseLabel(instruction, interpreting):
-    instructOrderNum = int(instruction.attrib.get("order"))
-    return instructOrderNum+1
 
+# determine which interpreting method (of Interpreter) should be called based
+# on numeric id of opcode (position in this list) stored in decoded
+# instruction
+# argument: decoded instruction
+# return val: position of next instruction
+opcodeParser = [
+     ("MOVE", Interpreter.execMove),
+     ("CREATEFRAME", Interpreter.execCreateframe),
+     ("PUSHFRAME", Interpreter.execPushframe),
+     ("POPFRAME", Interpreter.execPopframe),
+     ("DEFVAR", Interpreter.execDefvar),
+     ("CALL", Interpreter.execCall),
+     ("RETURN", Interpreter.execReturn),
+     ("PUSHS", Interpreter.execPushs),
+     ("POPS", Interpreter.execPops),
+     ("ADD", Interpreter.execAdd),
+     ("SUB", Interpreter.execSub),
+     ("MUL", Interpreter.execMul),
+     ("IDIV", Interpreter.execIdiv),
+     ("LT", Interpreter.execLt),
+     ("GT", Interpreter.execGt),
+     ("EQ", Interpreter.execEq),
+     ("AND", Interpreter.execAnd),
+     ("OR", Interpreter.execOr),
+     ("NOT", Interpreter.execNot),
+     ("INT2CHAR", Interpreter.execInt2char),
+     ("STRI2INT", Interpreter.execStri2int),
+     ("READ", Interpreter.execRead),
+     ("WRITE", Interpreter.execWrite),
+     ("CONCAT", Interpreter.execConcat),
+     ("STRLEN", Interpreter.execStrlen),
+     ("GETCHAR", Interpreter.execGetchar),
+     ("SETCHAR", Interpreter.execSetchar),
+     ("TYPE", Interpreter.execType),
+     ("LABEL", Interpreter.execLabel),
+     ("JUMP", Interpreter.execJump),
+     ("JUMPIFEQ", Interpreter.execJumpifeq),
+     ("JUMPIFNEQ", Interpreter.execJumpifneq),
+     ("DPRINT", Interpreter.execDprint),
+     ("BREAK", Interpreter.execBreak),
+]
+
+# superinstructions of peephole optimizer (see optimizeProgram), their ids
+# follow ids of opcodeParser (they are not part of any loaded program)
+superinstructions = [
+     ("ARITH+JUMP", Interpreter.execArithJump),
+     ("COMPARE+BRANCH", Interpreter.execCompareBranch),
+     ("PUSHS+POPS", Interpreter.execPushPop),
+]
+opcodeIds = {name: id for id, (name, _)
+             in enumerate(opcodeParser + superinstructions)}
+opcodeNames = [name for (name, _) in opcodeParser + superinstructions]
+opcodeExec = [execute for (_, execute) in opcodeParser + superinstructions]
+
+
+# syntax/semantic verification of label argument, label is added to
+# "references" (it must exist but it can be defined later in program)
+def verifyLabel(arg, instructOrderNum, references):
+    if arg.type != "label":
+        raise ProgramError(32, "ERROR 32: instruction number: {} has wrong: ar"
+                               "gument type (expected label)\n"
+                               .format(instructOrderNum))
+    label = arg.text
+    if label is None or len(label) < 1:
+        raise ProgramError(32, "ERROR 32: instruction number: {} has invalid l"
+                               "abel name\n".format(instructOrderNum))
+    references.append((instructOrderNum, label))
+
+
+# pre-runtime parsing istruction, used labels are added to "references",
+# string literals to constant pool "strings"
+def verifyInstruct(instruct, references, strings):
+    opcode = instruct.opcode
+    if opcode not in instructFormat:
+        raise ProgramError(32, "ERROR 32: Unknown opcode \"{}\"\n"
+                               .format(opcode))
+    if opcode == "LABEL":
+        return  # labels are checked by loadLabel()
+    argTypes = instructFormat[opcode]
+    instructOrderNum = instruct.order
+    checkArgFormat(instruct, len(argTypes))
+    for arg, argType in zip(instruct.args, argTypes):
+        if argType == "var":
+            verifyVar(arg, instructOrderNum)
+        elif argType == "symb":
+            verifySymb(arg, instructOrderNum, strings)
+        elif argType == "type":
+            verifyType(arg, instructOrderNum)
+    # label is checked as last
+    for arg, argType in zip(instruct.args, argTypes):
+        if argType == "label":
+            verifyLabel(arg, instructOrderNum, references)
+
+
+# verification of program in one pass over its instructions (in document
+# order), first error is the same as if all labels were loaded first and
+# then all instructions were verified:
+# - error in definition of label is reported before all other errors
+# - references to labels are collected and resolved at the end, missing label
+#   is reported if it is referenced before the first other error
+# labels -> labels of program loaded so far (name -> order number)
+# strings -> constant pool of string literals of program (see extractString)
+# time -> duration of verification in nanoseconds
+class ProgramVerifier():
+    labels = None
+    labelError = None
+    error = None
+    references = None
+    strings = None
+    time = None
 
-def parseJump(instruction, interpreting):
-    instructOrderNum = int(instruction.attrib.get("order"))
-    global labels
-    if interpreting is False:
-        checkArgFormat(instruction, 1)
-        arg1 = instruction[0]
-        if arg1.attrib.get("type") == "label":
-            label = arg1.text
-            if label in labels:
+    def __init__(self):
+        self.labels = {}
+        self.references = []
+        self.strings = {}
+        self.time = 0
+
+    def verify(self, instruct):
+        start = perf_counter_ns()
+        self.check(instruct)
+        self.time += perf_counter_ns() - start
+
+    def check(self, instruct):
+        if self.labelError is not None:
+            return  # no other error can be reported
+        if instruct.opcode == "LABEL":
+            try:
+                loadLabel(instruct, self.labels)
+            except ProgramError as error:
+                self.labelError = error
                 return
+        if self.error is None:
+            try:
+                verifyInstruct(instruct, self.references, self.strings)
+            except ProgramError as error:
+                self.error = error
+
+    # raise first error of verified program
+    def finish(self):
+        start = perf_counter_ns()
+        self.resolve()
+        self.time += perf_counter_ns() - start
+
+    def resolve(self):
+        if self.labelError is not None:
+            raise self.labelError
+        for instructOrderNum, label in self.references:
+            if label not in self.labels:
+                raise ProgramError(52, "ERROR 52: instruction number: {} reque"
+                                       "sts jump on nonexistent label \"{}\"\n"
+                                       .format(instructOrderNum, label))
+        if self.error is not None:
+            raise self.error
+
+
+# lower loaded argument to decoded operand, string literals are taken from
+# constant pool "strings" (see extractString)
+def decodeArg(arg, strings):
+    argType = arg.type
+    if argType == "var":
+        return Operand(getVarFrame(arg.text), getVarName(arg.text), None, None)
+    elif argType == "int":
+        return Operand(None, None, argType, int(arg.text))
+    elif argType == "string":
+        return Operand(None, None, argType,
+                       extractString(arg.text, strings))
+    elif argType == "bool":
+        return Operand(None, None, argType, strToBool(arg.text))
+    else:  # label and type are kept as strings
+        return Operand(None, None, argType, arg.text)
+
+
+# lower verified program to list of decoded instructions, positions in list
+# are the same as in table.instructions, "labels" are labels of program,
+# "strings" is its constant pool of string literals
+def decodeProgram(table, labels, strings):
+    code = []
+    end = len(table.instructions)
+    for position, instruct in enumerate(table.instructions):
+        opcode = instruct.opcode
+        args = tuple(decodeArg(arg, strings) for arg in instruct.args)
+        nextPosition = position + 1
+        if (nextPosition < end and
+                table.orders[nextPosition] != table.orders[position] + 1):
+            nextPosition = ~nextPosition  # some order numbers are skipped
+        target = None
+        if opcode in ("CALL", "JUMP", "JUMPIFEQ", "JUMPIFNEQ"):
+            target = table.index[labels[args[0].value]]
+        code.append(Instruction(opcodeIds[opcode], table.orders[position],
+                                args, nextPosition, target))
+    return code
+
+
+# assign slots to variables of decoded program, variables of GF get their own
+# layout, every frame created by CREATEFRAME gets layout of the names which
+# can be used with it (frame is moved from TF to LF by PUSHFRAME and back by
+# POPFRAME, see localFrameSites), CREATEFRAME instructions whose frames can
+# be used by the same TF or LF operand share one layout, when the frames
+# can't be determined all of them share one layout of all names used with TF
+# or LF
+def allocateSlots(program):
+    globalSlots = {}
+    localSlots = {}
+    for instruction in program.code:
+        for arg in instruction.args:
+            if arg.frame == "GF":
+                slots = globalSlots
+            elif arg.frame is not None:
+                slots = localSlots
             else:
-                sys.stderr.write("ERROR 52: instruction number: {} requests ju"
-                                 "mp on nonexistent label\n"
-                                 .format(instructOrderNum))
-                sys.exit(52)
-        else:
-            sys.stderr.write("ERROR 32: instruction number: {} has wrong:"
-                             " argument type (expected label)\n"
-                             .format(instructOrderNum))
-            sys.exit(32)
-    else:
-        arg1 = instruction[0]
-        label = arg1.text
-        return labels[label]
-
-
-def parseJumpifeq(instruction, interpreting):
-    instructOrderNum = int(instruction.attrib.get("order"))
-    global labels
-    if interpreting is False:
-        checkArgFormat(instruction, 3)
-        verifySymb(instruction[1], instructOrderNum)
-        verifySymb(instruction[2], instructOrderNum)
-        arg1 = instruction[0]
-        if arg1.attrib.get("type") == "label":
-            label = arg1.text
-            if label in labels:
+                continue
+            if arg.name not in slots:
+                slots[arg.name] = len(slots)
+            arg.slot = slots[arg.name]
+    program.globalLayout = list(globalSlots)
+    program.localLayout = list(localSlots)
+    code = program.code
+    creates = [position for position, instruction in enumerate(code)
+               if opcodeNames[instruction.opcode] == "CREATEFRAME"]
+    accesses = localFrameSites(code, program.table.first())
+    if accesses is None:  # frames are unknown, slots of shared layout
+        program.frameLayouts = {code[position].order: program.localLayout
+                                for position in creates}
+        return
+    parents = {position: position for position in creates}  # union-find
+
+    def find(site):
+        while parents[site] != site:
+            parents[site] = parents[parents[site]]
+            site = parents[site]
+        return site
+
+    for sites in accesses.values():
+        for site in sites:
+            parents[find(site)] = find(min(sites))
+    names = {find(site): set() for site in creates}
+    for (position, index), sites in accesses.items():
+        if sites:
+            names[find(min(sites))].add(code[position].args[index].name)
+    layouts = {}  # names are in the same order as in shared layout
+    for root, rootNames in names.items():
+        layouts[root] = sorted(rootNames, key=localSlots.get)
+    slots = {root: {name: slot for slot, name in enumerate(layout)}
+             for root, layout in layouts.items()}
+    assigned = set()  # operands with slot of their frame layout
+    for position, instruction in enumerate(code):
+        args = list(instruction.args)
+        for index, arg in enumerate(args):
+            if arg.frame not in ("TF", "LF"):
+                continue
+            sites = accesses.get((position, index))
+            if sites:
+                slot = slots[find(min(sites))][arg.name]
+            else:  # frame is never defined (or code is unreachable)
+                slot = 0
+            if id(arg) in assigned and arg.slot != slot:
+                arg = copy(arg)  # operand shared by bytecode loader
+            arg.slot = slot
+            assigned.add(id(arg))
+            args[index] = arg
+        instruction.args = tuple(args)
+    program.frameLayouts = {code[position].order: layouts[find(position)]
+                            for position in creates}
+
+
+# depth of return addresses and of stack of frames tracked by
+# localFrameSites, deeper ones are merged
+frameTrackDepth = 4
+# limit of steps of localFrameSites per instruction
+frameTrackSteps = 64
+
+
+# positions of CREATEFRAME instructions whose frames can be accessed by TF or
+# LF operands of decoded program "code" starting on position "start", every
+# instruction is tracked in context of return addresses of call stack (None
+# when there are more than frameTrackDepth of them, then all such calls are
+# tracked together and RETURN returns behind every CALL which can lead to
+# it, see returnTargets), state of frames before instruction is:
+# - positions of CREATEFRAME instructions whose frame can be TF
+# - stack of frames as set of positions for every frame (up to
+#   frameTrackDepth of the top ones) and set of positions for all frames
+#   below them (None if there are none)
+# return val: (position of instruction, index of operand) -> set of positions
+#             or None if program needs too many steps
+def localFrameSites(code, start):
+    returns = returnTargets(code)
+    empty = frozenset()
+    states = {}
+    work = []  # heap of changed states, they are handled by positions (so
+    queued = set()  # states which flow into instruction are joined first)
+    pushed = 0
+
+    def flow(position, context, state):
+        nonlocal pushed
+        if position < 0:
+            position = ~position
+        if position >= len(code):
+            return
+        key = (position, context)
+        old = states.get(key)
+        if old is not None:
+            state = joinFrameStates(old, state)
+            if state == old:
                 return
+        states[key] = state
+        if key not in queued:
+            queued.add(key)
+            pushed += 1
+            heappush(work, (position, pushed, key))
+
+    flow(start, (), (empty, None, ()))
+    steps = frameTrackSteps * len(code)
+    while work:
+        steps -= 1
+        if steps < 0:
+            return None
+        key = heappop(work)[2]
+        queued.discard(key)
+        position, context = key
+        frame, below, stack = states[key]
+        instruction = code[position]
+        opcode = opcodeNames[instruction.opcode]
+        if opcode == "CREATEFRAME":
+            frame = frozenset([position])
+        elif opcode == "PUSHFRAME":
+            stack = stack + (frame,)
+            frame = empty
+            if len(stack) > frameTrackDepth:
+                below = stack[0] if below is None else below | stack[0]
+                stack = stack[1:]
+        elif opcode == "POPFRAME":
+            if stack:
+                frame = stack[-1]
+                stack = stack[:-1]
             else:
-                sys.stderr.write("ERROR 52: instruction number: {} requests ju"
-                                 "mp on nonexistent label\n"
-                                 .format(instructOrderNum))
-                sys.exit(52)
+                frame = empty if below is None else below
+        state = (frame, below, stack)
+        if opcode == "CALL":
+            if context is not None:
+                context = context + (instruction.next,)
+                if len(context) > frameTrackDepth:
+                    context = None
+            flow(instruction.target, context, state)
+        elif opcode == "RETURN":
+            if context is None:  # return address isn't known
+                for address in returns.get(position, ()):
+                    flow(address, context, state)
+            elif context:
+                flow(context[-1], context[:-1], state)
         else:
-            sys.stderr.write("ERROR 32: instruction number: {} has wrong:"
-                             " argument type (expected label)\n"
-                             .format(instructOrderNum))
-            sys.exit(32)
+            for successor in successors(instruction, []):
+                flow(successor, context, state)
+    accesses = {}
+    for (position, context), (frame, below, stack) in states.items():
+        for index, arg in enumerate(code[position].args):
+            if arg.frame == "TF":
+                sites = frame
+            elif arg.frame == "LF":
+                sites = stack[-1] if stack else below or empty
+            else:
+                continue
+            accesses[(position, index)] = (accesses.get((position, index),
+                                                        empty) | sites)
+    return accesses
+
+
+# join states of frames (see localFrameSites), stacks are aligned by their
+# top frames
+def joinFrameStates(state1, state2):
+    frame1, below1, stack1 = state1
+    frame2, below2, stack2 = state2
+    depth = min(len(stack1), len(stack2))
+    rest = stack1[:len(stack1) - depth] + stack2[:len(stack2) - depth]
+    below = None
+    for sites in (below1, below2) + rest:
+        if sites is not None:
+            below = sites if below is None else below | sites
+    stack = tuple(sites1 | sites2 for sites1, sites2 in
+                  zip(stack1[len(stack1) - depth:],
+                      stack2[len(stack2) - depth:]))
+    return (frame1 | frame2, below, stack)
+
+
+# return addresses of RETURN instructions of decoded program "code", RETURN
+# returns behind CALL if it is reachable from target of the CALL (calls
+# inside are skipped as if they returned)
+# return val: position of RETURN -> list of positions
+def returnTargets(code):
+    calls = {}
+    for instruction in code:
+        if opcodeNames[instruction.opcode] == "CALL":
+            calls.setdefault(instruction.target, []).append(instruction.next)
+    returns = {}
+    for target, addresses in calls.items():
+        reachable = set()
+        work = [target]
+        while work:
+            position = work.pop()
+            if position >= len(code) or position in reachable:
+                continue
+            reachable.add(position)
+            instruction = code[position]
+            opcode = opcodeNames[instruction.opcode]
+            if opcode == "RETURN":
+                returns.setdefault(position, []).extend(addresses)
+            elif opcode == "CALL":
+                nextPosition = instruction.next
+                work.append(~nextPosition if nextPosition < 0
+                            else nextPosition)
+            else:
+                work.extend(successors(instruction, []))
+    return returns
+
+
+# slots of variables which may hold StringBuffer (destinations of SETCHAR and
+# of CONCAT appending to the variable itself) as pairs (True for GF or False
+# for TF and LF, slot)
+def bufferedSlots(program):
+    slots = set()
+    for instruction in program.code:
+        opcode = opcodeNames[instruction.opcode]
+        if opcode == "CONCAT":
+            arg1, arg2, arg3 = instruction.args
+            if arg1.frame == arg2.frame and arg1.slot == arg2.slot:
+                slots.add((arg1.frame == "GF", arg1.slot))
+        elif opcode == "SETCHAR":
+            arg1 = instruction.args[0]
+            slots.add((arg1.frame == "GF", arg1.slot))
+    return slots
+
+
+# load and verify program from opened "file" with source in format
+# "sourceFormat" (xml or text)
+# return val: program (Program)
+def loadSource(file, sourceFormat="xml"):
+    verifier = ProgramVerifier()  # instructions are verified in one pass
+    if sourceFormat == "text":
+        instructions = loadTextProgram(file, verifier)
     else:
-        arg1 = instruction[0]
-        arg2 = instruction[1]
-        arg3 = instruction[2]
-        arg2Type = getSymbType(arg2)
-        arg2Value = getSymbVal(arg2)
-        arg3Type = getSymbType(arg3)
-        arg3Value = getSymbVal(arg3)
-        label = arg1.text
-        if arg2Type == arg3Type:
-            if arg2Value == arg3Value:
-                return labels[label]
+        instructions = loadProgram(file, verifier)
+    verifier.finish()
+    table = InstructTable(instructions)  # index instructions by order numbers
+    # lower to runtime format
+    code = decodeProgram(table, verifier.labels, verifier.strings)
+    program = Program(code, table, verifier.labels)
+    program.validateTime = verifier.time
+    return program
+
+
+# load program from file "fileName" with source in format "sourceFormat", XML
+# format includes bytecode, verified program is taken from "cache"
+# (ProgramCache) when it is there and stored to it otherwise
+# return val: program (Program)
+def loadFile(fileName, sourceFormat="xml", cache=None):
+    with openFile(fileName) as file:
+        # XML or bytecode format of program (text format is explicit)
+        if sourceFormat == "xml" and isBytecode(fileName):
+            return loadBytecode(fileName)
+        if cache is None:
+            return loadSource(file, sourceFormat)
+        key = cache.key(fileName, sourceFormat)
+        program = cache.load(key)
+        if program is None:
+            program = loadSource(file, sourceFormat)
+            cache.store(key, program)
+        return program
+
+
+# runtime interpretation of decoded instructions (reference engine)
+def interpretCode(vm, program):
+    code = program.code
+    table = program.table
+    handlers = vm.handlers
+    position = table.start(vm.stderr)  # start with first instruction
+    end = len(code)
+    while position < end:
+        instruction = code[position]
+        position = handlers[instruction.opcode](instruction)
+        vm.instructCount += 1
+        if position < 0:
+            position = table.skipGap(~position, vm.stderr)
+
+
+# ######### closure engine ("threaded code") ###########
+# every decoded instruction is compiled once to closure with its operands
+# (frame slots, constants, positions) bound in, calling the closure
+# executes instruction and returns position of next instruction
+# closures handle only successful execution, whenever they find out that
+# instruction is going to fail they call reference implementation (execXxx)
+# which reports the same error as reference engine (closure does no side
+# effects before that)
+
+
+# compile reading of symb, returned function returns value or None if
+# variable (or its frame) is undefined or uninitialized
+def compileReader(vm, arg):
+    if arg.frame is None:
+        constValue = arg.value
+        return lambda: constValue
+    slot = arg.slot
+    if (arg.frame == "GF", slot) in vm.bufferSlots:  # may hold StringBuffer
+        return partial(vm.peekSymb, arg)
+    if arg.frame == "GF":
+        values = vm.GF.values
+        if arg.type is not None:  # initialized value is proven
+            return lambda: values[slot]
+
+        def readGF():
+            value = values[slot]
+            if value is undefined:
+                return None
+            return value
+        return readGF
+    elif arg.frame == "TF":
+        def readTF():
+            frame = vm.TF  # TF is replaced by PUSHFRAME and POPFRAME
+            if frame.defined and frame.values[slot] is not undefined:
+                return frame.values[slot]
+            return None
+        return readTF
+    else:
+        stack = vm.stackframe.stack
+
+        def readLF():
+            if stack and stack[-1].values[slot] is not undefined:
+                return stack[-1].values[slot]
+            return None
+        return readLF
+
+
+# compile assignment to variable, returned function returns False without
+# setting anything if variable (or its frame) is undefined
+def compileWriter(vm, arg):
+    slot = arg.slot
+    if arg.frame == "GF":
+        values = vm.GF.values
+
+        def writeGF(value):
+            if values[slot] is undefined:
+                return False
+            vm.initVarsCount += 1
+            values[slot] = value
+            return True
+        return writeGF
+    elif arg.frame == "TF":
+        def writeTF(value):
+            frame = vm.TF
+            if not frame.defined or frame.values[slot] is undefined:
+                return False
+            vm.initVarsCount += 1
+            frame.values[slot] = value
+            return True
+        return writeTF
+    else:
+        stack = vm.stackframe.stack
+
+        def writeLF(value):
+            if not stack or stack[-1].values[slot] is undefined:
+                return False
+            vm.initVarsCount += 1
+            stack[-1].values[slot] = value
+            return True
+        return writeLF
+
+
+# ADD, SUB, MUL, IDIV
+def compileArithmetic(vm, instruction, operation):
+    arg1, arg2, arg3 = instruction.args
+    write = compileWriter(vm, arg1)
+    read2 = compileReader(vm, arg2)
+    read3 = compileReader(vm, arg3)
+    nextPosition = instruction.next
+    fallback = vm.handlers[instruction.opcode]
+    checkZero = operation is floordiv
+
+    if provenType(arg2) == "int" and provenType(arg3) == "int":
+        def provenArithmetic():
+            value3 = read3()
+            if (not (checkZero and value3 == 0) and
+                    write(operation(read2(), value3))):
+                return nextPosition
+            return fallback(instruction)
+        return provenArithmetic
+
+    def arithmetic():
+        value2 = read2()
+        value3 = read3()
+        if (type(value2) is int and type(value3) is int and
+                not (checkZero and value3 == 0) and
+                write(operation(value2, value3))):
+            return nextPosition
+        return fallback(instruction)
+    return arithmetic
+
+
+# LT, GT, EQ
+def compileRelational(vm, instruction, operation):
+    arg1, arg2, arg3 = instruction.args
+    write = compileWriter(vm, arg1)
+    read2 = compileReader(vm, arg2)
+    read3 = compileReader(vm, arg3)
+    nextPosition = instruction.next
+    fallback = vm.handlers[instruction.opcode]
+
+    if provenType(arg2) is not None and provenType(arg2) == provenType(arg3):
+        def provenRelational():
+            if write(operation(read2(), read3())):
+                return nextPosition
+            return fallback(instruction)
+        return provenRelational
+
+    def relational():
+        value2 = read2()
+        value3 = read3()
+        if (value2 is not None and type(value2) is type(value3) and
+                write(operation(value2, value3))):
+            return nextPosition
+        return fallback(instruction)
+    return relational
+
+
+# AND, OR
+def compileLogical(vm, instruction, isAnd):
+    arg1, arg2, arg3 = instruction.args
+    write = compileWriter(vm, arg1)
+    read2 = compileReader(vm, arg2)
+    read3 = compileReader(vm, arg3)
+    nextPosition = instruction.next
+    fallback = vm.handlers[instruction.opcode]
+
+    def logical():
+        value2 = read2()
+        value3 = read3()
+        if type(value2) is bool and type(value3) is bool:
+            if isAnd:
+                result = value2 and value3
             else:
-                return instructOrderNum+1
+                result = value2 or value3
+            if write(result):
+                return nextPosition
+        return fallback(instruction)
+    return logical
+
+
+def compileNot(vm, instruction):
+    arg1, arg2 = instruction.args
+    write = compileWriter(vm, arg1)
+    read2 = compileReader(vm, arg2)
+    nextPosition = instruction.next
+
+    def not_():
+        value2 = read2()
+        if type(value2) is bool and write(not value2):
+            return nextPosition
+        return vm.execNot(instruction)
+    return not_
+
+
+def compileMove(vm, instruction):
+    arg1, arg2 = instruction.args
+    write = compileWriter(vm, arg1)
+    read2 = compileReader(vm, arg2)
+    nextPosition = instruction.next
+
+    def move():
+        value2 = read2()
+        if value2 is not None and write(value2):
+            return nextPosition
+        return vm.execMove(instruction)
+    return move
+
+
+def compileConcat(vm, instruction):
+    arg1, arg2, arg3 = instruction.args
+    write = compileWriter(vm, arg1)
+    read2 = compileReader(vm, arg2)
+    read3 = compileReader(vm, arg3)
+    nextPosition = instruction.next
+
+    if arg1.frame == arg2.frame and arg1.slot == arg2.slot:  # appending
+        if arg1.frame != "GF":
+            return partial(vm.execConcat, instruction)
+        values = vm.GF.values
+        slot = arg1.slot
+
+        def appendConcat():
+            value2 = values[slot]
+            value3 = read3()
+            if type(value2) is StringBuffer and type(value3) is str:
+                value2.append(value3)
+                vm.initVarsCount += 1
+                return nextPosition
+            return vm.execConcat(instruction)  # first appending too
+        return appendConcat
+
+    if provenType(arg2) == "string" and provenType(arg3) == "string":
+        def provenConcat():
+            if write(read2() + read3()):
+                return nextPosition
+            return vm.execConcat(instruction)
+        return provenConcat
+
+    def concat():
+        value2 = read2()
+        value3 = read3()
+        if (type(value2) is str and type(value3) is str and
+                write(value2 + value3)):
+            return nextPosition
+        return vm.execConcat(instruction)
+    return concat
+
+
+def compileStrlen(vm, instruction):
+    arg1, arg2 = instruction.args
+    write = compileWriter(vm, arg1)
+    read2 = compileReader(vm, arg2)
+    nextPosition = instruction.next
+
+    if (arg2.frame == "GF", arg2.slot) in vm.bufferSlots:
+        return partial(vm.execStrlen, instruction)  # buffer is not joined
+
+    def strlen():
+        value2 = read2()
+        if type(value2) is str and write(len(value2)):
+            return nextPosition
+        return vm.execStrlen(instruction)
+    return strlen
+
+
+# GETCHAR, STRI2INT
+def compileIndexing(vm, instruction, conversion):
+    arg1, arg2, arg3 = instruction.args
+    write = compileWriter(vm, arg1)
+    read2 = compileReader(vm, arg2)
+    read3 = compileReader(vm, arg3)
+    nextPosition = instruction.next
+    fallback = vm.handlers[instruction.opcode]
+    if (arg2.frame == "GF", arg2.slot) in vm.bufferSlots:
+        return partial(fallback, instruction)  # buffer is not joined
+
+    def indexing():
+        value2 = read2()
+        value3 = read3()
+        if type(value2) is str and type(value3) is int:
+            try:
+                character = value2[value3]
+            except IndexError:
+                return fallback(instruction)
+            if write(conversion(character)):
+                return nextPosition
+        return fallback(instruction)
+    return indexing
+
+
+def compileInt2char(vm, instruction):
+    arg1, arg2 = instruction.args
+    write = compileWriter(vm, arg1)
+    read2 = compileReader(vm, arg2)
+    nextPosition = instruction.next
+
+    def int2char():
+        value2 = read2()
+        if type(value2) is int:
+            try:
+                character = chr(value2)
+            except ValueError:
+                return vm.execInt2char(instruction)
+            if write(character):
+                return nextPosition
+        return vm.execInt2char(instruction)
+    return int2char
+
+
+def compileWrite(vm, instruction):
+    read1 = compileReader(vm, instruction.args[0])
+    writeLine = vm.output.writeLine
+    nextPosition = instruction.next
+
+    def write():
+        value1 = read1()
+        if value1 is None:
+            return vm.execWrite(instruction)
+        writeLine(printable(value1))
+        return nextPosition
+    return write
+
+
+# JUMPIFEQ, JUMPIFNEQ
+def compileConditionalJump(vm, instruction, jumpIfEqual):
+    arg1, arg2, arg3 = instruction.args
+    read2 = compileReader(vm, arg2)
+    read3 = compileReader(vm, arg3)
+    nextPosition = instruction.next
+    target = instruction.target
+    fallback = vm.handlers[instruction.opcode]
+
+    if provenType(arg2) is not None and provenType(arg2) == provenType(arg3):
+        def provenConditionalJump():
+            if (read2() == read3()) == jumpIfEqual:
+                return target
+            return nextPosition
+        return provenConditionalJump
+
+    def conditionalJump():
+        value2 = read2()
+        value3 = read3()
+        if value2 is not None and type(value2) is type(value3):
+            if (value2 == value3) == jumpIfEqual:
+                return target
+            return nextPosition
+        return fallback(instruction)
+    return conditionalJump
+
+
+def compileCall(vm, instruction):
+    push = vm.callstack.push
+    nextPosition = instruction.next
+    target = instruction.target
+
+    def call():
+        push(nextPosition)
+        return target
+    return call
+
+
+# superinstruction, closures of its pair of instructions are called one after
+# another (the first one always continues with the second one)
+def compilePair(vm, instruction):
+    first = compileInstruction(vm, instruction.args[0])
+    second = compileInstruction(vm, instruction.args[1])
+
+    def pair():
+        first()
+        vm.instructCount += 1
+        return second()
+    return pair
+
+
+# compile decoded instruction to closure
+def compileInstruction(vm, instruction):
+    opcode = opcodeNames[instruction.opcode]
+    if opcode in closureCompilers:
+        return closureCompilers[opcode](vm, instruction)
+    elif opcode == "LABEL":
+        nextPosition = instruction.next
+        return lambda: nextPosition
+    elif opcode == "JUMP":
+        target = instruction.target
+        return lambda: target
+    elif opcode == "RETURN":
+        return vm.callstack.pop
+    else:  # rarely used instructions are interpreted by reference engine
+        return partial(vm.handlers[instruction.opcode], instruction)
+
+
+closureCompilers = {
+     "MOVE": compileMove,
+     "CALL": compileCall,
+     "ADD": lambda vm, i: compileArithmetic(vm, i, add),
+     "SUB": lambda vm, i: compileArithmetic(vm, i, sub),
+     "MUL": lambda vm, i: compileArithmetic(vm, i, mul),
+     "IDIV": lambda vm, i: compileArithmetic(vm, i, floordiv),
+     "LT": lambda vm, i: compileRelational(vm, i, lt),
+     "GT": lambda vm, i: compileRelational(vm, i, gt),
+     "EQ": lambda vm, i: compileRelational(vm, i, eq),
+     "AND": lambda vm, i: compileLogical(vm, i, True),
+     "OR": lambda vm, i: compileLogical(vm, i, False),
+     "NOT": compileNot,
+     "INT2CHAR": compileInt2char,
+     "STRI2INT": lambda vm, i: compileIndexing(vm, i, ord),
+     "WRITE": compileWrite,
+     "CONCAT": compileConcat,
+     "STRLEN": compileStrlen,
+     "GETCHAR": lambda vm, i: compileIndexing(vm, i, str),
+     "JUMPIFEQ": lambda vm, i: compileConditionalJump(vm, i, True),
+     "JUMPIFNEQ": lambda vm, i: compileConditionalJump(vm, i, False),
+     "ARITH+JUMP": compilePair,
+     "COMPARE+BRANCH": compilePair,
+     "PUSHS+POPS": compilePair,
+}
+
+
+# closure of instruction on position is compiled when it is executed for the
+# first time (instructions which are never executed are not compiled at all)
+def compileOnFirstUse(vm, ops, code, position):
+    ops[position] = compileInstruction(vm, code[position])
+    return ops[position]()
+
+
+# runtime interpretation of compiled closures (closure engine)
+# closures of all instructions of "code", they are compiled on first use
+def closureOps(vm, code):
+    ops = []
+    for position in range(len(code)):
+        ops.append(partial(compileOnFirstUse, vm, ops, code, position))
+    return ops
+
+
+def interpretClosures(vm, program):
+    table = program.table
+    ops = closureOps(vm, program.code)
+    position = table.start(vm.stderr)  # start with first instruction
+    end = len(ops)
+    while position < end:
+        position = ops[position]()
+        vm.instructCount += 1
+        if position < 0:
+            position = table.skipGap(~position, vm.stderr)
+
+
+# ######### python engine (transpiler) ###########
+# whole program is translated to source of one python function which is
+# compiled by compile() and executed
+# basic blocks (starting at labels, return addresses of calls and behind
+# jumps) are dispatched by position of their first instruction in a "while"
+# loop, variable in slot N of GF is lowered to local variable v<N> of the
+# function (with the same content as slot), TF and LF variables are accessed
+# by closures of closure engine
+# generated code handles only successful execution, whenever it finds out
+# that instruction is going to fail it stores local variables back to GF and
+# calls reference implementation (execXxx) which reports the error
+# vm -> interpreter (Interpreter) running the program
+class Transpiler():
+    vm = None
+    code = None
+    layout = None
+    lines = None
+    position = None
+    blockEnd = None
+
+    def __init__(self, vm, program):
+        self.vm = vm
+        self.code = program.code
+        self.layout = program.globalLayout
+
+    def emit(self, indent, line):
+        self.lines.append("    " * indent + line)
+
+    def emitFail(self, indent):
+        self.emit(indent, "fail({}, locals())".format(self.position))
+
+    # emit condition which must hold otherwise instruction fails
+    def emitRequire(self, indent, condition):
+        if condition is not None:
+            self.emit(indent, "if not ({}):".format(condition))
+            self.emitFail(indent + 1)
+
+    # emit reading of argument number "index" (symb) of actual instruction,
+    # instruction fails if argument is not initialized or if it has not
+    # type "type" (when it is set)
+    # return val: expression for value of the argument
+    def emitRead(self, indent, index, type=None):
+        arg = self.code[self.position].args[index]
+        if arg.frame is None:
+            if type is not None and arg.type != type:
+                self.emitFail(indent)
+            return repr(arg.value)
+        elif arg.frame == "GF":
+            var = "v{}".format(arg.slot)
+            if arg.type is not None and type in (None, arg.type):
+                return var  # type is proven (see inferTypes)
+            if type is None:
+                self.emitRequire(indent, "{0} is not None and {0} is not "
+                                 "undefined".format(var))
         else:
-            sys.stderr.write("ERROR 53: invalid operand types in instruction n"
-                             "umber: {} (both operands must have same type)"
-                             .format(instructOrderNum))
-            sys.exit(53)
-
-
-def parseJumpifneq(instruction, interpreting):
-    instructOrderNum = int(instruction.attrib.get("order"))
-    global labels
-    if interpreting is False:
-        checkArgFormat(instruction, 3)
-        verifySymb(instruction[1], instructOrderNum)
-        verifySymb(instruction[2], instructOrderNum)
-        arg1 = instruction[0]
-        if arg1.attrib.get("type") == "label":
-            label = arg1.text
-            if label in labels:
-                return
-            else:
-                sys.stderr.write("ERROR 52: instruction number: {} requests ju"
-                                 "mp on nonexistent label\n"
-                                 .format(instructOrderNum))
-                sys.exit(52)
+            var = "a{}".format(index)
+            self.emit(indent, "{} = R[{}][{}]()".format(
+                var, self.position, index))
+            if type is None:
+                self.emitRequire(indent, "{} is not None".format(var))
+        if type is not None:
+            self.emitRequire(indent, "type({}) is {}".format(
+                var, pythonTypes[type]))
+        return var
+
+    # emit check that arguments 1 and 2 of actual instruction have the same
+    # type (unless it is proven)
+    def emitSameType(self, indent, value2, value3):
+        arg2, arg3 = self.code[self.position].args[1:]
+        if provenType(arg2) is None or provenType(arg2) != provenType(arg3):
+            self.emitRequire(indent, "type({}) is type({})".format(value2,
+                                                                   value3))
+
+    # emit assignment to variable in first argument of actual instruction
+    # (must be the last part of instruction)
+    def emitWrite(self, indent, valueExpr):
+        arg = self.code[self.position].args[0]
+        if arg.frame == "GF":
+            var = "v{}".format(arg.slot)
+            self.emitRequire(indent, "{} is not undefined".format(var))
+            self.emit(indent, "{} = {}".format(var, valueExpr))
+            self.emit(indent, "assigned += 1")
         else:
-            sys.stderr.write("ERROR 32: instruction number: {} has wrong:"
-                             " argument type (expected label)\n"
-                             .format(instructOrderNum))
-            sys.exit(32)
-    else:
-        arg1 = instruction[0]
-        arg2 = instruction[1]
-        arg3 = instruction[2]
-        arg2Type = getSymbType(arg2)
-        arg2Value = getSymbVal(arg2)
-        arg3Type = getSymbType(arg3)
-        arg3Value = getSymbVal(arg3)
-        label = arg1.text
-        if arg2Type == arg3Type:
-            if arg2Value == arg3Value:
-                return instructOrderNum+1
+            self.emitRequire(indent, "W[{}]({})".format(self.position,
+                                                        valueExpr))
+
+    # emit jump to block starting on position
+    def emitJump(self, indent, position):
+        if position < 0:
+            self.emit(indent, "table.skipGap({}, stderr)".format(~position))
+            position = ~position
+        self.emit(indent, "position = {}".format(position))
+        self.emit(indent, "continue")
+
+    # emit storing of counters and GF to state of interpreter
+    def emitSync(self, indent, pending):
+        self.emit(indent, "vm.instructCount += count - {}".format(pending))
+        self.emit(indent, "vm.initVarsCount += assigned")
+        self.emit(indent, "count, assigned = {}, 0".format(pending))
+        self.emit(indent, "store(locals())")
+
+    def emitInstruction(self, indent, instruction):
+        opcode = opcodeParser[instruction.opcode][0]
+        dest = instruction.args[0] if instruction.args else None
+        self.emit(indent, "# {} {}".format(instruction.order, opcode))
+        if opcode in transpiledArithmetic:
+            value2 = self.emitRead(indent, 1, "int")
+            value3 = self.emitRead(indent, 2, "int")
+            if opcode == "IDIV":
+                self.emitRequire(indent, "{} != 0".format(value3))
+            self.emitWrite(indent, "{} {} {}".format(
+                value2, transpiledArithmetic[opcode], value3))
+        elif opcode in transpiledRelational:
+            value2 = self.emitRead(indent, 1)
+            value3 = self.emitRead(indent, 2)
+            self.emitSameType(indent, value2, value3)
+            self.emitWrite(indent, "{} {} {}".format(
+                value2, transpiledRelational[opcode], value3))
+        elif opcode in ("AND", "OR"):
+            value2 = self.emitRead(indent, 1, "bool")
+            value3 = self.emitRead(indent, 2, "bool")
+            self.emitWrite(indent, "{} {} {}".format(value2, opcode.lower(),
+                                                     value3))
+        elif opcode == "NOT":
+            value2 = self.emitRead(indent, 1, "bool")
+            self.emitWrite(indent, "not {}".format(value2))
+        elif opcode == "MOVE":
+            value2 = self.emitRead(indent, 1)
+            self.emitWrite(indent, value2)
+        elif opcode == "CONCAT":
+            value2 = self.emitRead(indent, 1, "string")
+            value3 = self.emitRead(indent, 2, "string")
+            self.emitWrite(indent, "{} + {}".format(value2, value3))
+        elif opcode == "STRLEN":
+            value2 = self.emitRead(indent, 1, "string")
+            self.emitWrite(indent, "len({})".format(value2))
+        elif opcode in ("GETCHAR", "STRI2INT"):
+            value2 = self.emitRead(indent, 1, "string")
+            value3 = self.emitRead(indent, 2, "int")
+            self.emit(indent, "try:")
+            self.emit(indent + 1, "r = {}[{}]".format(value2, value3))
+            self.emit(indent, "except IndexError:")
+            self.emitFail(indent + 1)
+            if opcode == "GETCHAR":
+                self.emitWrite(indent, "r")
+            else:
+                self.emitWrite(indent, "ord(r)")
+        elif opcode == "INT2CHAR":
+            value2 = self.emitRead(indent, 1, "int")
+            self.emit(indent, "try:")
+            self.emit(indent + 1, "r = chr({})".format(value2))
+            self.emit(indent, "except ValueError:")
+            self.emitFail(indent + 1)
+            self.emitWrite(indent, "r")
+        elif opcode == "SETCHAR":
+            value2 = self.emitRead(indent, 1, "int")
+            value3 = self.emitRead(indent, 2, "string")
+            value1 = self.emitRead(indent, 0, "string")
+            self.emitRequire(indent, "len({}) > 0".format(value3))
+            self.emit(indent, "try:")
+            self.emit(indent + 1, "{}[{}]".format(value1, value2))
+            self.emit(indent, "except IndexError:")
+            self.emitFail(indent + 1)
+            self.emitWrite(indent, "{0}[:{1}] + {2}[0] + {0}[1 + {1}:]"
+                           .format(value1, value2, value3))
+        elif opcode == "TYPE":
+            arg2 = instruction.args[1]
+            if arg2.frame == "GF":
+                var = "v{}".format(arg2.slot)
+                self.emitRequire(indent, "{} is not undefined".format(var))
+                self.emit(indent, "r = '' if {0} is None else "
+                          "valueTypes[type({0})]".format(var))
+            elif arg2.frame is None:
+                self.emit(indent, "r = {!r}".format(arg2.type))
             else:
-                return labels[label]
+                self.emit(indent, "r = vm.getSymbTypeName(C[{}].args[1])"
+                          .format(self.position))
+            self.emitWrite(indent, "r")
+        elif opcode == "WRITE":
+            value1 = self.emitRead(indent, 0)
+            self.emit(indent, "output.writeLine(printable({}))"
+                      .format(value1))
+        elif opcode == "DPRINT":
+            value1 = self.emitRead(indent, 0)
+            self.emit(indent, "stderr.write(printable({}))".format(value1))
+            self.emit(indent, "stderr.write('\\n')")
+        elif opcode == "PUSHS":
+            value1 = self.emitRead(indent, 0)
+            self.emit(indent, "datastack.push({})".format(value1))
+        elif opcode == "POPS" and dest.frame == "GF":
+            # destination is checked before stack is popped
+            self.emitWrite(indent, "datastack.pop()")
+        elif opcode == "READ" and dest.frame == "GF":
+            # destination is checked before input is read
+            self.emitWrite(indent, "vm.readValue({!r})".format(
+                instruction.args[1].value))
+        elif opcode == "DEFVAR" and dest.frame == "GF":
+            self.emit(indent, "if v{} is undefined:".format(dest.slot))
+            self.emit(indent + 1, "vm.countVariable(vm.GF)")
+            self.emit(indent, "v{} = None".format(dest.slot))
+        elif opcode == "BREAK":
+            self.emitSync(indent, self.blockEnd - self.position)
+            self.emit(indent, "E[{0}](C[{0}])".format(self.position))
+        elif opcode == "LABEL":
+            pass
+        elif opcode == "JUMP":
+            self.emitJump(indent, instruction.target)
+        elif opcode == "CALL":
+            self.emit(indent, "callstack.push({})".format(instruction.next))
+            self.emitJump(indent, instruction.target)
+        elif opcode == "RETURN":
+            self.emit(indent, "position = callstack.pop()")
+            self.emit(indent, "if position < 0:")
+            self.emit(indent + 1,
+                      "position = table.skipGap(~position, stderr)")
+            self.emit(indent, "continue")
+        elif opcode in ("JUMPIFEQ", "JUMPIFNEQ"):
+            value2 = self.emitRead(indent, 1)
+            value3 = self.emitRead(indent, 2)
+            self.emitSameType(indent, value2, value3)
+            self.emit(indent, "if {} {} {}:".format(
+                value2, "==" if opcode == "JUMPIFEQ" else "!=", value3))
+            self.emitJump(indent + 1, instruction.target)
+        else:  # frame instructions, READ, POPS and DEFVAR with TF/LF
+            self.emit(indent, "E[{0}](C[{0}])".format(self.position))
+
+    # basic blocks reachable from start as (first position, end position)
+    # (unreachable code is not transpiled at all)
+    def reachableBlocks(self, start):
+        leaders = findLeaders(self.code, start)
+        ends = dict(zip(leaders, leaders[1:] + [len(self.code)]))
+        reachable = set()
+        worklist = [start]
+        while worklist:
+            first = worklist.pop()
+            if first >= len(self.code) or first in reachable:
+                continue
+            reachable.add(first)
+            instruction = self.code[ends[first] - 1]
+            opcode = opcodeParser[instruction.opcode][0]
+            if instruction.target is not None:
+                worklist.append(instruction.target)
+            if opcode not in ("JUMP", "RETURN"):
+                if instruction.next < 0:
+                    worklist.append(~instruction.next)
+                else:
+                    worklist.append(instruction.next)
+        return [(first, ends[first]) for first in sorted(reachable)]
+
+    # emit binary search tree dispatching blocks by position
+    def emitDispatch(self, indent, blocks):
+        if len(blocks) == 1:
+            self.emitBlock(indent, *blocks[0])
+            return
+        middle = len(blocks) // 2
+        self.emit(indent, "if position < {}:".format(blocks[middle][0]))
+        self.emitDispatch(indent + 1, blocks[:middle])
+        self.emit(indent, "else:")
+        self.emitDispatch(indent + 1, blocks[middle:])
+
+    def emitBlock(self, indent, first, end):
+        self.blockEnd = end
+        self.emit(indent, "count += {}".format(end - first))
+        for position in range(first, end):
+            self.position = position
+            self.emitInstruction(indent, self.code[position])
+        instruction = self.code[end - 1]
+        if opcodeParser[instruction.opcode][0] not in ("JUMP", "CALL",
+                                                       "RETURN"):
+            self.emitJump(indent, instruction.next)  # fall through
+
+    # return val: source of function program(), its arguments are position
+    # of first instruction and objects which can't be referenced from
+    # generated code by name (see interpretTranspiled)
+    def transpile(self, start):
+        self.lines = []
+        self.emit(0, "def program(position, table, R, W, C, E, fail, store):")
+        self.emit(1, "count = 0")
+        self.emit(1, "assigned = 0")
+        for slot, name in enumerate(self.layout):
+            self.emit(1, "v{} = undefined  # GF@{}".format(slot, name))
+        blocks = self.reachableBlocks(start)
+        if blocks:
+            self.emit(1, "while position < {}:".format(len(self.code)))
+            self.emitDispatch(2, blocks)
+        self.emitSync(1, 0)
+        return "\n".join(self.lines) + "\n"
+
+    # store GF variables kept in local variables of generated function to GF
+    # argument: locals() of generated function
+    def store(self, scope):
+        values = self.vm.GF.values
+        for slot in range(len(self.layout)):
+            values[slot] = scope["v{}".format(slot)]
+
+    # instruction on position is going to fail, reference implementation
+    # reports the error
+    def fail(self, position, scope):
+        self.store(scope)
+        instruction = self.code[position]
+        self.vm.handlers[instruction.opcode](instruction)
+        raise RuntimeError("transpiled instruction {} did not fail"
+                           .format(instruction.order))
+
+
+transpiledArithmetic = {"ADD": "+", "SUB": "-", "MUL": "*", "IDIV": "//"}
+transpiledRelational = {"LT": "<", "GT": ">", "EQ": "=="}
+
+
+# python types of values by their type names for transpiled code
+pythonTypes = {"int": "int", "bool": "bool", "string": "str"}
+
+
+# runtime interpretation of program transpiled to python (pyc engine)
+def interpretTranspiled(vm, program):
+    code = program.code
+    table = program.table
+    transpiler = Transpiler(vm, program)
+    start = table.start(vm.stderr)
+    source = transpiler.transpile(start)
+    if vm.dumpFile is not None:
+        with open(vm.dumpFile, "w") as file:
+            file.write(source)
+    # generated function refers to runtime state of interpreter by names
+    namespace = {
+        "vm": vm,
+        "output": vm.output,
+        "datastack": vm.datastack,
+        "callstack": vm.callstack,
+        "stderr": vm.stderr,
+        "undefined": undefined,
+        "valueTypes": valueTypes,
+        "printable": printable,
+    }
+    with warnings.catch_warnings():  # e.g. indexing of constant int
+        warnings.simplefilter("ignore", SyntaxWarning)
+        exec(compile(source, "<IPPcode18>", "exec"), namespace)
+    readers = []
+    writers = []
+    for instruction in code:
+        readers.append([compileReader(vm, arg) if arg.frame in ("TF", "LF")
+                        else None for arg in instruction.args])
+        if instruction.args and instruction.args[0].frame in ("TF", "LF"):
+            writers.append(compileWriter(vm, instruction.args[0]))
         else:
-            sys.stderr.write("ERROR 53: invalid operand types in instruction n"
-                             "umber: {} (both operands must have same type)"
-                             .format(instructOrderNum))
-            sys.exit(53)
-
+            writers.append(None)
+    handlers = [vm.handlers[instruction.opcode] for instruction in code]
+    namespace["program"](start, table, readers, writers, code, handlers,
+                         transpiler.fail, transpiler.store)
+
+
+# ######### program cache ###########
+# verified and decoded programs are stored in directory (--cache-dir) in
+# marshal format, file name is hash of source file and of interpreter itself
+# (cache is invalidated by any change of interpreter), files are written
+# atomically (several interpreters can share one directory) and the least
+# recently used ones are removed when size of cache exceeds limit
+class ProgramCache():
+    directory = None
+    limit = None
+    version = None
+
+    def __init__(self, directory, limit):
+        self.directory = directory
+        self.limit = limit
+        with open(os.path.abspath(__file__), "rb") as file:
+            self.version = hashlib.sha256(file.read()).digest()
+        try:
+            os.makedirs(directory, exist_ok=True)
+        except OSError:
+            raise InterpretError(12, "ERROR 12: could not create cache directo"
+                                     "ry\n")
+
+    # return val: key of program in source file of format "sourceFormat"
+    def key(self, fileName, sourceFormat):
+        digest = hashlib.sha256(self.version + sourceFormat.encode())
+        with open(fileName, "rb") as file:
+            for block in iter(partial(file.read, 1 << 20), b""):
+                digest.update(block)
+        return digest.hexdigest()
+
+    def path(self, key):
+        return os.path.join(self.directory, key + ".ippc")
+
+    # return val: cached program (Program) or None if program is not in cache
+    # (or its file is damaged)
+    def load(self, key):
+        try:
+            with open(self.path(key), "rb") as file:
+                orders, instructions, labelTable = marshal.load(file)
+            os.utime(self.path(key))  # recently used
+            code = []
+            for opcode, order, args, next, target in instructions:
+                code.append(Instruction(opcode, order,
+                                        tuple(Operand(*arg) for arg in args),
+                                        next, target))
+        except (OSError, EOFError, ValueError, TypeError):
+            return None
+        table = InstructTable([])
+        table.restore(orders)
+        return Program(code, table, labelTable)
+
+    def store(self, key, program):
+        instructions = []
+        for instruction in program.code:
+            args = tuple((arg.frame, arg.name, arg.type, arg.value)
+                         for arg in instruction.args)
+            instructions.append((instruction.opcode, instruction.order, args,
+                                 instruction.next, instruction.target))
+        try:
+            fd, tmpName = tempfile.mkstemp(dir=self.directory, suffix=".tmp")
+            with os.fdopen(fd, "wb") as file:
+                marshal.dump((program.table.orders, instructions,
+                              program.labels), file)
+            os.replace(tmpName, self.path(key))
+        except OSError:
+            return  # program is just not cached
+        self.evict()
+
+    # remove least recently used programs until cache fits its limit
+    def evict(self):
+        entries = []
+        size = 0
+        for entry in os.scandir(self.directory):
+            if entry.name.endswith(".ippc"):
+                try:
+                    stat = entry.stat()
+                except OSError:
+                    continue  # removed by another interpreter
+                entries.append((stat.st_mtime, stat.st_size, entry.path))
+                size += stat.st_size
+        for mtime, fileSize, path in sorted(entries):
+            if size <= self.limit:
+                break
+            try:
+                os.remove(path)
+            except OSError:
+                pass
+            size -= fileSize
 
-def parseDprint(instruction, interpreting):
-    instructOrderNum = int(instruction.attrib.get("order"))
-    if interpreting is False:
-        checkArgFormat(instruction, 1)
-        verifySymb(instruction[0], instructOrderNum)
-    else:
-        arg1 = instruction[0]
-        sys.stderr.write(getSymbVal(arg1))
-        sys.stderr.write("\n")
-        return instructOrderNum+1
 
+# ######### bytecode ###########
+# verified and decoded program can be stored in binary format, interpreter
+# recognizes it by magic number at the beginning of source file
+# (all numbers are little endian)
+#
+# header (24 bytes): magic "IPPc", format version (1 byte), 3 bytes padding,
+#                    number of constants, instructions and labels (uint32
+#                    each), size of constant pool in bytes (uint32)
+# constant pool: constants of program, every constant is kind (1 byte,
+#                "s" string or name, "i" int), length of its UTF-8 data
+#                (varint, 7 bits per byte, least significant first) and the
+#                data (int is in decimal format)
+# instructions: instructions sorted by order numbers, every one has 40 bytes
+#               so they are read straight from mapped file:
+#               opcode (1 byte, position in opcodeParser), number of
+#               arguments (1 byte), 2 bytes padding, order number (uint32),
+#               position of next instruction (int32, negative ~position if
+#               order numbers are skipped), position of target of jump
+#               (int32, -1 if there is none) and 3 operands, every operand is
+#               tag (1 byte, see bytecodeTags), 3 bytes padding and index of
+#               constant in pool (uint32, value for bool)
+# labels: name of label (index in pool, uint32) and its order number (uint32)
+bytecodeMagic = b"IPPc"
+bytecodeVersion = 1
+bytecodeHeader = struct.Struct("<4sB3xIIII")
+bytecodeInstruction = struct.Struct("<BBxxIii" + "B3xI" * 3)
+bytecodeLabel = struct.Struct("<II")
+
+# operand tags of bytecode -> (frame, type) of decoded operand
+bytecodeTags = [
+    (None, None),  # no operand
+    ("GF", None),
+    ("LF", None),
+    ("TF", None),
+    (None, "int"),
+    (None, "bool"),
+    (None, "string"),
+    (None, "label"),
+    (None, "type"),
+]
+
+
+# constant pool of program being written to bytecode
+class ConstantPool():
+    constants = None
+    index = None
 
-def parseBreak(instruction, interpreting):
-    instructOrderNum = int(instruction.attrib.get("order"))
-    if interpreting is False:
-        checkArgFormat(instruction, 0)
-    else:
-        global GF
-        global TF
-        global stackframe
-        if stackframe.empty:
-            LFvar = "EMPTY STACKFRAME"
-            LFdef = "EMPTY STACKFRAME"
-        else:
-            LF = stackframe.getLF()
-            LFvar = LF.variable
-            LFdef = LF.defined
-        global instructCount
-        sys.stderr.write("instructions proceeded: {}\n"
-                         "instruction number: {}\n"
-                         "GF defined: {}\n"
-                         "GF variables: {}\n"
-                         "TF defined: {}\n"
-                         "TF variables: {}\n"
-                         "LF defined: {}\n"
-                         "LF variables: {}\n"
-                         .format(instructCount, instructOrderNum,
-                                 str(GF.defined),
-                                 str(GF.variable), str(TF.defined),
-                                 str(TF.variable), str(LFdef),
-                                 str(LFvar)))
-        return instructOrderNum+1
-
-
-# goes through program and loads all labels to global labels
-def loadLabels(program):
-    global labels
-    for instruction in program:
-        instructOrderNum = instruction.attrib.get("order")
-        opcode = instruction.attrib.get("opcode")
-        if opcode == "LABEL":
-            checkArgFormat(instruction, 1)
-            arg1 = instruction[0]
-            if arg1.attrib.get("type") == "label":
-                label = arg1.text
-                if len(label) < 1:
-                    sys.stderr.write("ERROR 32: instruction number: {} has in"
-                                     "valid label name\n"
-                                     .format(instructOrderNum))
-                    sys.exit(32)
+    def __init__(self):
+        self.constants = []
+        self.index = {}
+
+    # return val: index of constant in pool
+    def add(self, kind, value):
+        if (kind, value) not in self.index:
+            self.index[(kind, value)] = len(self.constants)
+            self.constants.append((kind, value))
+        return self.index[(kind, value)]
+
+    def encode(self):
+        data = bytearray()
+        for kind, value in self.constants:
+            encoded = str(value).encode("utf-8", "surrogatepass")
+            data += kind.encode()
+            length = len(encoded)
+            while length >= 0x80:
+                data.append(length & 0x7f | 0x80)
+                length >>= 7
+            data.append(length)
+            data += encoded
+        return bytes(data)
+
+
+# write decoded program (Program) to file in bytecode format
+def writeBytecode(fileName, program):
+    pool = ConstantPool()
+    instructions = []
+    for instruction in program.code:
+        operands = []
+        for arg in instruction.args:
+            if arg.frame is not None:
+                tag = bytecodeTags.index((arg.frame, None))
+                index = pool.add("s", arg.name)
+            else:
+                tag = bytecodeTags.index((None, arg.type))
+                if arg.type == "bool":
+                    index = int(arg.value)
+                elif arg.type == "int":
+                    index = pool.add("i", arg.value)
                 else:
-                    if label in labels:
-                        sys.stderr.write("ERROR 52: label: \"{}\" is already d"
-                                         "efined\n".format(label))
-                        sys.exit(52)
+                    index = pool.add("s", arg.value)
+            operands += [tag, index]
+        operands += [0, 0] * (3 - len(instruction.args))
+        target = -1 if instruction.target is None else instruction.target
+        instructions.append(bytecodeInstruction.pack(
+            instruction.opcode, len(instruction.args), instruction.order,
+            instruction.next, target, *operands))
+    labelTable = [bytecodeLabel.pack(pool.add("s", label), order)
+                  for label, order in program.labels.items()]
+    constants = pool.encode()
+    try:
+        with open(fileName, "wb") as file:
+            file.write(bytecodeHeader.pack(
+                bytecodeMagic, bytecodeVersion, len(pool.constants),
+                len(instructions), len(labelTable), len(constants)))
+            file.write(constants)
+            file.write(b"".join(instructions))
+            file.write(b"".join(labelTable))
+    except OSError:
+        raise InterpretError(12, "ERROR 12: could not write bytecode file\n")
+
+
+# check if file is in bytecode format
+def isBytecode(fileName):
+    with open(fileName, "rb") as file:
+        return file.read(len(bytecodeMagic)) == bytecodeMagic
+
+
+# python types of operand values by their type in instructFormat
+bytecodeOperands = {
+    "var": {("GF", None): str, ("LF", None): str, ("TF", None): str},
+    "symb": {("GF", None): str, ("LF", None): str, ("TF", None): str,
+             (None, "int"): int, (None, "bool"): bool,
+             (None, "string"): str},
+    "label": {(None, "label"): str},
+    "type": {(None, "type"): str},
+}
+
+
+# check that program loaded from bytecode is the same as verified and
+# decoded program of XML source would be (arguments of instructions, labels,
+# positions of next instructions and jump targets), so damaged file can't
+# fail during interpretation
+# code -> decoded instructions, orders -> their order numbers, labels ->
+# labels of program (name -> order number)
+def checkBytecode(code, orders, labels):
+    index = {order: position for position, order in enumerate(orders)}
+    if len(index) != len(orders) or orders != sorted(orders):
+        raise ValueError("invalid order numbers")
+    labelCount = 0
+    for position, instruction in enumerate(code):
+        opcode = opcodeNames[instruction.opcode]
+        argTypes = instructFormat.get(opcode)
+        if argTypes is None or len(argTypes) != len(instruction.args):
+            raise ValueError("invalid arguments")
+        for arg, argType in zip(instruction.args, argTypes):
+            valueType = bytecodeOperands[argType].get((arg.frame, arg.type))
+            value = arg.value if arg.frame is None else arg.name
+            if valueType is None or type(value) is not valueType:
+                raise ValueError("invalid operand")
+            if arg.frame is not None and not value:
+                raise ValueError("invalid variable")
+            if argType == "type" and value not in ("int", "bool", "string"):
+                raise ValueError("invalid type")
+        nextPosition = position + 1
+        if (nextPosition < len(orders) and
+                orders[nextPosition] != orders[position] + 1):
+            nextPosition = ~nextPosition
+        target = None
+        if opcode in ("CALL", "JUMP", "JUMPIFEQ", "JUMPIFNEQ"):
+            label = instruction.args[0].value
+            if label not in labels or labels[label] not in index:
+                raise ValueError("invalid label")
+            target = index[labels[label]]
+        elif opcode == "LABEL":
+            labelCount += 1
+            if labels.get(instruction.args[0].value) != instruction.order:
+                raise ValueError("invalid label")
+        if instruction.next != nextPosition or instruction.target != target:
+            raise ValueError("invalid position")
+    if labelCount != len(labels):
+        raise ValueError("invalid labels")
+
+
+# load program in bytecode format, file is mapped to memory and instructions
+# are unpacked straight from it, they are checked by checkBytecode
+# return val: program (Program)
+def loadBytecode(fileName):
+    labels = {}
+    try:
+        with open(fileName, "rb") as file:
+            data = mmap.mmap(file.fileno(), 0, access=mmap.ACCESS_READ)
+        (magic, version, constantCount, instructionCount, labelCount,
+         poolSize) = bytecodeHeader.unpack_from(data, 0)
+        if magic != bytecodeMagic or version != bytecodeVersion:
+            raise ValueError("unsupported bytecode version")
+        position = bytecodeHeader.size
+        poolEnd = position + poolSize
+        constants = []
+        while len(constants) < constantCount:  # constant pool
+            kind = data[position:position + 1]
+            length = 0
+            shift = 0
+            while True:
+                byte = data[position + 1]
+                length |= (byte & 0x7f) << shift
+                shift += 7
+                position += 1
+                if byte < 0x80:
+                    break
+            value = data[position + 1:position + 1 + length].decode(
+                "utf-8", "surrogatepass")
+            position += 1 + length
+            if kind == b"i":
+                value = int(value)
+            elif kind != b"s" or position > poolEnd:
+                raise ValueError("invalid constant")
+            constants.append(value)
+        end = poolEnd + instructionCount * bytecodeInstruction.size
+        if end + labelCount * bytecodeLabel.size != len(data):
+            raise ValueError("invalid size of file")
+        operands = {}  # operands with the same tag and index are shared
+        code = []
+        orders = []
+        for record in bytecodeInstruction.iter_unpack(data[poolEnd:end]):
+            opcode, argCount, order, next, target = record[:5]
+            if opcode >= len(opcodeParser) or argCount > 3:
+                raise ValueError("invalid instruction")
+            args = []
+            for tag, index in zip(record[5:5 + 2 * argCount:2],
+                                  record[6:6 + 2 * argCount:2]):
+                if (tag, index) not in operands:
+                    frame, type = bytecodeTags[tag]
+                    if frame is not None:
+                        operands[(tag, index)] = Operand(
+                            frame, constants[index], None, None)
+                    elif type == "bool":
+                        operands[(tag, index)] = Operand(None, None, type,
+                                                         bool(index))
+                    elif type is not None:
+                        operands[(tag, index)] = Operand(None, None, type,
+                                                         constants[index])
                     else:
-                        labels[label] = int(instructOrderNum)
+                        raise ValueError("missing operand")
+                args.append(operands[(tag, index)])
+            code.append(Instruction(opcode, order, tuple(args), next,
+                                    None if target < 0 else target))
+            orders.append(order)
+        for nameIndex, order in bytecodeLabel.iter_unpack(data[end:]):
+            labels[constants[nameIndex]] = order
+        checkBytecode(code, orders, labels)
+    except (OSError, ValueError, IndexError, UnicodeDecodeError,
+            struct.error):
+        raise ProgramError(31, "ERROR 31: Wrongly formatted bytecode file\n")
+    table = InstructTable([])
+    table.restore(orders)
+    return Program(code, table, labels)
+
+
+# write decoded program (Program) to file in XML format (order numbers are
+# kept)
+def writeXml(fileName, program):
+    root = ET.Element("program", language="IPPcode18")
+    for instruction in program.code:
+        element = ET.SubElement(root, "instruction",
+                                order=str(instruction.order),
+                                opcode=opcodeParser[instruction.opcode][0])
+        for number, arg in enumerate(instruction.args, 1):
+            if arg.frame is not None:
+                type, text = "var", arg.frame + "@" + arg.name
+            elif arg.type == "bool":
+                type, text = "bool", boolToStr(arg.value)
+            elif arg.type == "string":
+                type, text = "string", escapeString(arg.value)
             else:
-                sys.stderr.write("ERROR 32: instruction number: {} has wrong:"
-                                 " argument type (expected label)\n"
-                                 .format(instructOrderNum))
-                sys.exit(32)
-
-
-# determine which parsing function should be called based on OpCode
-# first agrument: instruction of program in XML format
-# second argument: bool value whenever instruction should be interpretated or
-#                  just checked
-opcodeParser = {
-     "MOVE": parseMove,
-     "CREATEFRAME": parseCreateframe,
-     "PUSHFRAME": parsePushframe,
-     "POPFRAME": parsePopframe,
-     "DEFVAR": parseDefvar,
-     "CALL": parseCall,
-     "RETURN": parseReturn,
-     "PUSHS": parsePushs,
-     "POPS": parsePops,
-     "ADD": parseAdd,
-     "SUB": parseSub,
-     "MUL": parseMul,
-     "IDIV": parseIdiv,
-     "LT": parseLt,
-     "GT": parseGt,
-     "EQ": parseEq,
-     "AND": parseAnd,
-     "OR": parseOr,
-     "NOT": parseNot,
-     "INT2CHAR": parseInt2char,
-     "STRI2INT": parseStri2int,
-     "READ": parseRead,
-     "WRITE": parseWrite,
-     "CONCAT": parseConcat,
-     "STRLEN": parseStrlen,
-     "GETCHAR": parseGetchar,
-     "SETCHAR": parseSetchar,
-     "TYPE": parseType,
-     "LABEL": parseLabel,
-     "JUMP": parseJump,
-     "JUMPIFEQ": parseJumpifeq,
-     "JUMPIFNEQ": parseJumpifneq,
-     "DPRINT": parseDprint,
-     "BREAK": parseBreak,
+                type, text = arg.type, str(arg.value)
+            argElement = ET.SubElement(element, "arg" + str(number),
+                                       type=type)
+            argElement.text = text
+            argElement.tail = "\n    "
+        if instruction.args:  # one element per line (like parse.php)
+            element.text = "\n    "
+            argElement.tail = "\n  "
+        element.tail = "\n  "
+    if program.code:
+        root.text = "\n  "
+        element.tail = "\n"
+    try:
+        ET.ElementTree(root).write(fileName, encoding="UTF-8",
+                                   xml_declaration=True)
+    except OSError:
+        raise InterpretError(12, "ERROR 12: could not write XML file\n")
+
+
+# transform string to format of string constants (inverse of extractString),
+# white characters, "#" and "\" are written as escape sequences
+def escapeString(string):
+    return "".join("\\{:03d}".format(ord(c)) if ord(c) <= 32 or c in "#\\"
+                   else c for c in string)
+
+
+# ######### peephole optimizer (-O1) ###########
+# pairs of instructions common in generated code are fused to
+# superinstructions which are interpreted by one dispatch:
+# - ADD, SUB, MUL or IDIV followed by JUMP (e.g. increment of loop counter)
+# - LT, GT or EQ followed by JUMPIFEQ or JUMPIFNEQ which compares its result
+#   with bool constant
+# - PUSHS followed by POPS
+# superinstruction replaces only the first instruction of pair, the second
+# one stays on its position (it can be return address of CALL), instructions
+# are not fused over missing order numbers (warning must be written between
+# them), every instruction of pair is counted in instructCount
+# pyc engine compiles whole basic blocks so it interprets programs as they are
+
+
+# operations of superinstructions by numeric id of opcode
+superOperations = {
+    opcodeIds["ADD"]: add,
+    opcodeIds["SUB"]: sub,
+    opcodeIds["MUL"]: mul,
+    opcodeIds["IDIV"]: floordiv,
+    opcodeIds["LT"]: lt,
+    opcodeIds["GT"]: gt,
+    opcodeIds["EQ"]: eq,
 }
 
 
-# pre-runtime parsing istruction
-def verifyInstruct(instruct):
-    opcode = instruct.attrib.get("opcode")
-    if opcode in opcodeParser:
-        opcodeParser[opcode](instruct, False)  # call parsing function without interpretation
+# return val: opcode of superinstruction of pair or None if pair isn't fused
+def fuseOpcode(first, second):
+    name = opcodeNames[first.opcode]
+    secondName = opcodeNames[second.opcode]
+    if name in ("ADD", "SUB", "MUL", "IDIV") and secondName == "JUMP":
+        return opcodeIds["ARITH+JUMP"]
+    if name in ("LT", "GT", "EQ") and secondName in ("JUMPIFEQ", "JUMPIFNEQ"):
+        dest = first.args[0]
+        arg2, arg3 = second.args[1:]
+        for var, constant in ((arg2, arg3), (arg3, arg2)):
+            if (var.frame == dest.frame and var.slot == dest.slot and
+                    constant.frame is None and constant.type == "bool"):
+                return opcodeIds["COMPARE+BRANCH"]
+    if name == "PUSHS" and secondName == "POPS":
+        return opcodeIds["PUSHS+POPS"]
+    return None
+
+
+# positions of first instructions of basic blocks of decoded program "code"
+# whose interpretation starts on position "start"
+def findLeaders(code, start):
+    leaders = {start}
+    for instruction in code:
+        opcode = opcodeParser[instruction.opcode][0]
+        if instruction.target is not None:
+            leaders.add(instruction.target)
+        if (opcode in ("CALL", "RETURN", "JUMP", "JUMPIFEQ", "JUMPIFNEQ")
+                or instruction.next < 0):
+            if instruction.next < 0:
+                leaders.add(~instruction.next)
+            else:
+                leaders.add(instruction.next)
+    return sorted(p for p in leaders if p < len(code))
+
+
+# return val: copy of program (Program) with superinstructions
+def optimizeProgram(program):
+    code = list(program.code)
+    for position in range(len(code) - 1):
+        first = code[position]
+        second = code[position + 1]
+        if first.next != position + 1:
+            continue
+        opcode = fuseOpcode(first, second)
+        if opcode is not None:
+            code[position] = Instruction(opcode, first.order, (first, second),
+                                         second.next, second.target)
+    optimized = copy(program)
+    optimized.code = code
+    return optimized
+
+
+# ######### type inference (-O2) ###########
+# forward dataflow analysis over control flow graph of program finds possible
+# types of GF variables before every instruction, variable operand whose
+# value is proven to be of one type gets the type (see Operand) and engines
+# don't check it (closure and pyc engine), the other operands are checked as
+# before
+# state of variable is set of bits (typeBits, undefinedBit and
+# uninitializedBit), TF and LF variables are not inferred (frames move
+# between TF, LF and stack of frames)
+# successors of instruction: JUMP -> target, JUMPIFEQ and JUMPIFNEQ -> target
+# and next, CALL -> target, RETURN -> return addresses of all CALLs, other
+# instructions -> next, failing instruction ends program so state after
+# instruction is state after its successful execution (its operands have
+# types it requires)
+
+
+typeBits = {"int": 1, "bool": 2, "string": 4}
+bitTypes = {bit: type for type, bit in typeBits.items()}
+anyTypeBits = 7
+undefinedBit = 8
+uninitializedBit = 16
+
+# types of operands (by index) read by instruction, "any" is initialized
+# variable of any type, "defined" may be uninitialized
+readTypes = {
+    "MOVE": {1: "any"},
+    "PUSHS": {0: "any"},
+    "ADD": {1: "int", 2: "int"},
+    "SUB": {1: "int", 2: "int"},
+    "MUL": {1: "int", 2: "int"},
+    "IDIV": {1: "int", 2: "int"},
+    "LT": {1: "any", 2: "any"},
+    "GT": {1: "any", 2: "any"},
+    "EQ": {1: "any", 2: "any"},
+    "AND": {1: "bool", 2: "bool"},
+    "OR": {1: "bool", 2: "bool"},
+    "NOT": {1: "bool"},
+    "INT2CHAR": {1: "int"},
+    "STRI2INT": {1: "string", 2: "int"},
+    "WRITE": {0: "any"},
+    "CONCAT": {1: "string", 2: "string"},
+    "STRLEN": {1: "string"},
+    "GETCHAR": {1: "string", 2: "int"},
+    "SETCHAR": {0: "string", 1: "int", 2: "string"},
+    "TYPE": {1: "defined"},
+    "JUMPIFEQ": {1: "any", 2: "any"},
+    "JUMPIFNEQ": {1: "any", 2: "any"},
+    "DPRINT": {0: "any"},
+}
+
+# types of results of instructions (written to their first operand)
+resultTypes = {
+    "ADD": "int",
+    "SUB": "int",
+    "MUL": "int",
+    "IDIV": "int",
+    "LT": "bool",
+    "GT": "bool",
+    "EQ": "bool",
+    "AND": "bool",
+    "OR": "bool",
+    "NOT": "bool",
+    "INT2CHAR": "string",
+    "STRI2INT": "int",
+    "CONCAT": "string",
+    "STRLEN": "int",
+    "GETCHAR": "string",
+    "SETCHAR": "string",
+    "TYPE": "string",
+}
+
+
+# get type of value of symb "arg" known before interpretation or None
+def provenType(arg):
+    if arg.frame is None or arg.frame == "GF":
+        return arg.type
+    return None
+
+
+# bits of possible types of symb "arg" in state of GF "state"
+def stateBits(state, arg):
+    if arg.frame is None:
+        return typeBits[arg.type]
+    if arg.frame == "GF":
+        return state[arg.slot]
+    return anyTypeBits | undefinedBit | uninitializedBit
+
+
+# change state of GF "state" to state after successful execution of
+# instruction
+def transferTypes(instruction, state):
+    opcode = opcodeNames[instruction.opcode]
+    for index, type in readTypes.get(opcode, {}).items():
+        arg = instruction.args[index]
+        if arg.frame == "GF":
+            if type == "defined":
+                state[arg.slot] &= ~undefinedBit
+            elif type == "any":
+                state[arg.slot] &= anyTypeBits
+            else:
+                state[arg.slot] &= typeBits[type]
+    if not instruction.args or instruction.args[0].frame != "GF":
+        return
+    slot = instruction.args[0].slot
+    if opcode in resultTypes:
+        state[slot] = typeBits[resultTypes[opcode]]
+    elif opcode == "MOVE":
+        state[slot] = stateBits(state, instruction.args[1]) & anyTypeBits
+    elif opcode == "POPS":
+        state[slot] = anyTypeBits
+    elif opcode == "READ":
+        state[slot] = typeBits[instruction.args[1].value]
+    elif opcode == "DEFVAR":
+        state[slot] = uninitializedBit
+
+
+# positions of instructions which can follow instruction
+def successors(instruction, returns):
+    opcode = opcodeNames[instruction.opcode]
+    if opcode in ("JUMP", "CALL"):
+        positions = [instruction.target]
+    elif opcode in ("JUMPIFEQ", "JUMPIFNEQ"):
+        positions = [instruction.target, instruction.next]
+    elif opcode == "RETURN":
+        positions = returns
     else:
-        sys.stderr.write("ERROR 32: Unknown opcode \"{}\"\n".format(opcode))
-        sys.exit(32)
+        positions = [instruction.next]
+    return [~position if position < 0 else position
+            for position in positions]
+
+
+# return val: copy of program (Program) whose operands have proven types
+def inferTypes(program):
+    code = program.code
+    returns = [instruction.next for instruction in code
+               if opcodeNames[instruction.opcode] == "CALL"]
+    states = [None] * len(code)  # state of GF before instruction
+    work = []
+    start = program.table.first()
+    if start < len(code):
+        states[start] = [undefinedBit] * len(program.globalLayout)
+        work.append(start)
+    while work:
+        position = work.pop()
+        state = list(states[position])
+        transferTypes(code[position], state)
+        for successor in successors(code[position], returns):
+            if successor >= len(code):
+                continue
+            old = states[successor]
+            if old is None:
+                states[successor] = list(state)
+            else:
+                new = [bits1 | bits2 for bits1, bits2 in zip(old, state)]
+                if new == old:
+                    continue
+                states[successor] = new
+            work.append(successor)
+
+    inferred = list(code)  # unchanged instructions are shared
+    for position, state in enumerate(states):
+        if state is None:  # unreachable instruction
+            continue
+        instruction = code[position]
+        args = list(instruction.args)
+        for index in readTypes.get(opcodeNames[instruction.opcode], {}):
+            arg = args[index]
+            if arg.frame == "GF":
+                type = bitTypes.get(state[arg.slot])
+                if type is not None:
+                    args[index] = Operand(arg.frame, arg.name, type, None)
+                    args[index].slot = arg.slot
+        if args != list(instruction.args):
+            inferred[position] = Instruction(
+                instruction.opcode, instruction.order, tuple(args),
+                instruction.next, instruction.target)
+    program = copy(program)
+    program.code = inferred
+    return program
+
+
+# ######### constant folding (-O3) ###########
+# program is split into basic blocks (see findLeaders), inside of block
+# values of GF variables assigned by constants are known, their reads are
+# replaced by the constants and instruction whose operands are all constant
+# is executed once by reference implementation on scratch interpreter, its
+# result becomes MOVE of constant (instruction which would fail, e.g. division
+# by zero or indexing out of string, is kept as it is), JUMPIFEQ and
+# JUMPIFNEQ with constant operands become JUMP or LABEL (which does nothing)
+# folded instruction is still interpreted (and counted) so --insts and BREAK
+# are the same, only unreachable instructions are removed after folding
+
+
+# instructions which have no other effect than assignment to variable
+foldableOpcodes = {"ADD", "SUB", "MUL", "IDIV", "LT", "GT", "EQ", "AND", "OR",
+                   "NOT", "INT2CHAR", "STRI2INT", "CONCAT", "STRLEN",
+                   "GETCHAR", "SETCHAR", "TYPE"}
+foldLimit = 256  # longest folded string (characters) or integer (bits)
+
+
+# decoded constant operand with value "value"
+def constOperand(value):
+    return Operand(None, None, valueTypes[type(value)], value)
+
+
+# text of decoded operand in IPPcode18 source format
+def operandText(arg):
+    if arg.frame is not None:
+        return arg.frame + "@" + arg.name
+    elif arg.type == "bool":
+        return "bool@" + boolToStr(arg.value)
+    elif arg.type == "string":
+        return "string@" + escapeString(arg.value)
+    elif arg.type == "int":
+        return "int@{}".format(arg.value)
+    return arg.value  # label and type
+
+
+# execute instruction with constant operands "args" on scratch interpreter
+# "vm", "known" are values of GF variables known before instruction
+# return val: value assigned by instruction or None if it fails or its value
+# is too large
+def evaluate(vm, instruction, args, known):
+    dest = args[0]
+    vm.GF = Frame(True, [dest.name])
+    vm.GF.values[0] = known.get(dest.slot) if dest.frame == "GF" else None
+    scratch = Operand("GF", dest.name, None, None)
+    scratch.slot = 0
+    try:
+        vm.handlers[instruction.opcode](Instruction(
+            instruction.opcode, instruction.order, (scratch,) + args[1:],
+            None, None))
+    except ExecutionError:
+        return None
+    value = vm.GF.getValue(0)  # StringBuffer is joined
+    if type(value) is str and len(value) > foldLimit:
+        return None
+    if type(value) is int and value.bit_length() > foldLimit:
+        return None
+    return value
+
+
+# fold instruction, "known" (GF slot -> value) are values of GF variables
+# known before it and they are updated to values after it, description of
+# folding is appended to "report"
+# return val: folded instruction (Instruction)
+def foldInstruction(vm, instruction, known, report):
+    opcode = opcodeNames[instruction.opcode]
+    kinds = instructFormat[opcode]
+    args = tuple(constOperand(known[arg.slot])
+                 if kind == "symb" and arg.frame == "GF" and arg.slot in known
+                 else arg for kind, arg in zip(kinds, instruction.args))
+    constant = all(arg.frame is None
+                   for kind, arg in zip(kinds, args) if kind == "symb")
+    dest = args[0] if kinds and kinds[0] == "var" else None
+    folded = None
+    if opcode in ("JUMPIFEQ", "JUMPIFNEQ") and constant:
+        arg1, arg2, arg3 = args
+        if arg2.type == arg3.type:  # different types fail
+            if (arg2.value == arg3.value) == (opcode == "JUMPIFEQ"):
+                folded = Instruction(opcodeIds["JUMP"], instruction.order,
+                                     (arg1,), instruction.next,
+                                     instruction.target)
+                report.append("{}: {} always jumps, folded to JUMP {}\n"
+                              .format(instruction.order, opcode, arg1.value))
+            else:
+                folded = Instruction(opcodeIds["LABEL"], instruction.order,
+                                     (arg1,), instruction.next, None)
+                report.append("{}: {} never jumps, removed\n"
+                              .format(instruction.order, opcode))
+    elif (opcode in foldableOpcodes and constant and
+            (opcode != "SETCHAR" or
+             dest.frame == "GF" and dest.slot in known)):
+        value = evaluate(vm, instruction, args, known)
+        if value is not None:
+            source = constOperand(value)
+            folded = Instruction(opcodeIds["MOVE"], instruction.order,
+                                 (dest, source), instruction.next, None)
+            report.append("{}: {} folded to MOVE {} {}\n"
+                          .format(instruction.order, opcode,
+                                  operandText(dest), operandText(source)))
+    if folded is None and args == instruction.args:
+        folded = instruction
+    elif folded is None:  # constants are propagated to operands
+        folded = Instruction(instruction.opcode, instruction.order, args,
+                             instruction.next, instruction.target)
+    if dest is not None and dest.frame == "GF":
+        source = folded.args[1] if len(folded.args) > 1 else None
+        if (opcodeNames[folded.opcode] == "MOVE" and
+                source.frame is None):
+            known[dest.slot] = source.value
+        else:
+            known.pop(dest.slot, None)
+    return folded
+
+
+# positions of instructions reachable from position "start" of decoded
+# program "code" (return address of CALL is reachable when CALL is)
+def reachablePositions(code, start):
+    reachable = set()
+    work = [start]
+    while work:
+        position = work.pop()
+        if position >= len(code) or position in reachable:
+            continue
+        reachable.add(position)
+        instruction = code[position]
+        work.extend(successors(instruction, []))
+        if opcodeNames[instruction.opcode] == "CALL":
+            nextPosition = instruction.next
+            work.append(~nextPosition if nextPosition < 0 else nextPosition)
+    return reachable
+
+
+# lines describing changes of program are appended to "report" (list)
+# return val: copy of program (Program) with folded constants and without
+# unreachable instructions
+def foldProgram(program, report):
+    code = list(program.code)
+    table = program.table
+    start = table.first()
+    vm = Interpreter(io.StringIO(), io.StringIO(), io.StringIO())
+    vm.initVarsCount = 0
+    vm.output = OutputBuffer(vm.stdout, vm.flush)  # output of failing SETCHAR
+    vm.bufferSlots = set()
+    leaders = set(findLeaders(code, start))
+    reachable = reachablePositions(code, start)
+    known = {}
+    folds = len(report)
+    for position, instruction in enumerate(code):
+        if position in leaders:
+            known = {}  # block can be entered from other blocks
+        if position in reachable:
+            code[position] = foldInstruction(vm, instruction, known, report)
+    folds = len(report) - folds
+
+    kept = sorted(reachablePositions(code, start))  # after folded branches
+    removed = len(code) - len(kept)
+    # ranges of removed instructions are between kept ones
+    for first, end in zip([-1] + kept, kept + [len(code)]):
+        if end - first < 2:
+            continue
+        orders = str(table.orders[first + 1])
+        if end - first > 2:
+            orders += "-{}".format(table.orders[end - 1])
+        report.append("{}: unreachable, removed {} instructions\n"
+                      .format(orders, end - first - 1))
+    report.append("folded {} instructions, removed {} unreachable "
+                  "instructions\n".format(folds, removed))
+
+    # positions are shifted by removed instructions, the following
+    # instructions keep their order (gaps in order numbers are the same)
+    def shift(position):
+        if position < 0:
+            return ~bisect_left(kept, ~position)
+        return bisect_left(kept, position)
+    folded = copy(program)
+    folded.code = []
+    for position in kept:
+        instruction = code[position]
+        target = instruction.target
+        if target is not None:
+            target = shift(target)
+        folded.code.append(Instruction(
+            instruction.opcode, instruction.order, instruction.args,
+            shift(instruction.next), target))
+    folded.table = InstructTable([])  # like table of cached program
+    folded.table.restore([table.orders[position] for position in kept])
+    folded.labels = {label: order for label, order in program.labels.items()
+                     if order in folded.table.index}
+    return folded
+
+
+# execution engines selectable by --engine argument
+engines = {
+    "reference": interpretCode,
+    "closure": interpretClosures,
+    "pyc": interpretTranspiled,
+}
+
+
+# ######### profiler (--profile) ###########
+# profiled program is interpreted by its own copy of dispatch loop of
+# reference or closure engine (so interpretation without profiler isn't
+# slowed down at all), the loop counts executions of every instruction and
+# measures time of randomly sampled executions (one of sampleRate on
+# average), time of instruction is estimated as its sampled time scaled by
+# its executions / samples
+# label names of active calls form the stack of collapsed stacks (format of
+# flamegraph.pl), its leaf frame is "order:opcode" of sampled instruction and
+# value is sampled time in nanoseconds
+
+
+class Profiler():
+    sampleRate = None
+    random = None
+    code = None
+    counts = None
+    samples = None
+    times = None
+    calls = None
+    stacks = None
+
+    def __init__(self, sampleRate=32):
+        self.sampleRate = sampleRate
+        self.random = Random(0)  # profiles of the same run are the same
+
+    # number of executions until next sample
+    def nextSample(self):
+        return self.random.randrange(1, 2 * self.sampleRate)
+
+    # interpret program (instead of engine of interpreter "vm")
+    def run(self, vm, program):
+        code = self.code = program.code
+        table = program.table
+        counts = self.counts = [0] * len(code)
+        samples = self.samples = [0] * len(code)
+        times = self.times = [0] * len(code)
+        calls = self.calls = {}
+        stacks = self.stacks = {}
+        labels = {table.index[order]: name
+                  for name, order in program.labels.items()}
+        stack = ["main"]
+        if vm.engine == "closure":
+            ops = closureOps(vm, code)
+        else:
+            ops = [partial(vm.handlers[instruction.opcode], instruction)
+                   for instruction in code]
+        callOpcode = opcodeIds["CALL"]
+        returnOpcode = opcodeIds["RETURN"]
+
+        countdown = self.nextSample()
+        position = table.start(vm.stderr)  # start with first instruction
+        end = len(ops)
+        while position < end:
+            counts[position] += 1
+            countdown -= 1
+            if countdown:
+                next = ops[position]()
+            else:
+                start = perf_counter_ns()
+                next = ops[position]()
+                time = perf_counter_ns() - start
+                samples[position] += 1
+                times[position] += time
+                instruction = code[position]
+                key = "{};{}:{}".format(";".join(stack), instruction.order,
+                                        opcodeNames[instruction.opcode])
+                stacks[key] = stacks.get(key, 0) + time
+                countdown = self.nextSample()
+            opcode = code[position].opcode
+            if opcode == callOpcode:
+                label = labels[next]
+                calls[label] = calls.get(label, 0) + 1
+                stack.append(label)
+            elif opcode == returnOpcode and len(stack) > 1:
+                stack.pop()
+            vm.instructCount += 1
+            position = next
+            if position < 0:
+                position = table.skipGap(~position, vm.stderr)
+
+    # profile of last run (dictionary for JSON), time is in nanoseconds
+    def report(self):
+        orders = []
+        opcodes = {}
+        for position, instruction in enumerate(self.code):
+            count = self.counts[position]
+            if not count:
+                continue
+            time = 0
+            if self.samples[position]:
+                time = (self.times[position] * count //
+                        self.samples[position])
+            name = opcodeNames[instruction.opcode]
+            orders.append({"order": instruction.order, "opcode": name,
+                           "count": count, "time": time})
+            opcode = opcodes.setdefault(name, {"count": 0, "time": 0})
+            opcode["count"] += count
+            opcode["time"] += time
+        return {
+            "instructions": sum(self.counts),
+            "sampleRate": self.sampleRate,
+            "samples": sum(self.samples),
+            "time": sum(order["time"] for order in orders),
+            "orders": orders,
+            "opcodes": opcodes,
+            "calls": self.calls,
+        }
+
+    # write profile as JSON into "fileName" and collapsed stacks into
+    # "fileName" with extension .folded
+    def write(self, fileName):
+        try:
+            with open(fileName, "w") as file:
+                json.dump(self.report(), file, indent=1)
+                file.write("\n")
+            with open(fileName + ".folded", "w") as file:
+                for key, time in sorted(self.stacks.items()):
+                    file.write("{} {}\n".format(key, time))
+        except OSError:
+            raise InterpretError(12, "ERROR 12: could not write profile\n")
+
+
+# ######### batch mode (--batch) ###########
+# programs listed in manifest (one source file per line, relative to
+# directory of manifest, empty lines and lines starting with "#" are skipped)
+# are interpreted by pool of worker processes, every worker keeps its
+# interpreter (and program cache) for all programs it gets
+# like in test.php every program reads input from file with the same name and
+# extension .in (empty input if it is missing) and its output and return code
+# are compared with files .out and .rc (empty output and return code 0 if
+# they are missing), output is not compared when both return codes are the
+# same non-zero value
+# source files with extension .src are IPPcode18 source code (test.php
+# converts them by parse.php), other ones are in format of --source-format
+# result of every program is written as one line of JSON in order of manifest
+
+
+# worker of batch mode, one instance lives in every process of pool
+class BatchWorker():
+    sourceFormat = None
+    cache = None
+    vm = None
+
+    def __init__(self, sourceFormat, engine, optimize, cacheDir, cacheSize):
+        self.sourceFormat = sourceFormat
+        if cacheDir is not None:
+            self.cache = ProgramCache(cacheDir, cacheSize)
+        self.vm = Interpreter(engine=engine, flush=None, optimize=optimize)
+
+    # interpret program in source file "source" and compare it with expected
+    # results
+    # return val: result of program (dictionary for JSON)
+    def run(self, source):
+        test = os.path.splitext(source)[0]
+        sourceFormat = self.sourceFormat
+        if source.endswith(".src"):
+            sourceFormat = "text"
+        self.vm.stdout = io.TextIOWrapper(io.BytesIO(), encoding="utf-8")
+        self.vm.stderr = io.StringIO()
+        rc = 0
+        try:
+            if os.path.exists(test + ".in"):
+                self.vm.stdin = open(test + ".in", "r")
+            else:
+                self.vm.stdin = io.StringIO()
+            with self.vm.stdin:
+                self.vm.run(loadFile(source, sourceFormat, self.cache))
+        except InterpretError as error:
+            self.vm.stderr.write(error.message)
+            rc = error.code
+        except Exception:  # crash of interpreter is reported like by python
+            self.vm.stderr.write(traceback.format_exc())
+            rc = 1
+        stdout = self.vm.stdout.buffer.getvalue()
+        expectedOutput = readExpected(test + ".out", b"")
+        expectedRc = readExpected(test + ".rc", b"0").strip()
+        expectedRc = int(expectedRc) if expectedRc.isdigit() else None
+        passed = rc == expectedRc and (rc != 0 or stdout == expectedOutput)
+        return {
+            "test": test,
+            "passed": passed,
+            "rc": rc,
+            "expectedRc": expectedRc,
+            "stdout": stdout.decode("utf-8", "replace"),
+            "stderr": self.vm.stderr.getvalue(),
+        }
+
+
+# worker of batch mode in actual process (see startBatchWorker)
+batchWorker = None
+
+
+# initializer of process of pool
+def startBatchWorker(*args):
+    global batchWorker
+    batchWorker = BatchWorker(*args)
+
+
+def runBatchItem(source):
+    return batchWorker.run(source)
+
+
+# content of file with expected results or "default" if file doesn't exist
+def readExpected(fileName, default):
+    try:
+        with open(fileName, "rb") as file:
+            return file.read()
+    except FileNotFoundError:
+        return default
+
+
+# list of source files in manifest
+def readManifest(fileName):
+    directory = os.path.dirname(fileName)
+    with openFile(fileName) as file:
+        lines = [line.strip() for line in file]
+    return [os.path.join(directory, line) for line in lines
+            if line and not line.startswith("#")]
+
+
+# interpret programs of manifest (--batch) by worker processes (--jobs) and
+# write their results (to --results file or standard output)
+# return val: number of programs which passed and number of all programs
+def runBatch(args):
+    sources = readManifest(''.join(args.batch))
+    cacheDir = None
+    if args.cachedir is not None:
+        cacheDir = ''.join(args.cachedir)
+        ProgramCache(cacheDir, args.cachesize)  # directory must exist
+    workerArgs = (args.sourceformat, args.engine, args.optimize, cacheDir,
+                  args.cachesize)
+    results = sys.stdout
+    if args.results is not None:
+        try:
+            results = open(''.join(args.results), "w")
+        except OSError:
+            raise InterpretError(12, "ERROR 12: could not open results file"
+                                     "\n")
+    passed = 0
+    with multiprocessing.Pool(args.jobs, startBatchWorker,
+                              workerArgs) as pool:
+        for result in pool.imap(runBatchItem, sources):
+            passed += result["passed"]
+            results.write(json.dumps(result) + "\n")
+    if results is not sys.stdout:
+        results.close()
+    return passed, len(sources)
+
+
+# ######### daemon mode (--serve) ###########
+# daemon listens on unix socket and every connection is one run of
+# interpret.py requested by interpret_client.py, the run is handled by process
+# forked from daemon (modules and program cache of daemon are loaded already
+# and runs are isolated from each other and from daemon), at most --jobs runs
+# are handled at once
+# both sides send frames (see daemonFrame) of these channels:
+#   client: r - request, JSON object with arguments of interpret.py "args",
+#               working directory "cwd", "encoding" of standard streams and
+#               optional limits "timeout" (seconds) and "memory" (bytes)
+#           p - content of source file (replaces --source argument)
+#           . - end of request
+#           i - standard input, it is sent after end of request while the
+#               program runs and it is read when READ needs it, end of file
+#               of connection (client shuts its sending side down) is end of
+#               standard input
+#   daemon: o - standard output
+#           e - standard error output
+#           x - return code (decimal number), last frame of run
+# run which exceeds its time limit ends with return code 124 (like timeout)
+
+
+# frame of daemon protocol, channel and length of data which follow
+daemonFrame = struct.Struct("<cI")
+
+
+def writeFrame(file, channel, data):
+    file.write(daemonFrame.pack(channel, len(data)) + data)
+
+
+# return val: channel and data of frame, channel is None at the end of file
+def readFrame(file):
+    header = file.read(daemonFrame.size)
+    if len(header) < daemonFrame.size:
+        return None, None
+    channel, length = daemonFrame.unpack(header)
+    data = file.read(length)
+    if len(data) < length:
+        return None, None
+    return channel, data
+
+
+# binary stream whose data are sent as frames of channel "channel"
+class FrameWriter(io.RawIOBase):
+    file = None
+    channel = None
+
+    def __init__(self, file, channel):
+        self.file = file
+        self.channel = channel
+
+    def writable(self):
+        return True
+
+    def write(self, data):
+        writeFrame(self.file, self.channel, bytes(data))
+        return len(data)
 
 
-# runtime interpretation
-# returns number of next instruction
-def interpretInstruction(instruction):
-    opcode = instruction.attrib.get("opcode")
-    return opcodeParser[opcode](instruction, True)  # call parsing function with interpretation
+# binary stream reading data of frames of channel "channel" from "file", it
+# ends at the end of file (frames of other channels are skipped)
+# data -> data of last frame which were not read yet
+class FrameReader(io.RawIOBase):
+    file = None
+    channel = None
+    data = None
 
+    def __init__(self, file, channel):
+        self.file = file
+        self.channel = channel
+        self.data = b""
+
+    def readable(self):
+        return True
 
-# STATS extension dump
-def statsDump(args):
+    def readinto(self, buffer):
+        while not self.data:
+            channel, data = readFrame(self.file)
+            if channel is None:
+                return 0
+            if channel == self.channel:
+                self.data = data
+        size = min(len(buffer), len(self.data))
+        buffer[:size] = self.data[:size]
+        self.data = self.data[size:]
+        return size
+
+
+# SIGALRM handler of run with time limit
+def timeLimitExceeded(signum, frame):
+    raise InterpretError(124, "ERROR: time limit exceeded\n")
+
+
+# connection with one request, it's handled in forked process of daemon
+class RunHandler(socketserver.StreamRequestHandler):
+    def handle(self):
+        signal.signal(signal.SIGTERM, signal.SIG_DFL)
+        request = {}
+        program = None
+        channel = None
+        while channel != b".":
+            channel, data = readFrame(self.rfile)
+            if channel is None:
+                return  # client is gone
+            if channel == b"r":
+                request = json.loads(data.decode("utf-8"))
+            elif channel == b"p":
+                program = data if program is None else program + data
+
+        encoding = request.get("encoding", "utf-8")
+        sys.stdin = io.TextIOWrapper(
+            io.BufferedReader(FrameReader(self.rfile, b"i")),
+            encoding=encoding)
+        sys.stdout = io.TextIOWrapper(
+            io.BufferedWriter(FrameWriter(self.wfile, b"o")),
+            encoding=encoding)
+        sys.stderr = io.TextIOWrapper(
+            io.BufferedWriter(FrameWriter(self.wfile, b"e")),
+            encoding=encoding, line_buffering=True)
+        try:
+            rc = self.run(request, program)
+            sys.stdout.flush()
+            sys.stderr.flush()
+            writeFrame(self.wfile, b"x", str(rc).encode())
+        except OSError:
+            pass  # client is gone
+
+    # interpret.py with arguments of request
+    # return val: return code
+    def run(self, request, program):
+        args = list(request.get("args", []))
+        if any(arg.startswith("--serve") for arg in args):
+            sys.stderr.write("ERROR 10: --serve can't be requested\n")
+            return 10
+        if (self.server.cacheDir is not None and
+                not any(arg.startswith("--cache-") for arg in args)):
+            args.append("--cache-dir=" + self.server.cacheDir)
+            args.append("--cache-size={}".format(self.server.cacheSize))
+        sourceFile = None
+        try:
+            os.chdir(request.get("cwd", "/"))
+            if program is not None:
+                with tempfile.NamedTemporaryFile(delete=False) as file:
+                    file.write(program)
+                    sourceFile = file.name
+                args.append("--source=" + sourceFile)
+            if request.get("memory"):
+                resource.setrlimit(resource.RLIMIT_AS, (request["memory"],
+                                                        request["memory"]))
+            if request.get("timeout"):
+                signal.signal(signal.SIGALRM, timeLimitExceeded)
+                signal.setitimer(signal.ITIMER_REAL, request["timeout"])
+            sys.argv = ["interpret.py"] + args
+            main()
+            rc = 0
+        except SystemExit as exit:
+            rc = exit.code
+            if type(rc) is not int:
+                rc = 0 if rc is None else 1
+        except InterpretError as error:
+            sys.stderr.write(error.message)
+            rc = error.code
+        except (OSError, ValueError) as error:
+            sys.stderr.write("ERROR 99: invalid request ({})\n".format(error))
+            rc = 99
+        except Exception:  # crash of interpreter is reported like by python
+            sys.stderr.write(traceback.format_exc())
+            rc = 1
+        finally:
+            signal.setitimer(signal.ITIMER_REAL, 0)
+            if sourceFile is not None:
+                os.remove(sourceFile)
+        return rc
+
+
+class RunServer(socketserver.ForkingMixIn, socketserver.UnixStreamServer):
+    cacheDir = None
+    cacheSize = None
+
+
+# SIGTERM handler of daemon, it ends like after interrupt
+def stopDaemon(signum, frame):
+    raise KeyboardInterrupt
+
+
+# serve requests on socket of --serve until daemon is interrupted
+def serve(args):
+    socketPath = ''.join(args.serve)
+    try:
+        if S_ISSOCK(os.stat(socketPath).st_mode):
+            os.remove(socketPath)  # socket of previous daemon
+    except FileNotFoundError:
+        pass
+    except OSError:
+        raise InterpretError(12, "ERROR 12: could not create socket\n")
+    cacheDir = None
+    if args.cachedir is not None:
+        cacheDir = os.path.abspath(''.join(args.cachedir))
+        ProgramCache(cacheDir, args.cachesize)  # directory must exist
+    try:
+        server = RunServer(socketPath, RunHandler)
+    except OSError:
+        raise InterpretError(12, "ERROR 12: could not create socket\n")
+    server.max_children = args.jobs
+    server.cacheDir = cacheDir
+    server.cacheSize = args.cachesize
+    signal.signal(signal.SIGTERM, stopDaemon)
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        pass
+    finally:
+        server.server_close()
+        os.remove(socketPath)
+
+
+# STATS extension dump, counters are taken from interpreter "vm" after it
+# has interpreted "program" loaded in "loadTime" nanoseconds, values are
+# written in order of their arguments
+def statsDump(args, vm, program, loadTime):
     if args.stats is not None:
+        rss = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+        if sys.platform != "darwin":
+            rss *= 1024  # kilobytes
+        values = {
+            "insts": vm.instructCount,
+            "vars": vm.initVarsCount,
+            "load-time": (loadTime - program.validateTime) // 1000,
+            "validate-time": program.validateTime // 1000,
+            "exec-time": vm.executeTime // 1000,
+            "max-callstack": vm.callstack.peak,
+            "max-datastack": vm.datastack.peak,
+            "max-stackframe": vm.stackframe.peak,
+            "max-vars": vm.peakVars,
+            "written": vm.output.written,
+            "max-rss": rss,
+        }
+        stats = args.statsp or []
         fileName = ''.join(args.stats)
         file = open(fileName, 'w')
-        for stat in args.statsp:
-            if stat == "vars":
-                file.write("{}\n".format(initVarsCount))
-            if stat == "insts":
-                file.write("{}\n".format(instructCount))
+        if args.statsformat == "json":
+            json.dump({stat: values[stat] for stat in stats}, file)
+            file.write("\n")
+        else:
+            for stat in stats:
+                file.write("{}\n".format(values[stat]))
         file.close()
 
 
+# command line interface, program from source file is interpreted with
+# standard streams, error of interpreter ends the process with its code
 def main():
     args = argumentsHandling()  # parsing of arguments
-    fileName = ''.join(args.source)  # load source file name
-    file = openFile(fileName)  # open file
-    program = parseFile(file).getroot()  # get root from XML file
-
-    checkProgramFormatting(program)  # check valid tags/args of prog and instr.
-
-    loadLabels(program)  # go through all labal and load them to global labels
-
-    # pre-runtime verification of program
-    for instruct in program:
-        verifyInstruct(instruct)
-
-    # interpretation
-    nextInstructionNumber = 1  # start with first instruction
-    instruction = lookUpInstuct(nextInstructionNumber, program)  # look up instruction in program by its number
-    while (instruction is not None):
-        nextInstructionNumber = interpretInstruction(instruction)
-        instruction = lookUpInstuct(nextInstructionNumber, program)
-        global instructCount
-        instructCount += 1
-
-    statsDump(args)  # if argument STATS is set dump stats fo file
+    try:
+        if args.serve is not None:  # programs requested over socket
+            serve(args)
+            return
+        if args.batch is not None:  # many programs with their tests
+            passed, total = runBatch(args)
+            sys.stderr.write("successful tests: {}/{}\n".format(passed, total))
+            return
+
+        fileName = ''.join(args.source)  # load source file name
+        dumpFile = None
+        if args.dumpsource is not None:
+            dumpFile = ''.join(args.dumpsource)
+        reportFile = None
+        if args.optreport is not None:
+            reportFile = ''.join(args.optreport)
+        cache = None
+        if args.cachedir is not None:  # verified program may be in cache
+            cache = ProgramCache(''.join(args.cachedir), args.cachesize)
+        loadTime = perf_counter_ns()
+        program = loadFile(fileName, args.sourceformat, cache)
+        loadTime = perf_counter_ns() - loadTime
+
+        if args.assemble is not None:  # conversion of program only
+            writeBytecode(''.join(args.assemble), program)
+            return
+        if args.disassemble is not None:
+            writeXml(''.join(args.disassemble), program)
+            return
+
+        # interpretation
+        profiler = None
+        if args.profile is not None:
+            profiler = Profiler()
+        vm = Interpreter(sys.stdin, sys.stdout, sys.stderr, args.engine,
+                         args.flush, dumpFile, profiler, args.optimize,
+                         reportFile)
+        try:
+            vm.run(program)
+        finally:
+            if profiler is not None:  # profile of failed run too
+                profiler.write(''.join(args.profile))
+    except InterpretError as error:
+        sys.stderr.write(error.message)
+        sys.exit(error.code)
+
+    # if argument STATS is set dump stats fo file
+    statsDump(args, vm, program, loadTime)
 
 
 if __name__ == '__main__':
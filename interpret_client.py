@@ -0,0 +1,142 @@
+# ######### school project for subject IPP ###########
+#
+# project name: IPPcode18 interpret (client of daemon)
+#
+# author: Matej Knazik
+# login: xknazi00
+# email: xknazi00@fit.vutbr.cz
+# ####################################################
+
+# drop-in replacement of "python3 interpret.py ARGUMENTS", the program is
+# interpreted by daemon started by "python3 interpret.py --serve=SOCKET"
+# (see daemon mode in interpret.py), standard streams and return code are
+# the same as if interpret.py was run, standard input is sent while the
+# program runs (it isn't read ahead)
+# options of client (the other arguments are arguments of interpret.py):
+#   --socket=SOCKET   socket of daemon (default $INTERPRET_SOCKET)
+#   --timeout=SECONDS time limit of run (return code 124 when it's exceeded)
+#   --memory=BYTES    limit of address space of run
+#   --send-source     send content of --source file instead of its name
+#                     (daemon doesn't have to see the file)
+
+
+import sys
+import os
+import socket
+import struct
+import json
+import threading
+
+
+# frame of daemon protocol, channel and length of data which follow
+daemonFrame = struct.Struct("<cI")
+chunkSize = 1 << 16
+
+
+def writeFrame(file, channel, data):
+    file.write(daemonFrame.pack(channel, len(data)) + data)
+
+
+# return val: channel and data of frame, channel is None at the end of file
+def readFrame(file):
+    header = file.read(daemonFrame.size)
+    if len(header) < daemonFrame.size:
+        return None, None
+    channel, length = daemonFrame.unpack(header)
+    data = file.read(length)
+    if len(data) < length:
+        return None, None
+    return channel, data
+
+
+# send standard input to daemon through "file" as it comes, sending side of
+# "connection" is shut down at the end of input (end of standard input of run)
+def sendInput(file, connection):
+    try:
+        fd = sys.stdin.fileno()
+        for data in iter(lambda: os.read(fd, chunkSize), b""):
+            writeFrame(file, b"i", data)
+            file.flush()
+        connection.shutdown(socket.SHUT_WR)
+    except (OSError, ValueError, AttributeError):
+        pass  # run is over or there is no standard input
+
+
+def error(code, message):
+    sys.stderr.write(message)
+    sys.exit(code)
+
+
+# split arguments into options of client and arguments of interpret.py
+# return val: request (dictionary for JSON), socket path and source file name
+# (None if it's not sent)
+def argumentsHandling(argv):
+    request = {"args": [], "cwd": os.getcwd(),
+               "encoding": sys.stdout.encoding}
+    socketPath = os.environ.get("INTERPRET_SOCKET")
+    sendSource = False
+    source = None
+    for i, arg in enumerate(argv):
+        name, _, value = arg.partition("=")
+        try:
+            if name == "--socket":
+                socketPath = value
+            elif name == "--timeout":
+                request["timeout"] = float(value)
+            elif name == "--memory":
+                request["memory"] = int(value)
+            elif arg == "--send-source":
+                sendSource = True
+            else:
+                request["args"].append(arg)
+                if name == "--source":
+                    source = value
+                    if not value and i + 1 < len(argv):
+                        source = argv[i + 1]
+        except ValueError:
+            error(10, "ERROR 10: invalid {} value\n".format(name))
+    if not socketPath:
+        error(10, "ERROR 10: missing --socket=SOCKET argument\n")
+    return request, socketPath, source if sendSource else None
+
+
+def main():
+    request, socketPath, source = argumentsHandling(sys.argv[1:])
+    try:
+        program = None
+        if source is not None:
+            with open(source, "rb") as file:
+                program = file.read()
+    except OSError:
+        error(11, "ERROR 11: Could not open file to read\n")
+    try:
+        connection = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+        connection.connect(socketPath)
+    except OSError:
+        error(99, "ERROR 99: could not connect to daemon\n")
+
+    with connection, connection.makefile("rb") as stream, \
+            connection.makefile("wb") as requestStream:
+        writeFrame(requestStream, b"r", json.dumps(request).encode("utf-8"))
+        if program is not None:
+            writeFrame(requestStream, b"p", program)
+        writeFrame(requestStream, b".", b"")
+        requestStream.flush()
+        # input is sent at the same time as output is received
+        threading.Thread(target=sendInput, args=(requestStream, connection),
+                         daemon=True).start()
+
+        outputs = {b"o": sys.stdout.buffer, b"e": sys.stderr.buffer}
+        while True:
+            channel, data = readFrame(stream)
+            if channel is None:
+                error(99, "ERROR 99: daemon closed connection\n")
+            if channel == b"x":
+                sys.stdout.flush()
+                sys.exit(int(data))
+            outputs[channel].write(data)
+            outputs[channel].flush()
+
+
+if __name__ == '__main__':
+    main()